@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, Float, Integer, String, UniqueConstraint
 from .base import Base
 
 class User(Base):
@@ -10,3 +10,63 @@ class User(Base):
     cp_hash = Column(String, nullable=True)         # SHA-512 hash for Copyparty
     permissions = Column(String, default="r") 
     is_active = Column(Boolean, default=True)
+
+class IndexedFile(Base):
+    """One file or directory under SERVE_PATH, maintained by app/backend/services/index_service.py."""
+    __tablename__ = "file_index"
+
+    id = Column(Integer, primary_key=True)
+    path = Column(String, unique=True, index=True, nullable=False) # Relative POSIX path
+    parent = Column(String, index=True, nullable=False)            # '' for the serve root
+    name = Column(String, nullable=False)
+    is_dir = Column(Boolean, default=False, nullable=False)
+    size = Column(Integer, default=0, nullable=False)
+    mtime = Column(Float, default=0.0, nullable=False)
+    extension = Column(String, index=True, nullable=False)         # Lowercase, '' if none
+    media_type = Column(String, index=True, nullable=False)        # directory, image, video, text, other
+    generation = Column(Integer, default=0, nullable=False)        # Full scan that last saw this row
+
+class DirectoryWatermark(Base):
+    """Last seen mtime of a directory under SERVE_PATH, maintained by the change detector."""
+    __tablename__ = "dir_watermarks"
+
+    path = Column(String, primary_key=True)                 # Relative POSIX path, '' for the serve root
+    parent = Column(String, index=True, nullable=False)     # '' for top-level directories and the root
+    mtime_ns = Column(Integer, nullable=False)
+    scanned_at = Column(Float, nullable=False)
+
+class PregenerationJob(Base):
+    """A queued preview (thumbnail, poster...) for a file under SERVE_PATH, see pregeneration_queue.py."""
+    __tablename__ = "pregeneration_jobs"
+    __table_args__ = (UniqueConstraint("path", "kind"),)
+
+    id = Column(Integer, primary_key=True)
+    path = Column(String, nullable=False)                   # Relative POSIX path of the source file
+    kind = Column(String, nullable=False)                   # Registered handler name
+    priority = Column(Integer, index=True, nullable=False)  # Lower runs first
+    created_at = Column(Float, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+
+class UploadSession(Base):
+    """A resumable upload in progress, see upload_service.py."""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True)                   # Random token, part of the upload URL
+    username = Column(String, nullable=False)               # Owner; only they can continue it
+    path = Column(String, nullable=False)                   # Relative POSIX path of the final file
+    temp_name = Column(String, nullable=False)              # Partial file in the same directory
+    size = Column(Integer, nullable=False)                  # Announced total size in bytes
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, index=True, nullable=False)  # Last chunk, for expiry
+
+class TrashItem(Base):
+    """A deleted file or folder kept for restoring, see trash_service.py."""
+    __tablename__ = "trash_items"
+
+    id = Column(String, primary_key=True)                   # Random token, also the name in the trash folder
+    username = Column(String, index=True, nullable=False)   # Who deleted it; only they can restore it
+    original_path = Column(String, nullable=False)          # Relative POSIX path it was deleted from
+    location = Column(String, nullable=False)               # Absolute path of the trash folder holding it
+    is_dir = Column(Boolean, default=False, nullable=False)
+    size = Column(Integer, nullable=True)                   # Files only; folders aren't walked on delete
+    deleted_at = Column(Float, index=True, nullable=False)
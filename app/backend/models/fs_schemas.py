@@ -13,3 +13,27 @@ class DirectoryListing(BaseModel):
     path: str
     items: List[FSItem]
     permissions: str # Permissions for the directory itself
+    total: Optional[int] = None # Number of items in the whole directory
+    next_cursor: Optional[str] = None # Pass as ?cursor= to fetch the next page
+
+class ArchiveRequest(BaseModel):
+    paths: List[str]
+    format: str = "zip" # "zip" or "tar"
+    name: Optional[str] = None # Download name without extension
+
+class TransferRequest(BaseModel):
+    sources: List[str]
+    destination: str # Directory the sources are copied or moved into
+
+class TrashPurgeRequest(BaseModel):
+    ids: Optional[List[str]] = None # Omit to empty the whole trash
+
+class BatchOperation(BaseModel):
+    op: str # "delete", "rename" or "move"
+    path: str
+    new_name: Optional[str] = None # For "rename"
+    destination: Optional[str] = None # For "move": folder to move into
+    permanent: bool = False # For "delete": skip the trash
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
@@ -1,28 +1,235 @@
+import json
+import asyncio
 import logging
 import urllib.parse
-import shutil
-from typing import Optional
-from fastapi import APIRouter, Request, HTTPException, Depends, Response
-from fastapi.responses import JSONResponse
-from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, Request, HTTPException, Depends, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from pathlib import Path, PurePosixPath
 from app.core.config import settings
 from app.core.file_security import validate_and_resolve_path, is_path_forbidden
+from app.core.listing import (
+    scan_directory, iter_directory, paginate, listing_cache, directory_etag, etag_matches,
+    SORT_FIELDS, SORT_ORDERS
+)
 from app.core.constants import PREVIEWABLE_EXTENSIONS, VIDEO_EXTENSIONS, TEXT_EXTENSIONS
 from app.core.auth import auth_required, decrypt_string
-from app.core.templates import templates
+from app.core.templates import templates, auth_context
+from app.core.metrics import metrics
 from app.backend.services.copyparty_service import get_pmask, get_proxy_headers, search_files, rename_item
-from app.backend.models.fs_schemas import FSItem, DirectoryListing
+from app.backend.services.index_service import file_index, use_index
+from app.backend.services.search_engine import search_engine, SearchFilters
+from app.backend.services.search_sessions import search_sessions
+from app.backend.services.pregeneration_queue import pregeneration_queue, PRIORITY_DIRECTORY
+from app.backend.services.video_preview_service import (
+    video_previews, build_vtt, POSTER_NAME, SPRITE_NAME
+)
+from app.backend.services.archive_service import iter_archive, ARCHIVE_MEDIA_TYPES
+from app.backend.services.transfer_service import transfers, TransferError
+from app.backend.services.trash_service import trash, TrashError
+from app.backend.models.fs_schemas import FSItem, DirectoryListing, ArchiveRequest, TransferRequest, TrashPurgeRequest, BatchOperation, BatchRequest
 
 router = APIRouter(prefix="/api/v1", dependencies=[Depends(auth_required)])
 logger = logging.getLogger(__name__)
 
+# Clients may store listings but must revalidate them with If-None-Match
+LISTING_CACHE_CONTROL = "private, no-cache"
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Returns a 304 response if the client's If-None-Match matches `etag`."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL})
+    return None
+
+def _resolve_source(source: Optional[str], default: Optional[str] = None) -> bool:
+    """Returns True if the request should be answered from the file index."""
+    try:
+        return use_index(source, default)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _listing_source(from_index: bool) -> str:
+    """ETag part for where a listing comes from; index listings change with the index, not the folder."""
+    return f"index:{file_index.state}" if from_index else "live"
+
+def _scan(resolved_path: Path, from_index: bool, with_stat: bool = False):
+    """
+    Lists a directory from the index when asked to and able, else from disk.
+    Blocking (SQLite or scandir), so handlers run it with `asyncio.to_thread`.
+    """
+    if from_index:
+        rel = file_index.relative(resolved_path)
+        entries = file_index.list_directory(rel) if rel is not None else None
+        if entries is not None:
+            return entries
+    return scan_directory(resolved_path, with_stat=with_stat)
+
+def _username(request: Request) -> str:
+    session = getattr(request.state, "session", None)
+    return getattr(session, "username", None) or ""
+
+def _resolve_existing(request: Request, paths: List[str]) -> List[Path]:
+    """Resolves request paths (duplicates dropped), answering 404 for any that don't exist."""
+    resolved_paths = []
+    for path in dict.fromkeys(paths):
+        resolved_path = validate_and_resolve_path(
+            requested_path=Path(path),
+            base_dir=settings.SERVE_PATH,
+            client_host=request.client.host
+        )
+        if not resolved_path.exists():
+            raise HTTPException(status_code=404, detail=f"Path not found: {path}")
+        resolved_paths.append(resolved_path)
+    return resolved_paths
+
+async def _require_permission(request: Request, directories: List[Path], flag: str, action: str):
+    """
+    Checks that the user has `flag` in every given directory (absolute paths),
+    with one concurrent pmask lookup per distinct directory.
+    """
+    directories = list(dict.fromkeys(d.relative_to(settings.SERVE_PATH) for d in directories))
+    pmasks = await asyncio.gather(*(get_pmask(request, d) for d in directories))
+    for directory, pmask in zip(directories, pmasks):
+        if flag not in pmask:
+            logger.warning(f"{action} denied for user in {directory}: Missing '{flag}' permission in pmask '{pmask}'")
+            raise HTTPException(status_code=403, detail=f"{action} permission denied")
+
+def _search_filters(
+    ext: Optional[str] = None,
+    media_type: Optional[str] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    after: Optional[float] = None,
+    before: Optional[float] = None
+) -> Optional[SearchFilters]:
+    """Builds search filters from query parameters, or None if none were given."""
+    if all(value is None for value in (ext, media_type, min_size, max_size, after, before)):
+        return None
+    try:
+        return SearchFilters(
+            extensions=ext.split(",") if ext else None,
+            media_type=media_type,
+            min_size=min_size,
+            max_size=max_size,
+            modified_after=after,
+            modified_before=before
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _readable_hits(request: Request, hits: List[dict]) -> List[dict]:
+    """
+    Drops hits in folders the user can't read. Copyparty does this for its own
+    searches, but the local engine and index cover every volume. Each distinct
+    folder is looked up once.
+    """
+    folders = [str(PurePosixPath(hit["p"].rstrip("/")).parent) for hit in hits]
+    distinct = list(dict.fromkeys(folders))
+    pmasks = dict(zip(distinct, await asyncio.gather(*(get_pmask(request, Path(folder)) for folder in distinct))))
+    return [hit for hit, folder in zip(hits, folders) if 'r' in pmasks[folder]]
+
+async def _local_search(request: Request, q: str, filters: Optional[SearchFilters], limit: int) -> Optional[List[dict]]:
+    """Searches the local engine (or the index table while it builds), keeping only readable hits."""
+    search_engine.refresh(file_index)
+    hits = search_engine.search(q, filters, limit)
+    if hits is not None and len(hits) == limit < settings.SEARCH_MAX_LIMIT:
+        readable = await _readable_hits(request, hits)
+        if len(readable) == limit:
+            return readable
+        # Some hits were unreadable; look further down the ranking to fill the page
+        hits = search_engine.search(q, filters, settings.SEARCH_MAX_LIMIT)
+    if hits is None:
+        hits = await asyncio.to_thread(file_index.search, q, "", settings.SEARCH_MAX_LIMIT)
+        if hits is None:
+            return None
+        if filters is not None:
+            hits = [hit for hit in hits if filters.matches_hit(hit)]
+    return await _readable_hits(request, hits)
+
+async def _search_hits(
+    request: Request,
+    q: str,
+    from_index: bool,
+    filters: Optional[SearchFilters] = None,
+    limit: Optional[int] = None
+) -> dict:
+    """
+    Runs a search in copyparty's result format. With `from_index` it is answered
+    by the local search engine (or the index table while the engine is building),
+    limited to folders the user can read, falling back to copyparty until the
+    file index exists.
+    """
+    limit = limit or settings.SEARCH_DEFAULT_LIMIT
+    if from_index:
+        hits = await _local_search(request, q, filters, limit)
+        if hits is not None:
+            return {"hits": hits[:limit]}
+
+    results = await search_files(request, q)
+    hits = results.get("hits", [])
+    if filters is not None:
+        hits = [hit for hit in hits if filters.matches_hit(hit)]
+    results["hits"] = hits[:limit]
+    return results
+
+def _stream_listing(resolved_path: Path, rel_dir: Path, pmask: str):
+    """
+    Yields one NDJSON line per directory entry without buffering the listing.
+    A plain generator, so Starlette iterates it in the threadpool.
+    """
+    try:
+        for entry in iter_directory(resolved_path, with_stat=True):
+            item = FSItem.construct(
+                name=entry.name,
+                path=str(rel_dir / entry.name),
+                is_dir=entry.is_dir(),
+                size=entry.size,
+                mtime=entry.mtime,
+                permissions=pmask
+            )
+            yield item.json() + "\n"
+    except OSError as e:
+        # Headers are already sent, so the stream just ends early
+        logger.error(f"Error streaming directory {resolved_path}: {e}")
+
 @router.get("/fs/list/{full_path:path}", response_model=DirectoryListing, tags=["Mobile API"], summary="List directory contents")
-async def list_directory(request: Request, full_path: str = ""):
+async def list_directory(
+    request: Request,
+    response: Response,
+    full_path: str = "",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: str = "name",
+    order: str = "asc",
+    source: Optional[str] = None
+):
     """
     Returns a structured JSON directory listing for the mobile app.
+    Directories always come first. Use `sort` (name, mtime, size) and `order`
+    (asc, desc) to choose the order, and `limit` to page through large folders:
+    each page returns `next_cursor`, which is passed back as `cursor`.
+    
+    With `Accept: application/x-ndjson` the listing is streamed instead, one
+    FSItem JSON object per line in on-disk order, read from the filesystem
+    (sorting, paging and `source` don't apply).
+    
+    Responses carry a weak ETag; send it back in If-None-Match to get a 304
+    while the directory is unchanged.
+    
+    `source=index` answers from the persistent file index and `source=live` from
+    the filesystem; the default is LISTING_SOURCE. The index falls back to the
+    filesystem until it has been built.
     """
     base_serve_dir = settings.SERVE_PATH
     
+    if sort not in SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort '{sort}'. Use one of: {', '.join(SORT_FIELDS)}")
+    if order not in SORT_ORDERS:
+        raise HTTPException(status_code=400, detail="Invalid order. Use 'asc' or 'desc'")
+    if limit is not None and not 1 <= limit <= settings.LIST_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.LIST_MAX_PAGE_SIZE}")
+    from_index = _resolve_source(source)
+    
     try:
         full_path = urllib.parse.unquote(full_path)
         resolved_path = validate_and_resolve_path(
@@ -34,33 +241,59 @@ async def list_directory(request: Request, full_path: str = ""):
         if not resolved_path.is_dir():
             raise HTTPException(status_code=404, detail="Directory not found")
 
-        pmask = get_pmask(request, Path(full_path))
+        pmask = await get_pmask(request, Path(full_path))
+        
+        rel_dir = resolved_path.relative_to(base_serve_dir)
+        is_ndjson = "application/x-ndjson" in request.headers.get("accept", "")
+        
+        if is_ndjson:
+            # Always streamed from disk in on-disk order, whatever the source and order asked for
+            etag = directory_etag(resolved_path, pmask, "ndjson")
+        else:
+            etag = directory_etag(
+                resolved_path, pmask, "json",
+                sort, order, str(limit), cursor or "", _listing_source(from_index)
+            )
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        
+        if is_ndjson:
+            return StreamingResponse(
+                _stream_listing(resolved_path, rel_dir, pmask),
+                media_type="application/x-ndjson",
+                headers={"X-Permissions": pmask, "ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL}
+            )
+        
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = LISTING_CACHE_CONTROL
+        
+        entries = await asyncio.to_thread(_scan, resolved_path, from_index, True)
+        try:
+            page, next_cursor = paginate(entries, sort=sort, order=order, limit=limit, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         items = []
-        for item in sorted(resolved_path.iterdir(), key=lambda f: (not f.is_dir(), f.name.lower())):
-            if not is_path_forbidden(item):
-                stat = item.stat()
-                rel_path = item.relative_to(base_serve_dir)
-                
-                # Check permissions for the item itself (if it's a dir, check its pmask)
-                # For files, we use the parent's pmask.
-                item_pmask = pmask
-                if item.is_dir():
-                    item_pmask = get_pmask(request, rel_path)
-
-                items.append(FSItem(
-                    name=item.name,
-                    path=str(rel_path),
-                    is_dir=item.is_dir(),
-                    size=stat.st_size,
-                    mtime=stat.st_mtime,
-                    permissions=item_pmask
-                ))
+        for entry in page:
+            # Copyparty permissions are per volume, and subfolders share their
+            # parent's volume, so the listing's pmask applies to every item.
+            # This avoids one backend pmask call per subdirectory.
+            items.append(FSItem(
+                name=entry.name,
+                path=str(rel_dir / entry.name),
+                is_dir=entry.is_dir(),
+                size=entry.size,
+                mtime=entry.mtime,
+                permissions=pmask
+            ))
 
         return DirectoryListing(
             path=full_path,
             items=items,
-            permissions=pmask
+            permissions=pmask,
+            total=len(entries),
+            next_cursor=next_cursor
         )
 
     except HTTPException:
@@ -70,15 +303,34 @@ async def list_directory(request: Request, full_path: str = ""):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/fs/search", tags=["Mobile API"], summary="Search files and folders")
-async def search(request: Request, q: str = None, format: Optional[str] = None):
+async def search(
+    request: Request,
+    q: str = None,
+    format: Optional[str] = None,
+    source: Optional[str] = None,
+    ext: Optional[str] = None,
+    media_type: Optional[str] = Query(None, alias="type"),
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    after: Optional[float] = None,
+    before: Optional[float] = None,
+    limit: Optional[int] = None
+):
     """
-    Proxies search request to copyparty.
+    Searches file and folder names, ranked with fuzzy matching.
+    `source=index` (the default, SEARCH_SOURCE) uses the local search engine and
+    `source=live` proxies to copyparty. Results can be narrowed with `ext`
+    (comma-separated), `type` (directory, image, video, text, other), `min_size`/
+    `max_size` in bytes and `after`/`before` as Unix timestamps.
     Returns transformed JSON if format=json or Accept: application/json is set.
     """
     if not q:
         raise HTTPException(status_code=400, detail="Query parameter 'q' is required")
+    if limit is not None and not 1 <= limit <= settings.SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.SEARCH_MAX_LIMIT}")
     
-    results = await search_files(request, q)
+    filters = _search_filters(ext, media_type, min_size, max_size, after, before)
+    results = await _search_hits(request, q, _resolve_source(source, settings.SEARCH_SOURCE), filters, limit)
     
     accept_header = request.headers.get("accept", "")
     if format == "json" or "application/json" in accept_header:
@@ -123,11 +375,16 @@ class SearchResultItem:
         return self._is_dir
 
 @router.get("/fs/search/ui")
-async def search_ui(request: Request, q: str = None, path: str = ""):
+async def search_ui(request: Request, q: str = None, path: str = "", source: Optional[str] = None):
     """
     Returns search results as rendered HTML partial.
     If q is empty, returns the normal directory listing for 'path'.
+    
+    Meant for search-as-you-type: a query cancels the previous one from the same
+    session (which then answers 204), refinements of the previous copyparty
+    query are filtered from its results, and the cards are streamed best hits first.
     """
+    from_index = _resolve_source(source, settings.SEARCH_SOURCE if q else None)
     if not q:
         # Return normal directory listing
         base_serve_dir = settings.SERVE_PATH
@@ -141,40 +398,77 @@ async def search_ui(request: Request, q: str = None, path: str = ""):
         if not resolved_path.is_dir():
             raise HTTPException(status_code=404, detail="Directory not found")
 
-        contents = sorted(resolved_path.iterdir(), key=lambda f: (not f.is_dir(), f.name.lower()))
-        filtered_contents = [item for item in contents if not is_path_forbidden(item)]
-        
         context = {
             "request": request,
             "path": path,
-            "contents": filtered_contents,
-            "pmask": get_pmask(request, Path(path))
+            "contents": await asyncio.to_thread(_scan, resolved_path, from_index),
+            "pmask": await get_pmask(request, Path(path))
         }
         return templates.TemplateResponse("partials/file_browser_content.html", context)
     
-    results = await search_files(request, q)
-    hits = results.get("hits", [])
+    session = getattr(request.state, "session", None)
+    session_id = session.session_id if session else None
+    key = (from_index, path)
+    # Only copyparty's plain substring matches can be narrowed down from the previous
+    # results. The local engine also matches fuzzily and by parent folder, so a
+    # refinement can find names the previous query didn't; it is fast enough to ask again.
+    reusable = session_id is not None and not from_index
     
-    # We need to transform hits into something the template can handle
-    # hits: [{"p": "path/to/file", "s": size, "t": mtime}, ...]
+    hits = None
+    if session_id:
+        # A newer keystroke from the same session supersedes this query
+        generation = search_sessions.begin(session_id)
+    if reusable:
+        hits = search_sessions.refine(session_id, q, key)
     
-    transformed_hits = []
-    for hit in hits:
-        path_str = hit["p"]
-        name = path_str.split("/")[-1]
-        
-        # We'll create a dummy object that mimics a Path object for the template
-        transformed_hits.append(SearchResultItem(name, path_str))
+    if hits is None:
+        task = asyncio.ensure_future(_search_hits(request, q, from_index))
+        if session_id:
+            search_sessions.attach(session_id, generation, task)
+        try:
+            results = await task
+        except asyncio.CancelledError:
+            if session_id and not search_sessions.is_current(session_id, generation):
+                # HTMX leaves the page alone on 204; the newer request will swap
+                return Response(status_code=204)
+            raise
+        hits = results.get("hits", [])
+        if reusable:
+            search_sessions.remember(session_id, q, key, hits, complete=len(hits) < settings.SEARCH_DEFAULT_LIMIT)
+    
+    if session_id and not search_sessions.is_current(session_id, generation):
+        return Response(status_code=204)
     
-    context = {
+    is_current = (lambda: search_sessions.is_current(session_id, generation)) if session_id else (lambda: True)
+    return StreamingResponse(_stream_search_results(request, q, hits, is_current), media_type="text/html")
+
+async def _stream_search_results(request: Request, q: str, hits: list, is_current):
+    """
+    Renders search hits in batches, the best ranked first, so the first cards go
+    out before the rest are rendered. Stops early once the query is superseded.
+    """
+    template = templates.get_template("partials/search_results.html")
+    base_context = {
         "request": request,
         "query": q,
-        "hits": transformed_hits,
         "pmask": "r", # Search results are usually read-only in this view
-        "path": "" # Required by file_card template
+        "path": "", # Required by file_card template
+        **auth_context(request)
     }
     
-    return templates.TemplateResponse("partials/search_results.html", context)
+    offset = 0
+    batch_size = settings.SEARCH_STREAM_FIRST_BATCH
+    while True:
+        batch = hits[offset:offset + batch_size]
+        # We'll create dummy objects that mimic a Path object for the template
+        items = [SearchResultItem(hit["p"].rstrip("/").split("/")[-1], hit["p"]) for hit in batch]
+        yield template.render({**base_context, "hits": items, "offset": offset})
+        offset += len(batch)
+        if offset >= len(hits) or not is_current():
+            return
+        batch_size = settings.SEARCH_STREAM_BATCH
+        # Let other requests (and newer keystrokes) run between batches
+        await asyncio.sleep(0)
 
 @router.post("/fs/rename/{full_path:path}")
 async def rename(request: Request, full_path: str, new_name: str = None):
@@ -201,7 +495,7 @@ async def rename(request: Request, full_path: str, new_name: str = None):
         # Check permissions in parent directory
         # Copyparty 'm' permission is required for move/rename
         parent_dir = resolved_path.parent.relative_to(base_serve_dir) if resolved_path != base_serve_dir else Path("")
-        pmask = get_pmask(request, parent_dir)
+        pmask = await get_pmask(request, parent_dir)
         
         if 'm' not in pmask:
             logger.warning(f"Rename denied for user in {parent_dir}: Missing 'm' permission in pmask '{pmask}'")
@@ -209,6 +503,9 @@ async def rename(request: Request, full_path: str, new_name: str = None):
 
         # Perform rename via proxy
         await rename_item(request, Path(full_path), new_name)
+        listing_cache.invalidate(resolved_path.parent)
+        listing_cache.invalidate(resolved_path)
+        file_index.schedule_rescan(resolved_path.parent)
         
         logger.info(f"Renamed {full_path} to {new_name}")
         
@@ -226,9 +523,12 @@ async def rename(request: Request, full_path: str, new_name: str = None):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.delete("/fs/{full_path:path}")
-async def delete_file_or_dir(request: Request, full_path: str):
+async def delete_file_or_dir(request: Request, full_path: str, permanent: bool = False):
     """
-    Deletes a file or directory if the user has 'd' permission.
+    Deletes a file or directory if the user has 'd' permission. The item is
+    moved to the trash (its id is in `X-Trash-Id`) unless the trash is
+    disabled or `permanent` is set; then its data is removed in the background
+    by the job named in `X-Job-Id` (see /api/v1/fs/jobs/{id}).
     """
     base_serve_dir = settings.SERVE_PATH
     
@@ -245,7 +545,7 @@ async def delete_file_or_dir(request: Request, full_path: str):
             
         # Check permissions
         parent_dir = resolved_path.parent.relative_to(base_serve_dir) if resolved_path != base_serve_dir else Path("")
-        pmask = get_pmask(request, parent_dir)
+        pmask = await get_pmask(request, parent_dir)
         
         logger.info(f"DELETE Request: User='{request.state.session.username if request.state.session else 'anon'}', Path='{resolved_path}', Pmask='{pmask}'")
         
@@ -253,16 +553,20 @@ async def delete_file_or_dir(request: Request, full_path: str):
             logger.warning(f"Delete denied for user in {parent_dir}: Missing 'd' permission in pmask '{pmask}'")
             raise HTTPException(status_code=403, detail="Delete permission denied")
 
-        if resolved_path.is_dir():
-            logger.info(f"Deleting directory: {resolved_path}")
-            shutil.rmtree(resolved_path)
-        else:
-            logger.info(f"Deleting file: {resolved_path}")
-            resolved_path.unlink()
+        if resolved_path == base_serve_dir:
+            raise HTTPException(status_code=400, detail="Can't delete the root folder")
 
         # Return empty response for HTMX to remove the element
         # Include HX-Trigger for toast notification
         response = Response(status_code=204)
+        if settings.TRASH_ENABLED and not permanent:
+            item = await asyncio.to_thread(trash.trash, resolved_path, _username(request))
+            response.headers["X-Trash-Id"] = item["id"]
+        else:
+            # Hidden at once; the files are removed by a background job
+            job = await transfers.delete([resolved_path], _username(request))
+            logger.info(f"Deleting {resolved_path} (job {job.id})")
+            response.headers["X-Job-Id"] = job.id
         response.headers["HX-Trigger"] = '{"show-toast": {"message": "Item deleted successfully", "type": "success"}}'
         return response
 
@@ -292,7 +596,7 @@ async def create_directory(request: Request, full_path: str):
             
         # Check permissions in parent directory
         parent_dir = resolved_path.parent.relative_to(base_serve_dir) if resolved_path != base_serve_dir else Path("")
-        pmask = get_pmask(request, parent_dir)
+        pmask = await get_pmask(request, parent_dir)
         
         logger.info(f"MKDIR Request: User='{request.state.session.username if request.state.session else 'anon'}', Path='{resolved_path}', Pmask='{pmask}'")
         
@@ -301,16 +605,15 @@ async def create_directory(request: Request, full_path: str):
             raise HTTPException(status_code=403, detail="Write permission denied")
 
         resolved_path.mkdir(parents=True, exist_ok=True)
+        listing_cache.invalidate(resolved_path.parent)
+        file_index.schedule_rescan(resolved_path.parent)
         logger.info(f"Created directory: {resolved_path}")
 
         # Refresh directory listing for HTMX
-        contents = sorted(resolved_path.parent.iterdir(), key=lambda f: (not f.is_dir(), f.name.lower()))
-        filtered_contents = [item for item in contents if not is_path_forbidden(item)]
-        
         context = {
             "request": request,
             "path": str(parent_dir),
-            "contents": filtered_contents,
+            "contents": scan_directory(resolved_path.parent),
             "pmask": pmask
         }
         
@@ -324,13 +627,410 @@ async def create_directory(request: Request, full_path: str):
         logger.error(f"Error creating directory {full_path}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.post("/fs/archive", tags=["Mobile API"], summary="Download files and folders as one archive")
+async def download_archive(request: Request, body: ArchiveRequest):
+    """
+    Streams a ZIP64 or TAR archive of the given files and folders, generated
+    while it is sent. Already compressed media is stored without compression.
+    Requires 'r' permission where each path lives (a folder's own pmask covers
+    its contents).
+    """
+    if body.format not in ARCHIVE_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Format must be 'zip' or 'tar'")
+    if not body.paths or len(body.paths) > settings.ARCHIVE_MAX_PATHS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {settings.ARCHIVE_MAX_PATHS} paths are required")
+
+    resolved_paths = _resolve_existing(request, body.paths)
+    await _require_permission(request, [p if p.is_dir() else p.parent for p in resolved_paths], 'r', "Read")
+
+    name = body.name or (resolved_paths[0].name if len(resolved_paths) == 1 else "") or "download"
+    quoted_name = urllib.parse.quote(f"{name}.{body.format}")
+    metrics.record_download()
+    logger.info(f"Streaming {body.format} archive of {len(resolved_paths)} paths")
+    return StreamingResponse(
+        iter_archive(resolved_paths, body.format),
+        media_type=ARCHIVE_MEDIA_TYPES[body.format],
+        headers={"Content-Disposition": f'attachment; filename="{quoted_name}"; filename*=UTF-8\'\'{quoted_name}'}
+    )
+
+# --- Copy and move jobs ---
+
+async def _start_transfer(request: Request, operation: str, body: TransferRequest) -> JSONResponse:
+    if not body.sources:
+        raise HTTPException(status_code=400, detail="At least one source is required")
+    sources = _resolve_existing(request, body.sources)
+    destination = _resolve_existing(request, [body.destination])[0]
+    if settings.SERVE_PATH in sources:
+        raise HTTPException(status_code=400, detail="Can't copy or move the root folder")
+
+    # Copyparty needs 'm' to move out of a folder, 'r' to copy from it and 'w' to add to one
+    if operation == "move":
+        await _require_permission(request, [p.parent for p in sources], 'm', "Move")
+    else:
+        await _require_permission(request, [p.parent for p in sources], 'r', "Read")
+    await _require_permission(request, [destination], 'w', "Write")
+
+    try:
+        job = transfers.submit(operation, sources, destination, _username(request))
+    except TransferError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return JSONResponse(
+        job.to_dict(settings.SERVE_PATH), status_code=202,
+        headers={"Location": f"/api/v1/fs/jobs/{job.id}"}
+    )
+
+@router.post("/fs/copy", status_code=202, tags=["Mobile API"], summary="Copy files and folders in the background")
+async def copy_items(request: Request, body: TransferRequest):
+    """
+    Starts copying `sources` into the `destination` folder and returns the job.
+    Follow its progress at `/api/v1/fs/jobs/{id}`.
+    """
+    return await _start_transfer(request, "copy", body)
+
+@router.post("/fs/move", status_code=202, tags=["Mobile API"], summary="Move files and folders in the background")
+async def move_items(request: Request, body: TransferRequest):
+    """
+    Starts moving `sources` into the `destination` folder and returns the job.
+    Moves within a filesystem are renames; others are copied, then removed.
+    """
+    return await _start_transfer(request, "move", body)
+
+@router.get("/fs/jobs", tags=["Mobile API"], summary="List copy and move jobs")
+async def list_jobs(request: Request):
+    return {"jobs": [job.to_dict(settings.SERVE_PATH) for job in transfers.list_jobs(_username(request))]}
+
+async def _job_events(request: Request, job):
+    """Server-sent events with the job's status whenever it changes, until it finishes."""
+    last = None
+    while True:
+        status = job.to_dict(settings.SERVE_PATH)
+        if status != last:
+            yield f"data: {json.dumps(status)}\n\n"
+            last = status
+        if job.finished or await request.is_disconnected():
+            break
+        await asyncio.sleep(settings.TRANSFER_PROGRESS_INTERVAL_SECONDS)
+
+@router.get("/fs/jobs/{job_id}", tags=["Mobile API"], summary="Get the progress of a copy or move job")
+async def get_job(request: Request, job_id: str):
+    """
+    Returns the job's state and progress (items, files and bytes). With
+    `Accept: text/event-stream` the status is streamed as it changes instead.
+    """
+    try:
+        job = transfers.get(job_id, _username(request))
+    except TransferError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _job_events(request, job), media_type="text/event-stream",
+            headers={"Cache-Control": "no-store"}
+        )
+    return JSONResponse(job.to_dict(settings.SERVE_PATH), headers={"Cache-Control": "no-store"})
+
+@router.post("/fs/jobs/{job_id}/cancel", tags=["Mobile API"], summary="Cancel a copy or move job")
+async def cancel_job(request: Request, job_id: str):
+    """Stops the job after the chunk in flight and removes what it created."""
+    try:
+        job = transfers.cancel(job_id, _username(request))
+    except TransferError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return job.to_dict(settings.SERVE_PATH)
+
+# --- Batch operations ---
+
+# Permission each operation needs in the folder holding the item
+BATCH_PERMISSIONS = {"delete": 'd', "rename": 'm', "move": 'm'}
+
+def _plan_batch_operation(request: Request, operation: BatchOperation) -> Tuple[Path, Optional[Path]]:
+    """Validates one batch operation, returning the item and the path it goes to (None for deletes)."""
+    if operation.op not in BATCH_PERMISSIONS:
+        raise HTTPException(status_code=400, detail=f"Operation must be one of: {', '.join(BATCH_PERMISSIONS)}")
+    source = _resolve_existing(request, [operation.path])[0]
+    if source == settings.SERVE_PATH:
+        raise HTTPException(status_code=400, detail="Can't change the root folder")
+    if operation.op == "delete":
+        return source, None
+
+    if operation.op == "rename":
+        name = operation.new_name or ""
+        if name in ("", ".", "..") or "/" in name or "\\" in name or is_path_forbidden(Path(name)):
+            raise HTTPException(status_code=400, detail="Invalid new name")
+        target = source.parent / name
+    else:
+        if operation.destination is None:
+            raise HTTPException(status_code=400, detail="A destination is required")
+        destination = _resolve_existing(request, [operation.destination])[0]
+        if not destination.is_dir():
+            raise HTTPException(status_code=400, detail="Destination is not a directory")
+        if source.is_dir() and destination.is_relative_to(source):
+            raise HTTPException(status_code=400, detail=f"Can't move '{source.name}' into itself")
+        target = destination / source.name
+    if target.exists() or target.is_symlink():
+        raise HTTPException(status_code=409, detail=f"'{target.name}' already exists")
+    return source, target
+
+async def _run_batch_operation(request: Request, operation: BatchOperation, source: Path, result: dict, slots: asyncio.Semaphore):
+    """Renames an item or moves it to the trash, recording the outcome in `result`."""
+    async with slots:
+        try:
+            if operation.op == "rename":
+                await rename_item(request, source.relative_to(settings.SERVE_PATH), operation.new_name)
+                listing_cache.invalidate(source.parent)
+                listing_cache.invalidate(source)
+                file_index.schedule_rescan(source.parent)
+                result.update(status="done")
+            else:
+                item = await asyncio.to_thread(trash.trash, source, _username(request))
+                result.update(status="done", trash_id=item["id"])
+        except HTTPException as e:
+            result.update(status="failed", reason=e.detail)
+        except Exception as e:
+            logger.error(f"Batch {operation.op} of {source} failed: {e}")
+            result.update(status="failed", reason=str(e))
+
+@router.post("/fs/batch", tags=["Mobile API"], summary="Delete, rename and move many items in one request")
+async def batch_operations(request: Request, body: BatchRequest):
+    """
+    Runs a list of delete, rename and move operations and returns a result per
+    operation, in order. Permissions are checked once per folder involved.
+    Renames and moves to the trash run concurrently (BATCH_CONCURRENCY at a
+    time); permanent deletes and moves start one background job for the deletes
+    and one per destination (see /api/v1/fs/jobs/{id}). Operations whose paths
+    overlap an earlier one in the batch fail with 409 instead of racing it.
+    """
+    if not body.operations or len(body.operations) > settings.BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {settings.BATCH_MAX_OPERATIONS} operations are required")
+
+    results = [{"op": operation.op, "path": operation.path, "status": "failed"} for operation in body.operations]
+    planned: Dict[int, Tuple[Path, Optional[Path]]] = {}
+    claimed = set() # Paths touched by the operations accepted so far
+    enclosing = set() # ...and every folder above them
+    for index, operation in enumerate(body.operations):
+        try:
+            source, target = _plan_batch_operation(request, operation)
+        except HTTPException as e:
+            results[index]["reason"] = e.detail
+            continue
+        touched = [path for path in (source, target) if path is not None]
+        if any(path in claimed or path in enclosing or not claimed.isdisjoint(path.parents) for path in touched):
+            results[index]["reason"] = "Overlaps an earlier operation in this batch"
+            continue
+        claimed.update(touched)
+        for path in touched:
+            enclosing.update(path.parents)
+        planned[index] = (source, target)
+
+    # One pmask lookup per distinct folder
+    needed = {}
+    for index, (source, target) in planned.items():
+        op = body.operations[index].op
+        needed[index] = [(source.parent, BATCH_PERMISSIONS[op])]
+        if op == "move":
+            needed[index].append((target.parent, 'w'))
+    directories = list(dict.fromkeys(directory for checks in needed.values() for directory, _ in checks))
+    pmasks = dict(zip(directories, await asyncio.gather(
+        *(get_pmask(request, directory.relative_to(settings.SERVE_PATH)) for directory in directories)
+    )))
+    for index, checks in needed.items():
+        if any(flag not in pmasks[directory] for directory, flag in checks):
+            logger.warning(f"Batch {body.operations[index].op} denied for {body.operations[index].path}")
+            results[index]["reason"] = "Permission denied"
+            del planned[index]
+
+    slots = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    running = []
+    permanent: List[int] = []
+    moves: Dict[Path, List[int]] = {}
+    for index, (source, target) in planned.items():
+        operation = body.operations[index]
+        if operation.op == "move":
+            moves.setdefault(target.parent, []).append(index)
+        elif operation.op == "delete" and (operation.permanent or not settings.TRASH_ENABLED):
+            permanent.append(index)
+        else:
+            running.append(_run_batch_operation(request, operation, source, results[index], slots))
+    await asyncio.gather(*running)
+
+    # Background jobs: the items' results point at the job
+    username = _username(request)
+    if permanent:
+        try:
+            job = await transfers.delete([planned[index][0] for index in permanent], username)
+            for index in permanent:
+                results[index].update(status="started", job_id=job.id)
+        except OSError as e:
+            logger.error(f"Batch delete failed: {e}")
+            for index in permanent:
+                results[index]["reason"] = str(e)
+    for destination, indexes in moves.items():
+        try:
+            job = transfers.submit("move", [planned[index][0] for index in indexes], destination, username)
+            for index in indexes:
+                results[index].update(status="started", job_id=job.id)
+        except TransferError as e:
+            for index in indexes:
+                results[index]["reason"] = e.detail
+
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("done", "started", "failed")}
+    logger.info(f"Batch of {len(results)} operations: {counts}")
+    return {**counts, "results": results}
+
+# --- Trash ---
+
+@router.get("/trash", tags=["Mobile API"], summary="List items in the trash")
+async def list_trash(request: Request):
+    """Returns the user's deleted items, newest first, with when each expires."""
+    items = await asyncio.to_thread(trash.list_items, _username(request))
+    return JSONResponse({"items": items}, headers={"Cache-Control": "no-store"})
+
+@router.post("/trash/{item_id}/restore", tags=["Mobile API"], summary="Restore an item from the trash")
+async def restore_trash_item(request: Request, item_id: str):
+    """Moves the item back to its original path; requires 'w' permission there."""
+    username = _username(request)
+    try:
+        item = await asyncio.to_thread(trash.get, item_id, username)
+    except TrashError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # The nearest existing folder on the way back is the one the item is added to
+    parent = (settings.SERVE_PATH / item["original_path"]).parent
+    while not parent.is_dir() and parent != settings.SERVE_PATH:
+        parent = parent.parent
+    await _require_permission(request, [parent], 'w', "Write")
+
+    try:
+        target = await asyncio.to_thread(trash.restore, item_id, username)
+    except TrashError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return JSONResponse(
+        {"status": "success", "path": target.relative_to(settings.SERVE_PATH).as_posix()},
+        headers={"HX-Trigger": '{"show-toast": {"message": "Item restored", "type": "success"}}'}
+    )
+
+@router.delete("/trash/{item_id}", status_code=204, tags=["Mobile API"], summary="Permanently delete an item from the trash")
+async def delete_trash_item(request: Request, item_id: str):
+    if not await asyncio.to_thread(trash.purge, _username(request), [item_id]):
+        raise HTTPException(status_code=404, detail="Item not found")
+    trash.wake()
+    return Response(status_code=204)
+
+@router.post("/trash/purge", tags=["Mobile API"], summary="Empty the trash")
+async def purge_trash(request: Request, body: TrashPurgeRequest = TrashPurgeRequest()):
+    """
+    Permanently deletes the given items, or all of the user's items. They leave
+    the trash at once; their data is removed in the background.
+    """
+    purged = await asyncio.to_thread(trash.purge, _username(request), body.ids)
+    trash.wake()
+    return {"purged": purged}
+
+@router.post("/previews/{full_path:path}", tags=["Mobile API"], summary="Queue preview generation for a folder")
+async def pregenerate_previews(request: Request, full_path: str, recursive: bool = False):
+    """
+    Queues thumbnail (and other preview) generation for the files of a directory,
+    ahead of uploads waiting in the background queue. Requires 'r' permission.
+    """
+    base_serve_dir = settings.SERVE_PATH
+
+    try:
+        full_path = urllib.parse.unquote(full_path)
+        resolved_path = validate_and_resolve_path(
+            requested_path=Path(full_path),
+            base_dir=base_serve_dir,
+            client_host=request.client.host
+        )
+
+        if not resolved_path.is_dir():
+            raise HTTPException(status_code=404, detail="Directory not found")
+
+        pmask = await get_pmask(request, resolved_path.relative_to(base_serve_dir))
+        if 'r' not in pmask:
+            raise HTTPException(status_code=403, detail="Read permission denied")
+
+        queued = await asyncio.to_thread(pregeneration_queue.enqueue_directory, resolved_path, PRIORITY_DIRECTORY, recursive)
+        return {"queued": queued}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error queueing previews for {full_path}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/video/preview/{full_path:path}", tags=["Mobile API"], summary="Video poster frame and seek previews")
+async def video_preview(request: Request, full_path: str, asset: str = "info"):
+    """
+    Returns a video's poster frame (`asset=poster`), its sprite sheet of evenly
+    spaced frames (`sprite`), a WebVTT thumbnail track into the sprite (`vtt`),
+    or the sheet layout with links to the others (`info`, the default).
+    Rendered once by ffmpeg and cached until the video changes.
+    """
+    base_serve_dir = settings.SERVE_PATH
+    if asset not in ("info", "poster", "sprite", "vtt"):
+        raise HTTPException(status_code=400, detail="Invalid asset. Use 'info', 'poster', 'sprite' or 'vtt'")
+
+    try:
+        full_path = urllib.parse.unquote(full_path)
+        resolved_path = validate_and_resolve_path(
+            requested_path=Path(full_path),
+            base_dir=base_serve_dir,
+            client_host=request.client.host
+        )
+
+        if not resolved_path.is_file() or resolved_path.suffix.lower() not in VIDEO_EXTENSIONS:
+            raise HTTPException(status_code=404, detail="Video not found")
+        if not video_previews.available:
+            raise HTTPException(status_code=503, detail="Video previews are unavailable (ffmpeg not found)")
+
+        rel_path = resolved_path.relative_to(base_serve_dir)
+        pmask = await get_pmask(request, rel_path.parent)
+        if 'r' not in pmask:
+            raise HTTPException(status_code=403, detail="Read permission denied")
+
+        # The cache entry is named after the video's version, so it doubles as the validator
+        entry = video_previews.entry_dir(rel_path.as_posix(), resolved_path.stat())
+        etag = f'"{entry.parent.name[:16]}-{entry.name}-{asset}"'
+        headers = {"ETag": etag, "Cache-Control": f"private, max-age={settings.VIDEO_PREVIEW_MAX_AGE_SECONDS}"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        entry = await video_previews.get(resolved_path, rel_path.as_posix())
+        if entry is None:
+            raise HTTPException(status_code=422, detail="Could not extract frames from this video")
+
+        if asset == "poster":
+            return FileResponse(entry / POSTER_NAME, media_type="image/jpeg", headers=headers)
+        if asset == "sprite":
+            return FileResponse(entry / SPRITE_NAME, media_type="image/jpeg", headers=headers)
+
+        meta = await asyncio.to_thread(video_previews.load_meta, entry)
+        if meta is None:
+            raise HTTPException(status_code=500, detail="Internal server error")
+        base_url = "/api/v1/video/preview/" + "/".join(urllib.parse.quote(part) for part in rel_path.parts)
+        if asset == "vtt":
+            return Response(build_vtt(meta, f"{base_url}?asset=sprite"), media_type="text/vtt", headers=headers)
+        return JSONResponse({
+            **meta,
+            "poster": f"{base_url}?asset=poster",
+            "sprite": f"{base_url}?asset=sprite",
+            "vtt": f"{base_url}?asset=vtt",
+        }, headers=headers)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error building video previews for {full_path}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.get("/gallery/{full_path:path}", tags=["Mobile API"], summary="Get media metadata for gallery")
-async def get_gallery_metadata(request: Request, full_path: str):
+async def get_gallery_metadata(request: Request, response: Response, full_path: str, source: Optional[str] = None):
     """
     Returns a list of previewable media files in the same directory as the target path.
     Used for lightbox navigation on web and media discovery on mobile.
+    Supports ETag / If-None-Match revalidation and the `source` flag like the directory listing.
     """
     base_serve_dir = settings.SERVE_PATH
+    from_index = _resolve_source(source)
     
     try:
         # Unquote path to handle spaces from URL
@@ -354,32 +1054,42 @@ async def get_gallery_metadata(request: Request, full_path: str):
         if not resolved_dir.is_dir():
             raise HTTPException(status_code=404, detail="Directory not found")
 
+        pmask = await get_pmask(request, target_dir)
+        etag = directory_etag(resolved_dir, pmask, "gallery", str(target_dir), _listing_source(from_index))
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = LISTING_CACHE_CONTROL
+
+        rel_dir = resolved_dir.relative_to(base_serve_dir)
+        
         gallery_items = []
-        for item in sorted(resolved_dir.iterdir(), key=lambda f: f.name.lower()):
-            if item.is_file() and item.suffix.lower() in PREVIEWABLE_EXTENSIONS:
-                if not is_path_forbidden(item):
-                    rel_path = item.relative_to(base_serve_dir)
-                    
-                    item_type = "image"
-                    if item.suffix.lower() in VIDEO_EXTENSIONS:
-                        item_type = "video"
-                    elif item.suffix.lower() in TEXT_EXTENSIONS:
-                        item_type = "text"
-
-                    # Encode path parts for URL safety
-                    encoded_rel_path = "/".join([urllib.parse.quote(part) for part in rel_path.parts])
-
-                    gallery_items.append({
-                        "name": item.name,
-                        "path": str(rel_path),
-                        "type": item_type,
-                        "url": f"/download/{encoded_rel_path}",
-                        "thumb": f"/download/{encoded_rel_path}?thumb=300x300"
-                    })
+        for item in await asyncio.to_thread(_scan, resolved_dir, from_index):
+            suffix = item.suffix.lower()
+            if item.is_file() and suffix in PREVIEWABLE_EXTENSIONS:
+                rel_path = rel_dir / item.name
+                
+                item_type = "image"
+                if suffix in VIDEO_EXTENSIONS:
+                    item_type = "video"
+                elif suffix in TEXT_EXTENSIONS:
+                    item_type = "text"
+
+                # Encode path parts for URL safety
+                encoded_rel_path = "/".join([urllib.parse.quote(part) for part in rel_path.parts])
+
+                gallery_items.append({
+                    "name": item.name,
+                    "path": str(rel_path),
+                    "type": item_type,
+                    "url": f"/download/{encoded_rel_path}",
+                    "thumb": f"/download/{encoded_rel_path}?thumb=300x300"
+                })
 
         return {
             "current_dir": str(target_dir),
-            "pmask": get_pmask(request, target_dir),
+            "pmask": pmask,
             "items": gallery_items
         }
 
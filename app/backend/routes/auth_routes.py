@@ -1,5 +1,5 @@
 import logging
-import requests
+import httpx
 from typing import Optional
 from fastapi import APIRouter, Request, HTTPException, Form, Depends
 from fastapi.responses import JSONResponse
@@ -8,21 +8,23 @@ from app.core.auth import get_basic_auth_header, encrypt_string
 from app.core.security import hasher
 from app.core.config import settings
 from app.core.session_manager import session_manager
+from app.core.pmask_cache import pmask_cache
 from app.backend.database.session import SessionLocal
 from app.backend.database.models import User
 from app.backend.models.user_schemas import Token
-from app.backend.services.copyparty_service import get_user_permissions_from_config
+from app.backend.services.copyparty_service import get_user_permissions_from_config, get_http_client
 from scripts.manage import sync_users_to_copyparty
 
 router = APIRouter(prefix="/api/v1/auth")
 logger = logging.getLogger(__name__)
 
-def verify_with_copyparty(username: str, internal_pw: str) -> bool:
+async def verify_with_copyparty(username: str, internal_pw: str) -> bool:
     """Performs a handshake verification with the Copyparty backend."""
     try:
         url = f"http://{settings.COPYPARTY_HOST}:{settings.COPYPARTY_PORT}/?pmask"
         auth = (username, internal_pw)
-        response = requests.get(url, auth=auth, timeout=5)
+        timeout = httpx.Timeout(settings.COPYPARTY_PMASK_TIMEOUT, connect=settings.COPYPARTY_CONNECT_TIMEOUT)
+        response = await get_http_client().get(url, auth=auth, timeout=timeout)
         return response.status_code == 200
     except Exception as e:
         logger.error(f"Copyparty handshake failed: {e}")
@@ -54,7 +56,7 @@ async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequ
                 logger.error(f"Failed to sync users after hash update: {e}")
 
         # 1. Verify with Copyparty Backend (Handshake)
-        if not verify_with_copyparty(user.username, internal_pw):
+        if not await verify_with_copyparty(user.username, internal_pw):
             logger.error(f"Login rejected: Copyparty backend handshake failed for user '{user.username}'")
             raise HTTPException(status_code=502, detail="Backend file server synchronization error.")
 
@@ -73,6 +75,7 @@ async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequ
         auth_header = get_basic_auth_header(user.username, internal_pw)
         session.username = user.username
         session.permissions = permissions
+        pmask_cache.invalidate(user.username)
         session.auth_header = encrypt_string(auth_header)
         session.log_activity(f"User '{user.username}' logged in via API. Permissions: {permissions}")
         session_manager.save_sessions()
@@ -141,7 +144,7 @@ async def login(
                         logger.error(f"Failed to sync users after hash update: {e}")
 
                 # 1. Verify with Copyparty Backend (Handshake)
-                if not verify_with_copyparty(user.username, internal_pw):
+                if not await verify_with_copyparty(user.username, internal_pw):
                     logger.error(f"Login rejected: Copyparty backend handshake failed for user '{user.username}'")
                     raise HTTPException(status_code=502, detail="Backend file server synchronization error.")
 
@@ -163,6 +166,7 @@ async def login(
                 
                 session.username = user.username
                 session.permissions = permissions
+                pmask_cache.invalidate(user.username)
                 session.auth_header = encrypt_string(auth_header)
                 session.log_activity(f"User '{user.username}' logged in. Permissions: {permissions}")
                 
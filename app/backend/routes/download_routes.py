@@ -1,21 +1,56 @@
 import logging
 from fastapi import APIRouter, Request, HTTPException, Depends
+from fastapi.responses import FileResponse, Response
 from pathlib import Path
 
 from app.core.config import settings
 from app.core.file_security import validate_and_resolve_path
+from app.core.listing import etag_matches
 from app.backend.services import copyparty_service
+from app.backend.services.local_file_service import LocalFileResponse, can_serve_locally
+from app.backend.services.thumbnail_service import (
+    thumbnail_cache, thumbnail_key, parse_thumb_size, can_thumbnail_locally
+)
 from app.core.metrics import metrics
 from app.core.auth import auth_required
 
 router = APIRouter(dependencies=[Depends(auth_required)])
 logger = logging.getLogger(__name__)
 
+async def _local_thumbnail(request: Request, resolved_path: Path, relative_path: Path, thumb: str):
+    """
+    Serves a cached WebP thumbnail, or None to fall back to copyparty (unknown
+    size format, no read permission, undecodable image).
+    """
+    size = parse_thumb_size(thumb)
+    if size is None:
+        return None
+    pmask = await copyparty_service.get_pmask(request, relative_path.parent)
+    if "r" not in pmask:
+        return None
+
+    st = resolved_path.stat()
+    key = thumbnail_key(relative_path.as_posix(), size, st)
+    headers = {
+        "ETag": f'"{key}"',
+        "Cache-Control": f"private, max-age={settings.THUMBNAIL_MAX_AGE_SECONDS}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    thumbnail = await thumbnail_cache.get(resolved_path, key, size)
+    if thumbnail is None:
+        return None
+    return FileResponse(thumbnail, media_type="image/webp", headers=headers)
+
 @router.get("/download/{full_path:path}", tags=["Mobile API"], summary="Stream or download a file")
 async def download_file(request: Request, full_path: str):
     """
-    Proxies a file download or media request to the copyparty backend.
-    Supports query parameters for thumbnails (?thumb=WxH) and Range headers for video streaming.
+    Streams a file or media request. Files the user can read are served straight
+    from disk (Range, If-Range and conditional requests handled locally) unless
+    LOCAL_SERVING_ENABLED is off. Image thumbnails (?thumb=WxH) are rendered and
+    cached locally when Pillow is available; everything else, including video
+    thumbnails, is proxied to the copyparty backend.
     """
     logger.info(f"File request received for path: {full_path}")
     base_serve_dir = settings.SERVE_PATH
@@ -42,9 +77,20 @@ async def download_file(request: Request, full_path: str):
             else:
                 logger.warning("Download route: No active session found in request.state")
 
-            logger.debug(f"Proxying request for: {relative_path} with params: {query_params}")
             metrics.record_download()
+
+            if "thumb" in query_params and can_thumbnail_locally(resolved_path):
+                response = await _local_thumbnail(request, resolved_path, relative_path, query_params["thumb"])
+                if response is not None:
+                    return response
             
+            if can_serve_locally(query_params):
+                pmask = await copyparty_service.get_pmask(request, relative_path.parent)
+                if "r" in pmask:
+                    logger.debug(f"Serving from disk: {relative_path}")
+                    return LocalFileResponse(resolved_path, request.headers, inline="media" in query_params)
+            
+            logger.debug(f"Proxying request for: {relative_path} with params: {query_params}")
             return await copyparty_service.proxy_stream_request(
                 request=request,
                 relative_path=relative_path,
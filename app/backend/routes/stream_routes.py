@@ -0,0 +1,90 @@
+import re
+import logging
+import urllib.parse
+from fastapi import APIRouter, Request, HTTPException, Depends, Response
+from fastapi.responses import FileResponse
+from pathlib import Path
+
+from app.core.config import settings
+from app.core.constants import VIDEO_EXTENSIONS
+from app.core.file_security import validate_and_resolve_path
+from app.backend.services import copyparty_service
+from app.backend.services.hls_service import hls_transcoder, HlsError
+from app.core.auth import auth_required
+
+router = APIRouter(dependencies=[Depends(auth_required)])
+logger = logging.getLogger(__name__)
+
+SEGMENT_RE = re.compile(r"^(\d{5})\.ts$")
+PLAYLIST_CACHE_CONTROL = "private, max-age=60"
+# Segment URLs don't carry the video's version, so clients keep them for a while only
+SEGMENT_CACHE_CONTROL = "private, max-age=3600"
+
+def _split_hls_path(full_path: str):
+    """
+    Splits '/hls/<video>/master.m3u8', '/hls/<video>/<rendition>/index.m3u8' and
+    '/hls/<video>/<rendition>/<n>.ts' into (video, rendition, file name).
+    """
+    if full_path.endswith("/master.m3u8"):
+        return full_path[:-len("/master.m3u8")], None, "master.m3u8"
+    parts = full_path.rsplit("/", 2)
+    if len(parts) != 3:
+        raise HTTPException(status_code=404, detail="Not found")
+    return parts[0], parts[1], parts[2]
+
+@router.get("/hls/{full_path:path}", tags=["Mobile API"], summary="Adaptive HLS stream of a video")
+async def hls_stream(request: Request, full_path: str):
+    """
+    Serves a video as HLS: `<video>/master.m3u8` lists the renditions,
+    `<video>/<rendition>/index.m3u8` their segments, which are transcoded on
+    demand as the player requests them.
+    """
+    if not hls_transcoder.available:
+        raise HTTPException(status_code=503, detail="Transcoding is unavailable (ffmpeg not found)")
+
+    base_serve_dir = settings.SERVE_PATH
+    video_path, rendition, name = _split_hls_path(urllib.parse.unquote(full_path))
+
+    try:
+        resolved_path = validate_and_resolve_path(
+            requested_path=Path(video_path),
+            base_dir=base_serve_dir,
+            client_host=request.client.host
+        )
+
+        if not resolved_path.is_file() or resolved_path.suffix.lower() not in VIDEO_EXTENSIONS:
+            raise HTTPException(status_code=404, detail="Video not found")
+
+        rel_path = resolved_path.relative_to(base_serve_dir)
+        pmask = await copyparty_service.get_pmask(request, rel_path.parent)
+        if 'r' not in pmask:
+            raise HTTPException(status_code=403, detail="Read permission denied")
+
+        rel = rel_path.as_posix()
+        if rendition is None or name == "index.m3u8":
+            version = hls_transcoder.version_dir(rel, resolved_path.stat())
+            info = await hls_transcoder.info(resolved_path, version)
+            if rendition is None:
+                playlist = hls_transcoder.master_playlist(info)
+            else:
+                hls_transcoder.rendition(info, rendition)
+                playlist = hls_transcoder.media_playlist(info)
+            return Response(
+                playlist,
+                media_type="application/vnd.apple.mpegurl",
+                headers={"Cache-Control": PLAYLIST_CACHE_CONTROL}
+            )
+
+        match = SEGMENT_RE.match(name)
+        if not match:
+            raise HTTPException(status_code=404, detail="Not found")
+        segment = await hls_transcoder.segment(resolved_path, rel, rendition, int(match.group(1)))
+        return FileResponse(segment, media_type="video/mp2t", headers={"Cache-Control": SEGMENT_CACHE_CONTROL})
+
+    except HlsError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"HLS error for '{full_path}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -1,12 +1,19 @@
+import json
+import asyncio
 import logging
-from fastapi import APIRouter, UploadFile, File, Request, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, Request, HTTPException, Depends, Response
+from fastapi.responses import JSONResponse
 from fastapi.templating import Jinja2Templates
-from typing import List
+from typing import List, Optional
 from pathlib import Path
 
 from app.core.config import settings
 from app.core.file_security import validate_and_resolve_path, is_path_forbidden
-from app.backend.services.copyparty_service import proxy_upload_request
+from app.core.listing import scan_directory, listing_cache
+from app.backend.services.copyparty_service import proxy_upload_request, get_pmask
+from app.backend.services.upload_service import resumable_uploads, UploadError
+from app.backend.services.index_service import file_index
+from app.backend.services.pregeneration_queue import pregeneration_queue, PRIORITY_UPLOAD
 from app.core.metrics import metrics
 from app.core.templates import templates
 from app.core.auth import auth_required
@@ -14,16 +21,43 @@ from app.core.auth import auth_required
 router = APIRouter(dependencies=[Depends(auth_required)])
 logger = logging.getLogger(__name__)
 
+# Uploads proxied to copyparty at once, across all requests
+_upload_slots = asyncio.Semaphore(settings.UPLOAD_MAX_CONCURRENCY)
+
+async def _upload_one(request: Request, relative_target_dir: Path, file: UploadFile, request_slots: asyncio.Semaphore) -> dict:
+    """Uploads one file and returns its result: uploaded, skipped (forbidden name) or failed."""
+    result = {"name": file.filename, "status": "uploaded"}
+    # Basic check for forbidden filenames before sending to backend
+    if not file.filename or is_path_forbidden(Path(file.filename)):
+        logger.warning(f"Skipping forbidden filename: {file.filename}")
+        return {**result, "status": "skipped", "reason": "Forbidden file name"}
+
+    async with request_slots, _upload_slots:
+        try:
+            await proxy_upload_request(request, relative_target_dir, file)
+        except HTTPException as e:
+            logger.error(f"Failed to upload {file.filename}: {e.detail}")
+            return {**result, "status": "failed", "reason": e.detail}
+        except Exception as e:
+            logger.error(f"Failed to upload {file.filename}: {e}")
+            return {**result, "status": "failed", "reason": str(e)}
+    metrics.record_upload()
+    return result
+
 @router.post("/upload/{full_path:path}")
 async def upload_files(
     request: Request,
     full_path: str,
-    files: List[UploadFile] = File(...)
+    files: List[UploadFile] = File(...),
+    format: Optional[str] = None
 ):
     """
     Handles file uploads to a specific directory.
-    Proxies the upload to the copyparty backend.
-    Returns the updated file list (HTMX partial).
+    Proxies the files to the copyparty backend concurrently (up to
+    UPLOAD_CONCURRENCY_PER_REQUEST per request and UPLOAD_MAX_CONCURRENCY overall),
+    so one slow file doesn't hold up the others.
+    Returns the updated file list (HTMX partial), or per-file results if
+    format=json or Accept: application/json is set.
     """
     base_serve_dir = settings.SERVE_PATH
     logger.info(f"Upload request for path: '{full_path}' with {len(files)} files")
@@ -38,41 +72,38 @@ async def upload_files(
         if not resolved_path.is_dir():
             raise HTTPException(status_code=400, detail="Target path is not a directory.")
 
-        success_count = 0
-        for file in files:
-            # Basic check for forbidden filenames before sending to backend
-            if is_path_forbidden(Path(file.filename)):
-                logger.warning(f"Skipping forbidden filename: {file.filename}")
-                continue
-                
-            try:
-                # Calculate the relative path within the SERVE_DIR to avoid absolute path nesting in backend
-                relative_target_dir = resolved_path.relative_to(base_serve_dir)
-                
-                if proxy_upload_request(request, relative_target_dir, file):
-                    success_count += 1
-                    metrics.record_upload()
-            except Exception as e:
-                logger.error(f"Failed to upload {file.filename}: {e}")
-                # Continue uploading other files? Or fail?
-                # For now, log and continue.
+        # Calculate the relative path within the SERVE_DIR to avoid absolute path nesting in backend
+        relative_target_dir = resolved_path.relative_to(base_serve_dir)
+        request_slots = asyncio.Semaphore(settings.UPLOAD_CONCURRENCY_PER_REQUEST)
+        results = await asyncio.gather(*(
+            _upload_one(request, relative_target_dir, file, request_slots) for file in files
+        ))
 
+        uploaded = [resolved_path / Path(r["name"]).name for r in results if r["status"] == "uploaded"]
+        success_count = len(uploaded)
         logger.info(f"Successfully uploaded {success_count}/{len(files)} files.")
+        listing_cache.invalidate(resolved_path)
+        file_index.schedule_rescan(resolved_path)
+        # Render previews now, so the first gallery visit doesn't wait for them
+        await asyncio.to_thread(pregeneration_queue.enqueue, uploaded, PRIORITY_UPLOAD)
+
+        if format == "json" or "application/json" in request.headers.get("accept", ""):
+            counts = {status: sum(1 for r in results if r["status"] == status) for status in ("uploaded", "skipped", "failed")}
+            return {"path": relative_target_dir.as_posix(), **counts, "files": results}
 
         # Refresh directory listing
-        contents = sorted(resolved_path.iterdir(), key=lambda f: (not f.is_dir(), f.name.lower()))
-        filtered_contents = [item for item in contents if not is_path_forbidden(item)]
-        
         context = {
             "request": request,
             "path": full_path,
-            "contents": filtered_contents,
+            "contents": scan_directory(resolved_path),
         }
         
         # Return the updated file grid
         # Include HX-Trigger for toast notification
+        failed = len(files) - success_count
+        message = f"Successfully uploaded {success_count} files" + (f", {failed} not uploaded" if failed else "")
         response = templates.TemplateResponse("partials/file_browser_content.html", context)
-        response.headers["HX-Trigger"] = f'{{"show-toast": {{"message": "Successfully uploaded {success_count} files", "type": "success"}}}}'
+        response.headers["HX-Trigger"] = json.dumps({"show-toast": {"message": message, "type": "warning" if failed else "success"}})
         return response
 
     except HTTPException as e:
@@ -80,3 +111,131 @@ async def upload_files(
     except Exception as e:
         logger.error(f"Unexpected error during upload: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal Server Error during upload.")
+
+@router.put("/upload/{full_path:path}", status_code=201, tags=["Mobile API"], summary="Upload a file as the request body")
+async def stream_upload(request: Request, full_path: str):
+    """
+    Writes the raw request body to `full_path` (directory and file name) as it
+    arrives, without spooling it to a temporary file first. Requires 'w'
+    permission in the directory. Send `X-Checksum-Sha256` (hex) to have the
+    file verified before it is moved into place.
+    """
+    base_serve_dir = settings.SERVE_PATH
+    try:
+        resolved_path = validate_and_resolve_path(
+            requested_path=Path(full_path),
+            base_dir=base_serve_dir,
+            client_host=request.client.host if request.client else "unknown"
+        )
+        if is_path_forbidden(resolved_path) or resolved_path == base_serve_dir:
+            raise HTTPException(status_code=400, detail="Invalid file name")
+        if not resolved_path.parent.is_dir():
+            raise HTTPException(status_code=400, detail="Target directory does not exist.")
+
+        pmask = await get_pmask(request, resolved_path.parent.relative_to(base_serve_dir))
+        if 'w' not in pmask:
+            raise HTTPException(status_code=403, detail="Write permission denied")
+
+        length = request.headers.get("content-length")
+        if length is not None and not length.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Content-Length")
+        uploaded = await resumable_uploads.write_stream(
+            resolved_path, request.stream(),
+            size=int(length) if length is not None else None,
+            sha256=request.headers.get("x-checksum-sha256")
+        )
+    except UploadError as e:
+        return _upload_error(e)
+
+    listing_cache.invalidate(resolved_path.parent)
+    file_index.schedule_rescan(resolved_path.parent)
+    await asyncio.to_thread(pregeneration_queue.enqueue, [resolved_path], PRIORITY_UPLOAD)
+    metrics.record_upload()
+    logger.info(f"Streamed upload of '{uploaded['path']}' ({uploaded['size']} bytes)")
+    return JSONResponse(uploaded, status_code=201)
+
+
+# --- Resumable uploads ---
+
+def _username(request: Request) -> str:
+    session = getattr(request.state, "session", None)
+    return getattr(session, "username", None) or ""
+
+def _upload_error(e: UploadError) -> JSONResponse:
+    """Error response that tells the client where to resume."""
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+    return JSONResponse({"detail": e.detail, "offset": e.offset}, status_code=e.status_code, headers=headers)
+
+@router.post("/uploads", status_code=201, tags=["Mobile API"], summary="Start a resumable upload")
+async def create_upload(request: Request, path: str, size: int):
+    """
+    Starts a resumable upload of `size` bytes to `path` (directory and file name).
+    Requires 'w' permission in the directory. Send the data with
+    `PUT /uploads/{id}?offset=N`, then `POST /uploads/{id}/complete`.
+    """
+    base_serve_dir = settings.SERVE_PATH
+    try:
+        resolved_path = validate_and_resolve_path(
+            requested_path=Path(path),
+            base_dir=base_serve_dir,
+            client_host=request.client.host if request.client else "unknown"
+        )
+        if is_path_forbidden(resolved_path) or resolved_path == base_serve_dir:
+            raise HTTPException(status_code=400, detail="Invalid file name")
+        if not resolved_path.parent.is_dir():
+            raise HTTPException(status_code=400, detail="Target directory does not exist.")
+
+        pmask = await get_pmask(request, resolved_path.parent.relative_to(base_serve_dir))
+        if 'w' not in pmask:
+            raise HTTPException(status_code=403, detail="Write permission denied")
+
+        upload = await asyncio.to_thread(resumable_uploads.create, _username(request), resolved_path, size)
+        upload["chunk_size"] = settings.UPLOAD_CHUNK_SIZE
+        logger.info(f"Resumable upload {upload['id']} started: '{upload['path']}' ({size} bytes)")
+        return JSONResponse(upload, status_code=201, headers={"Location": f"/uploads/{upload['id']}"})
+    except UploadError as e:
+        return _upload_error(e)
+
+@router.api_route("/uploads/{upload_id}", methods=["GET", "HEAD"], tags=["Mobile API"], summary="Get the offset to resume from")
+async def get_upload(request: Request, upload_id: str):
+    """Returns the upload's size and the number of bytes received so far (also as `Upload-Offset`)."""
+    try:
+        upload = await asyncio.to_thread(resumable_uploads.status, upload_id, _username(request))
+    except UploadError as e:
+        return _upload_error(e)
+    return JSONResponse(upload, headers={"Upload-Offset": str(upload["offset"]), "Cache-Control": "no-store"})
+
+@router.put("/uploads/{upload_id}", tags=["Mobile API"], summary="Send a chunk of a resumable upload")
+async def put_upload_chunk(request: Request, upload_id: str, offset: int):
+    """
+    Writes the request body at `offset`, which must equal the bytes received so
+    far; a mismatch answers 409 with the offset to resume from.
+    """
+    try:
+        upload = await resumable_uploads.write_chunk(upload_id, _username(request), offset, request.stream())
+    except UploadError as e:
+        return _upload_error(e)
+    return JSONResponse(upload, headers={"Upload-Offset": str(upload["offset"])})
+
+@router.post("/uploads/{upload_id}/complete", tags=["Mobile API"], summary="Finish a resumable upload")
+async def complete_upload(request: Request, upload_id: str):
+    """Moves the received file into place once all bytes have arrived."""
+    try:
+        target = await asyncio.to_thread(resumable_uploads.complete, upload_id, _username(request))
+    except UploadError as e:
+        return _upload_error(e)
+
+    listing_cache.invalidate(target.parent)
+    file_index.schedule_rescan(target.parent)
+    await asyncio.to_thread(pregeneration_queue.enqueue, [target], PRIORITY_UPLOAD)
+    metrics.record_upload()
+    logger.info(f"Resumable upload {upload_id} completed: '{target}'")
+    return {"path": target.relative_to(settings.SERVE_PATH).as_posix(), "size": target.stat().st_size}
+
+@router.delete("/uploads/{upload_id}", status_code=204, tags=["Mobile API"], summary="Cancel a resumable upload")
+async def abort_upload(request: Request, upload_id: str):
+    try:
+        await asyncio.to_thread(resumable_uploads.abort, upload_id, _username(request))
+    except UploadError as e:
+        return _upload_error(e)
+    return Response(status_code=204)
@@ -0,0 +1,152 @@
+import os
+import stat
+import tarfile
+import zipfile
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+from app.core.config import settings
+from app.core.constants import COMPRESSED_EXTENSIONS
+from app.core.file_security import is_name_forbidden
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_MEDIA_TYPES = {"zip": "application/zip", "tar": "application/x-tar"}
+
+Entry = Tuple[Path, str, os.stat_result]
+
+class _Sink:
+    """
+    Unseekable write target for zipfile. Written data is handed out with
+    `drain()` instead of being kept, so zipfile uses data descriptors and the
+    archive never exists as a whole.
+    """
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def archive_roots(paths: Iterable[Path]) -> List[Tuple[Path, str]]:
+    """Pairs each path with a top-level name in the archive, numbering duplicates."""
+    roots = []
+    taken = set()
+    for path in paths:
+        name = path.name or "files"
+        stem, suffix = os.path.splitext(name) if path.is_file() else (name, "")
+        n = 1
+        while name in taken:
+            n += 1
+            name = f"{stem} ({n}){suffix}"
+        taken.add(name)
+        roots.append((path, name))
+    return roots
+
+def iter_entries(roots: Iterable[Tuple[Path, str]]) -> Iterator[Entry]:
+    """
+    Yields (path, name in archive, stat) for each root and everything below it,
+    directories before their contents. Forbidden names are left out, as are
+    symlinked directories and links pointing outside SERVE_PATH.
+    """
+    base = settings.SERVE_PATH.resolve()
+    for root, name in roots:
+        stack = [(root, name)]
+        while stack:
+            path, arcname = stack.pop()
+            try:
+                st = path.stat()
+            except OSError as e:
+                logger.warning(f"Skipping '{path}' in archive: {e}")
+                continue
+            yield path, arcname, st
+            if not stat.S_ISDIR(st.st_mode):
+                continue
+
+            try:
+                with os.scandir(path) as it:
+                    children = sorted(it, key=lambda entry: entry.name, reverse=True)
+            except OSError as e:
+                logger.warning(f"Skipping contents of '{path}' in archive: {e}")
+                continue
+            for entry in children:
+                if is_name_forbidden(entry.name, os.path.splitext(entry.name)[1]):
+                    continue
+                if entry.is_symlink():
+                    target = Path(entry.path).resolve()
+                    if target.is_dir() or not target.is_relative_to(base):
+                        continue
+                stack.append((Path(entry.path), f"{arcname}/{entry.name}"))
+
+def iter_zip(entries: Iterable[Entry]) -> Iterator[bytes]:
+    """
+    Streams a ZIP64 archive of `entries`. Already compressed media is stored,
+    everything else deflated.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as archive:
+        for path, arcname, st in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+            if info.is_dir():
+                archive.writestr(info, b"")
+            else:
+                if Path(arcname).suffix.lower() not in COMPRESSED_EXTENSIONS:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                with open(path, "rb") as src, archive.open(info, "w") as dst:
+                    while data := src.read(settings.ARCHIVE_CHUNK_SIZE):
+                        dst.write(data)
+                        if chunk := sink.drain():
+                            yield chunk
+            if chunk := sink.drain():
+                yield chunk
+    yield sink.drain()
+
+def iter_tar(entries: Iterable[Entry]) -> Iterator[bytes]:
+    """
+    Streams a POSIX (pax) tar archive of `entries`. Each file is sent with the
+    size it had when its header was written, padded or cut if it changes.
+    """
+    for path, arcname, st in entries:
+        info = tarfile.TarInfo(arcname)
+        info.mtime = st.st_mtime
+        info.mode = stat.S_IMODE(st.st_mode)
+        if stat.S_ISDIR(st.st_mode):
+            info.type = tarfile.DIRTYPE
+        else:
+            info.size = st.st_size
+        yield info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        if info.isdir():
+            continue
+
+        sent = 0
+        with open(path, "rb") as src:
+            while sent < info.size:
+                data = src.read(min(settings.ARCHIVE_CHUNK_SIZE, info.size - sent))
+                if not data:
+                    break
+                sent += len(data)
+                yield data
+        if sent < info.size:
+            logger.warning(f"'{path}' shrank while being archived")
+        yield bytes(info.size - sent + (-info.size % tarfile.BLOCKSIZE))
+    # End-of-archive marker: two empty blocks
+    yield bytes(2 * tarfile.BLOCKSIZE)
+
+def iter_archive(paths: Iterable[Path], fmt: str) -> Iterator[bytes]:
+    """Streams an archive (`zip` or `tar`) of the given files and folders."""
+    entries = iter_entries(archive_roots(paths))
+    yield from iter_zip(entries) if fmt == "zip" else iter_tar(entries)
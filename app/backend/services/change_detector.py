@@ -0,0 +1,352 @@
+import os
+import asyncio
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.listing import iter_directory
+from app.backend.database.models import DirectoryWatermark
+from app.backend.database.session import SessionLocal
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    # Optional: without it (or where inotify doesn't work, e.g. Termux shared storage) we poll
+    INotify = None
+    inotify_flags = None
+
+logger = logging.getLogger(__name__)
+
+# Watermarks are committed in batches of this many directories
+WATERMARK_BATCH_SIZE = 500
+# Directories modified this recently are re-listed on the next pass, since a
+# coarse-timestamp filesystem could record a second change with the same mtime
+RACY_SECONDS = 2.0
+
+def _join(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+def _parent(rel: str) -> str:
+    return rel.rpartition("/")[0]
+
+class ChangeDetector:
+    """
+    Detects changes under the serve directory without re-walking the whole tree.
+
+    Each polling pass stats every known directory once and lists only those whose
+    mtime differs from its stored watermark; creating, deleting or renaming an
+    entry updates its parent's mtime, so unchanged subtrees cost one stat per
+    directory. Watermarks live in the `dir_watermarks` table, so a restart resumes
+    from the last pass instead of treating everything as new. In-place edits to a
+    file don't touch its directory, so they are only seen through inotify (when
+    `inotify_simple`, the 'inotify' extra, is installed and the filesystem
+    supports it) or the file index's periodic full scan.
+
+    Subscribers are called with the relative path of every changed directory, from
+    a worker thread.
+    """
+    def __init__(self, root: Path, session_factory: Callable[[], Session] = SessionLocal):
+        self.root = Path(root)
+        self._session_factory = session_factory
+        self._lock = threading.Lock()   # Serializes passes
+        self._watermarks: Dict[str, int] = {}
+        self._children: Dict[str, Set[str]] = {}
+        self._loaded = False
+        self._subscribers: List[Callable[[str], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+        # inotify state
+        self._inotify = None
+        self._watches: Dict[int, str] = {}
+        self._watch_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._dirty_lock = threading.Lock()
+        self._dirty: Set[str] = set()
+
+        # Metrics
+        self.mode = "polling"
+        self.passes = 0
+        self.changes_detected = 0
+        self.pass_in_progress = False
+        self.pass_scanned = 0
+        self.pass_total = 0
+        self.last_pass_started: Optional[float] = None
+        self._completed_pass_started: Optional[float] = None
+        self.last_pass_finished: Optional[float] = None
+        self.last_pass_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def subscribe(self, callback: Callable[[str], None]):
+        """Registers a callback taking the relative path of a changed directory."""
+        self._subscribers.append(callback)
+
+    def _notify(self, rel: str):
+        self.changes_detected += 1
+        for callback in self._subscribers:
+            try:
+                callback(rel)
+            except Exception as e:
+                logger.error(f"Change subscriber failed for '{rel}': {e}")
+
+    # --- Watermarks ---
+
+    def load_watermarks(self):
+        """Loads the watermarks left by the previous run."""
+        with self._session_factory() as db:
+            rows = db.execute(select(DirectoryWatermark.path, DirectoryWatermark.parent, DirectoryWatermark.mtime_ns)).all()
+        self._watermarks = {path: mtime_ns for path, _, mtime_ns in rows}
+        self._children = {}
+        for path, parent, _ in rows:
+            if path:
+                self._children.setdefault(parent, set()).add(path)
+        self._loaded = True
+        logger.info(f"Change detector resumed with {len(self._watermarks)} directory watermark(s)")
+
+    def _list_subdirs(self, rel: str) -> Optional[Set[str]]:
+        try:
+            return {
+                _join(rel, entry.name)
+                for entry in iter_directory(self.root / rel)
+                if entry.is_dir() and not os.path.islink(self.root / rel / entry.name)
+            }
+        except OSError as e:
+            logger.debug(f"Change detector could not list '{rel}': {e}")
+            return None
+
+    def _forget(self, db: Session, rel: str):
+        """Drops a vanished directory and everything below it."""
+        stack = [rel]
+        while stack:
+            path = stack.pop()
+            self._watermarks.pop(path, None)
+            stack.extend(self._children.pop(path, ()))
+            db.execute(delete(DirectoryWatermark).where(DirectoryWatermark.path == path))
+        siblings = self._children.get(_parent(rel))
+        if siblings is not None:
+            siblings.discard(rel)
+
+    def _refresh(self, db: Session, rel: str, mtime_ns: int) -> bool:
+        """
+        Re-lists one directory and stores its watermark. Returns False if it
+        could not be read.
+        """
+        subdirs = self._list_subdirs(rel)
+        if subdirs is None:
+            return False
+        for gone in self._children.get(rel, set()) - subdirs:
+            self._forget(db, gone)
+        self._children[rel] = subdirs
+        for new in subdirs - set(self._watermarks):
+            self._add_watch(new)
+
+        if time.time() - mtime_ns / 1e9 < RACY_SECONDS:
+            # Force another look next pass
+            mtime_ns = -1
+        self._watermarks[rel] = mtime_ns
+        db.merge(DirectoryWatermark(path=rel, parent=_parent(rel), mtime_ns=mtime_ns, scanned_at=time.time()))
+        return True
+
+    # --- Polling ---
+
+    def scan_pass(self) -> List[str]:
+        """
+        Runs one polling pass and returns the directories found changed.
+        On the very first pass (no watermarks) everything is recorded but nothing
+        is reported, since consumers build their own initial state.
+        """
+        with self._lock:
+            self.pass_in_progress = True
+            self.pass_scanned = 0
+            self.last_pass_started = time.time()
+            started = time.monotonic()
+            changed = []
+            try:
+                if not self._loaded:
+                    self.load_watermarks()
+                first_pass = not self._watermarks
+                self.pass_total = max(len(self._watermarks), 1)
+                with self._session_factory() as db:
+                    stack = [""]
+                    seen: Set[str] = set()
+                    pending = 0
+                    while stack:
+                        rel = stack.pop()
+                        seen.add(rel)
+                        self.pass_scanned += 1
+                        try:
+                            mtime_ns = os.stat(self.root / rel).st_mtime_ns
+                        except OSError:
+                            continue
+
+                        if self._watermarks.get(rel) != mtime_ns:
+                            known = rel in self._watermarks
+                            if self._refresh(db, rel, mtime_ns):
+                                pending += 1
+                                if known and not first_pass:
+                                    changed.append(rel)
+                                    self._notify(rel)
+                        stack.extend(self._children.get(rel, ()))
+
+                        if pending >= WATERMARK_BATCH_SIZE:
+                            db.commit()
+                            pending = 0
+                        self.pass_total = max(self.pass_total, self.pass_scanned + len(stack))
+
+                    # Directories removed along with a parent we couldn't list
+                    for rel in [p for p in self._watermarks if p not in seen]:
+                        self._forget(db, rel)
+                    db.commit()
+
+                self.passes += 1
+                self.last_error = None
+                self._completed_pass_started = self.last_pass_started
+                self.last_pass_finished = time.time()
+                self.last_pass_duration = round(time.monotonic() - started, 3)
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Change detection pass failed: {e}")
+            finally:
+                self.pass_in_progress = False
+            return changed
+
+    # --- inotify ---
+
+    def _add_watch(self, rel: str):
+        if self._inotify is None:
+            return
+        mask = (
+            inotify_flags.CREATE | inotify_flags.DELETE | inotify_flags.MOVED_FROM
+            | inotify_flags.MOVED_TO | inotify_flags.CLOSE_WRITE | inotify_flags.ATTRIB
+        )
+        try:
+            wd = self._inotify.add_watch(str(self.root / rel), mask)
+            self._watches[wd] = rel
+        except OSError as e:
+            # Usually the max_user_watches limit; polling still covers everything
+            logger.warning(f"inotify watch failed for '{rel}' ({e}), falling back to polling")
+            self._close_inotify()
+
+    def _start_inotify(self):
+        if not settings.CHANGE_DETECTION_INOTIFY:
+            return
+        if INotify is None:
+            logger.info("inotify_simple is not installed (the 'inotify' extra), using polling")
+            return
+        try:
+            self._inotify = INotify()
+        except OSError as e:
+            logger.info(f"inotify unavailable ({e}), using polling")
+            return
+        self.mode = "inotify"
+        for rel in list(self._watermarks):
+            self._add_watch(rel)
+        if self._inotify is not None:
+            self._stop_event.clear()
+            self._watch_thread = threading.Thread(target=self._watch_loop, name="change-detector", daemon=True)
+            self._watch_thread.start()
+
+    def _close_inotify(self):
+        inotify, self._inotify = self._inotify, None
+        self._watches.clear()
+        self.mode = "polling"
+        if inotify is not None:
+            try:
+                inotify.close()
+            except OSError:
+                pass
+
+    def _watch_loop(self):
+        while not self._stop_event.is_set():
+            inotify = self._inotify
+            if inotify is None:
+                return
+            try:
+                events = inotify.read(timeout=1000)
+            except (OSError, ValueError):
+                return
+            with self._dirty_lock:
+                for event in events:
+                    rel = self._watches.get(event.wd)
+                    if rel is not None:
+                        self._dirty.add(rel)
+
+    def process_dirty(self) -> int:
+        """Refreshes directories reported by inotify and returns how many changed."""
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return 0
+        with self._lock:
+            with self._session_factory() as db:
+                for rel in sorted(dirty):
+                    try:
+                        mtime_ns = os.stat(self.root / rel).st_mtime_ns
+                    except OSError:
+                        # Gone; the parent's event takes care of it
+                        continue
+                    if self._refresh(db, rel, mtime_ns):
+                        self._notify(rel)
+                db.commit()
+        return len(dirty)
+
+    # --- Lifecycle ---
+
+    def get_stats(self) -> dict:
+        now = time.time()
+        with self._dirty_lock:
+            dirty = len(self._dirty)
+        return {
+            "enabled": settings.CHANGE_DETECTION_ENABLED,
+            "mode": self.mode,
+            "directories": len(self._watermarks),
+            "watches": len(self._watches),
+            "passes": self.passes,
+            "changes_detected": self.changes_detected,
+            "pass_in_progress": self.pass_in_progress,
+            "pass_progress": round(min(self.pass_scanned / self.pass_total, 1.0), 3) if self.pass_in_progress else None,
+            "last_pass_duration": self.last_pass_duration,
+            # Upper bound on how old an undetected change can be
+            "lag_seconds": round(now - self._completed_pass_started, 1) if self._completed_pass_started else None,
+            "pending_events": dirty,
+            "last_error": self.last_error,
+        }
+
+    async def _run(self):
+        await asyncio.to_thread(self.scan_pass)
+        await asyncio.to_thread(self._start_inotify)
+        last_pass = time.monotonic()
+        while True:
+            await asyncio.sleep(1.0)
+            if self._dirty:
+                await asyncio.to_thread(self.process_dirty)
+            if time.monotonic() - last_pass >= settings.CHANGE_DETECTION_INTERVAL_SECONDS:
+                await asyncio.to_thread(self.scan_pass)
+                last_pass = time.monotonic()
+
+    def start(self):
+        """Starts the detector on the running event loop."""
+        if settings.CHANGE_DETECTION_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watch_thread is not None:
+            await asyncio.to_thread(self._watch_thread.join, 2.0)
+            self._watch_thread = None
+        self._close_inotify()
+
+# Initialize global instance
+change_detector = ChangeDetector(settings.SERVE_PATH)
@@ -1,5 +1,6 @@
 import logging
-import requests
+import httpx
+from typing import Optional
 from fastapi import HTTPException, UploadFile, Request
 from fastapi.responses import StreamingResponse
 from starlette.background import BackgroundTask
@@ -7,53 +8,69 @@ from pathlib import Path
 
 from app.core.config import settings
 from app.core.auth import decrypt_string
+from app.core.pmask_cache import pmask_cache
+from app.core.permission_engine import permission_engine
+from app.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
-def get_user_permissions_from_config(username: str) -> str:
+# Shared keep-alive client for all copyparty round trips.
+# Created on app startup and closed on shutdown (see app/main.py).
+_http_client: Optional[httpx.AsyncClient] = None
+
+def _build_http_client() -> httpx.AsyncClient:
+    """Creates the pooled async client used to talk to copyparty."""
+    limits = httpx.Limits(
+        max_connections=settings.COPYPARTY_POOL_SIZE,
+        max_keepalive_connections=settings.COPYPARTY_POOL_KEEPALIVE
+    )
+    timeout = httpx.Timeout(
+        settings.COPYPARTY_API_TIMEOUT,
+        connect=settings.COPYPARTY_CONNECT_TIMEOUT
+    )
+    # Follow redirects like `requests` did, e.g. after a copyparty move
+    return httpx.AsyncClient(limits=limits, timeout=timeout, follow_redirects=True)
+
+async def start_http_client():
+    """Initializes the shared copyparty client. Called on app startup."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+        logger.info(f"Copyparty HTTP client started (pool size: {settings.COPYPARTY_POOL_SIZE})")
+
+async def close_http_client():
+    """Closes the shared copyparty client and its pooled connections."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        logger.info("Copyparty HTTP client closed.")
+
+def get_http_client() -> httpx.AsyncClient:
     """
-    Parses copyparty/copyparty.conf to retrieve the user's permission mask 
-    for the root volume.
+    Returns the shared copyparty client.
+    Lazily creates one if the app lifecycle hooks have not run (e.g. scripts, tests).
     """
-    conf_path = settings.BASE_DIR / "copyparty" / "copyparty.conf"
-    if not conf_path.exists():
-        logger.warning(f"Copyparty config not found at {conf_path}")
-        return ""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+    return _http_client
 
-    try:
-        with open(conf_path, "r") as f:
-            for line in f:
-                line = line.strip()
-                if not line.startswith("-v "):
-                    continue
-                
-                # Format: -v src:dst:perm1,u1,u2:perm2,u3
-                parts = line.split(":")
-                if len(parts) < 3:
-                    continue
-                
-                # Destination must be root '/'
-                if parts[1] != "/":
-                    continue
-                
-                # Check each permission group (starting from index 2)
-                for group in parts[2:]:
-                    # Group format: perms,user1,user2...
-                    sub_parts = group.split(",")
-                    if len(sub_parts) < 2:
-                        continue
-                    
-                    perms = sub_parts[0]
-                    users = sub_parts[1:]
-                    if username in users:
-                        logger.info(f"Parsed permissions for '{username}' from config: {perms}")
-                        return perms
-        
-        logger.warning(f"User '{username}' not found in any root volume in {conf_path}")
-        return ""
-    except Exception as e:
-        logger.error(f"Error parsing copyparty.conf: {e}")
-        return ""
+def _timeout(seconds: float) -> httpx.Timeout:
+    """Builds a per-operation timeout that keeps the configured connect timeout."""
+    return httpx.Timeout(seconds, connect=settings.COPYPARTY_CONNECT_TIMEOUT)
+
+def get_user_permissions_from_config(username: str) -> str:
+    """
+    Retrieves the user's permission mask for the root volume from the
+    parsed copyparty/copyparty.conf (re-read only when the file changes).
+    """
+    perms = permission_engine.get_root_permissions(username)
+    if perms:
+        logger.info(f"Parsed permissions for '{username}' from config: {perms}")
+    else:
+        logger.warning(f"User '{username}' not found in any root volume of copyparty.conf")
+    return perms
 
 def get_user_permissions(username: str, password: str) -> str:
     """
@@ -94,7 +111,15 @@ def get_proxy_headers(request: Request) -> dict:
     
     return headers
 
-def proxy_upload_request(request: Request, relative_path: Path, file: UploadFile) -> bool:
+async def _iter_upload(file: UploadFile, chunk_size: int = 1024 * 1024):
+    """Yields the upload body in chunks without loading it fully into memory."""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+async def proxy_upload_request(request: Request, relative_path: Path, file: UploadFile) -> bool:
     """Proxies a file upload request to the copyparty backend via PUT."""
     if not file.filename:
         logger.error("Upload request with missing filename.")
@@ -105,12 +130,21 @@ def proxy_upload_request(request: Request, relative_path: Path, file: UploadFile
     
     logger.info(f"Proxying upload of '{file.filename}' to {target_url}")
 
+    # Send a known length so copyparty doesn't have to handle a chunked body
+    if getattr(file, "size", None) is not None:
+        headers["Content-Length"] = str(file.size)
+
     try:
-        r = requests.put(target_url, headers=headers, data=file.file, timeout=3600)
+        r = await get_http_client().put(
+            target_url,
+            headers=headers,
+            content=_iter_upload(file),
+            timeout=_timeout(settings.COPYPARTY_STREAM_TIMEOUT)
+        )
         r.raise_for_status()
         logger.info(f"Upload successful: {r.status_code}")
         return True
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Proxy upload failed for '{file.filename}': {e}")
         raise HTTPException(status_code=502, detail=f"Backend upload failed: {str(e)}")
 
@@ -121,10 +155,10 @@ async def proxy_api_request(request: Request, relative_path: Path, params: dict
     headers["Accept"] = "application/json"
 
     try:
-        r = requests.get(url, headers=headers, params=params, timeout=10)
+        r = await get_http_client().get(url, headers=headers, params=params)
         r.raise_for_status()
         return r.json()
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Proxy API request failed: {e}")
         raise HTTPException(status_code=502, detail=f"Backend API failed: {str(e)}")
 
@@ -134,10 +168,10 @@ async def proxy_post_request(request: Request, relative_path: Path, params: dict
     headers = get_proxy_headers(request)
     
     try:
-        r = requests.post(url, headers=headers, params=params, data=data, timeout=10)
+        r = await get_http_client().post(url, headers=headers, params=params, data=data)
         r.raise_for_status()
         return True
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Proxy POST request failed: {e}")
         raise HTTPException(status_code=502, detail=f"Backend POST failed: {str(e)}")
 
@@ -157,10 +191,10 @@ async def search_files(request: Request, query: str, relative_path: Path = Path(
     url += f"{separator}q={encoded_query}&json"
 
     try:
-        r = requests.get(url, headers=headers, timeout=10)
+        r = await get_http_client().get(url, headers=headers)
         r.raise_for_status()
         return r.json()
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Proxy search request failed: {e}")
         raise HTTPException(status_code=502, detail=f"Backend search failed: {str(e)}")
 
@@ -180,8 +214,24 @@ async def rename_item(request: Request, relative_path: Path, new_name: str) -> b
     
     return await proxy_post_request(request, relative_path, params=params)
 
-def get_pmask(request: Request, relative_path: Path) -> str:
-    """Fetches the permission mask for the current user in the target directory."""
+async def get_pmask(request: Request, relative_path: Path) -> str:
+    """
+    Fetches the permission mask for the current user in the target directory.
+    The mask is evaluated locally from copyparty.conf when possible; otherwise
+    copyparty is queried and the result cached per (username, directory).
+    """
+    session = getattr(request.state, "session", None)
+    username = session.username if session else None
+    if username:
+        local = permission_engine.get_pmask(username, relative_path)
+        if local is not None:
+            logger.debug(f"Evaluated pmask locally for '{username}': '{local}'")
+            return local
+
+        cached = pmask_cache.get(username, relative_path)
+        if cached is not None:
+            return cached
+
     url = _get_proxy_url(relative_path)
     # Manually append ?pmask to ensure it is sent as a flag, not a key-value pair
     if "?" in url:
@@ -192,12 +242,13 @@ def get_pmask(request: Request, relative_path: Path) -> str:
     headers = get_proxy_headers(request)
     
     # Log the attempt
-    session = getattr(request.state, "session", None)
-    username = session.username if session else "anonymous"
+    username = username or "anonymous"
     logger.debug(f"Querying pmask for user '{username}' at '{url}'")
 
     try:
-        r = requests.get(url, headers=headers, timeout=5)
+        r = await get_http_client().get(
+            url, headers=headers, timeout=_timeout(settings.COPYPARTY_PMASK_TIMEOUT)
+        )
         if r.status_code == 200:
             pmask = r.text.strip()
             # Validate that we didn't get an HTML error page or directory listing
@@ -206,6 +257,8 @@ def get_pmask(request: Request, relative_path: Path) -> str:
                 # Fallback required
             else:
                 logger.info(f"Retrieved pmask for '{username}': '{pmask}'")
+                if session and session.username:
+                    pmask_cache.set(session.username, relative_path, pmask)
                 return pmask
         else:
              logger.warning(f"Backend pmask request returned {r.status_code}, falling back to session permissions.")
@@ -220,6 +273,15 @@ def get_pmask(request: Request, relative_path: Path) -> str:
         
     return "r"
 
+async def _counted_stream(chunks):
+    """Passes a response body through, counted in metrics.active_streams while it flows."""
+    metrics.stream_started()
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        metrics.stream_finished()
+
 async def proxy_stream_request(request: Request, relative_path: Path, params: dict = None, request_headers: dict = None):
     """Proxies a file download or directory zip request to the copyparty backend."""
     url = _get_proxy_url(relative_path)
@@ -260,18 +322,28 @@ async def proxy_stream_request(request: Request, relative_path: Path, params: di
             debug_headers["Authorization"] = debug_headers["Authorization"][:15] + "..."
         logger.debug(f"Request Headers: {debug_headers}")
         
-        # Use stream=True for large files
-        r = requests.get(url, headers=headers, params=clean_params, stream=True, timeout=3600)
+        # Stream the body so large files never sit in memory
+        client = get_http_client()
+        backend_request = client.build_request(
+            "GET",
+            url,
+            headers=headers,
+            params=clean_params,
+            timeout=_timeout(settings.COPYPARTY_STREAM_TIMEOUT)
+        )
+        r = await client.send(backend_request, stream=True)
         
         logger.debug(f"Response Status: {r.status_code}")
         logger.debug(f"Response Headers: {dict(r.headers)}")
 
         if r.status_code >= 400:
+            await r.aread()
+            await r.aclose()
             error_content = r.text[:500]
             logger.error(f"Backend returned error {r.status_code}: {error_content}")
             raise HTTPException(status_code=r.status_code, detail=f"Backend error: {r.status_code}")
 
-        task = BackgroundTask(r.close)
+        task = BackgroundTask(r.aclose)
         
         excluded_headers = ['connection', 'keep-alive', 'transfer-encoding', 'server', 'date', 'content-disposition']
         
@@ -294,14 +366,15 @@ async def proxy_stream_request(request: Request, relative_path: Path, params: di
         disposition_type = "inline" if is_preview else "attachment"
         response_headers["Content-Disposition"] = f'{disposition_type}; filename="{quoted_filename}"; filename*=UTF-8\'\'{quoted_filename}'
 
+        # Raw bytes: Content-Encoding/Content-Length are forwarded unchanged
         return StreamingResponse(
-            r.iter_content(chunk_size=128 * 1024),
+            _counted_stream(r.aiter_raw(chunk_size=128 * 1024)),
             status_code=r.status_code,
             headers=response_headers,
             media_type=r.headers.get('Content-Type'),
             background=task
         )
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Proxy request to copyparty failed: {e}")
         raise HTTPException(status_code=502, detail="Bad Gateway: Could not connect to backend file server.")
\ No newline at end of file
@@ -0,0 +1,367 @@
+import os
+import json
+import math
+import time
+import shutil
+import signal
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.backend.services.video_preview_service import probe_video
+
+logger = logging.getLogger(__name__)
+
+AUDIO_BITRATE = 128000
+INFO_NAME = "info.json"
+
+class HlsError(Exception):
+    """Raised when a rendition or segment can't be produced (see `status_code`)."""
+    def __init__(self, detail: str, status_code: int = 500):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+class Rendition:
+    """One output quality, parsed from an HLS_RENDITIONS entry ('height:bitrate', e.g. '720:2500k')."""
+    def __init__(self, spec: str):
+        height, _, bitrate = spec.partition(":")
+        self.height = int(height)
+        bitrate = bitrate.strip().lower() or "1000k"
+        multiplier = 1000 if bitrate.endswith("k") else 1000000 if bitrate.endswith("m") else 1
+        self.bitrate = int(float(bitrate.rstrip("km")) * multiplier)
+        self.name = f"{self.height}p"
+
+    def output_size(self, width: int, height: int):
+        """Output resolution for a source, never upscaling; both sides even."""
+        out_height = min(self.height, height) // 2 * 2
+        return max(2, round(width * out_height / height / 2) * 2), out_height
+
+def parse_renditions(specs: List[str]) -> List[Rendition]:
+    return sorted((Rendition(spec) for spec in specs), key=lambda r: r.height)
+
+def segment_name(index: int) -> str:
+    return f"{index:05d}.ts"
+
+class _TranscodeJob:
+    """A running ffmpeg producing segments `start`, `start + 1`, ... of one rendition."""
+    def __init__(self, key: str, directory: Path, process: asyncio.subprocess.Process, start: int, count: int):
+        self.key = key
+        self.directory = directory
+        self.process = process
+        self.start = start
+        self.count = count
+        self.next = start              # First segment not written yet
+        self.last_requested = start
+        self.last_access = time.monotonic()
+        self.paused = False
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    def frontier(self) -> int:
+        """Advances and returns the first segment not written yet."""
+        while self.next < self.count and (self.directory / segment_name(self.next)).exists():
+            self.next += 1
+        return self.next
+
+    def signal(self, signum: int):
+        try:
+            self.process.send_signal(signum)
+        except ProcessLookupError:
+            pass
+
+    def kill(self):
+        if self.alive:
+            # A stopped process only dies once continued
+            self.signal(signal.SIGCONT)
+            self.process.kill()
+
+class HlsTranscoder:
+    """
+    On-demand HLS transcoding of videos under SERVE_PATH.
+
+    Playlists are synthesized from the probed duration, so a player sees the full
+    VOD timeline immediately. Segments are produced lazily: requesting one that
+    isn't cached starts an ffmpeg for that rendition at that position (keyframes
+    forced on segment boundaries, so restarted jobs line up), replacing a job
+    that was elsewhere in the file. A job pauses (SIGSTOP) once it's
+    HLS_MAX_SEGMENTS_AHEAD segments ahead of its viewer and is killed when its
+    segments stop being requested. At most HLS_MAX_TRANSCODES jobs run at once,
+    and the segment cache is trimmed to HLS_CACHE_MAX_BYTES, oldest first.
+    """
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.renditions = parse_renditions(settings.HLS_RENDITIONS)
+        self._jobs: Dict[str, _TranscodeJob] = {}
+        self._infos: Dict[Path, dict] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.started = 0
+        self.cancelled_idle = 0
+        self.evicted_bytes = 0
+        self.cache_bytes = 0
+
+    @property
+    def available(self) -> bool:
+        return bool(settings.HLS_ENABLED and shutil.which(settings.FFMPEG_PATH) and shutil.which(settings.FFPROBE_PATH))
+
+    def version_dir(self, rel_path: str, st: os.stat_result) -> Path:
+        digest = hashlib.sha1(rel_path.encode("utf-8", "surrogateescape")).hexdigest()
+        return self.cache_dir / digest / f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    async def info(self, source: Path, version: Path) -> dict:
+        """Probed duration and size of a video, cached next to its segments."""
+        info = self._infos.get(version)
+        if info is not None:
+            return info
+        info_path = version / INFO_NAME
+        try:
+            info = json.loads(info_path.read_text())
+        except (OSError, ValueError):
+            try:
+                info = await asyncio.to_thread(
+                    probe_video, settings.FFPROBE_PATH, str(source), settings.VIDEO_PREVIEW_TIMEOUT_SECONDS
+                )
+            except Exception as e:
+                raise HlsError(f"Could not read video: {e}", 422)
+            version.mkdir(parents=True, exist_ok=True)
+            info_path.write_text(json.dumps(info))
+        if len(self._infos) >= 1024:
+            self._infos.clear()
+        self._infos[version] = info
+        return info
+
+    def renditions_for(self, info: dict) -> List[Rendition]:
+        """Renditions up to the source height (at least the smallest one)."""
+        fitting = [r for r in self.renditions if r.height <= info["height"]]
+        return fitting or self.renditions[:1]
+
+    def rendition(self, info: dict, name: str) -> Rendition:
+        for rendition in self.renditions_for(info):
+            if rendition.name == name:
+                return rendition
+        raise HlsError("Unknown rendition", 404)
+
+    @staticmethod
+    def segment_count(info: dict) -> int:
+        return max(1, math.ceil(info["duration"] / settings.HLS_SEGMENT_SECONDS))
+
+    # --- Playlists ---
+
+    def master_playlist(self, info: dict) -> str:
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        for rendition in self.renditions_for(info):
+            width, height = rendition.output_size(info["width"], info["height"])
+            lines.append(
+                f"#EXT-X-STREAM-INF:BANDWIDTH={rendition.bitrate + AUDIO_BITRATE},"
+                f"RESOLUTION={width}x{height},CODECS=\"avc1.640028,mp4a.40.2\""
+            )
+            lines.append(f"{rendition.name}/index.m3u8")
+        return "\n".join(lines) + "\n"
+
+    def media_playlist(self, info: dict) -> str:
+        seconds = settings.HLS_SEGMENT_SECONDS
+        count = self.segment_count(info)
+        lines = [
+            "#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{seconds}",
+            "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD",
+        ]
+        for i in range(count):
+            length = min(seconds, info["duration"] - i * seconds)
+            lines += [f"#EXTINF:{length:.3f},", segment_name(i)]
+        lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    # --- Segments ---
+
+    def _command(self, source: Path, directory: Path, rendition: Rendition, info: dict, start: int) -> List[str]:
+        seconds = settings.HLS_SEGMENT_SECONDS
+        offset = start * seconds
+        _, height = rendition.output_size(info["width"], info["height"])
+        return [
+            settings.FFMPEG_PATH, "-v", "error", "-nostdin", "-y",
+            "-ss", str(offset), "-i", str(source),
+            "-map", "0:v:0", "-map", "0:a:0?", "-sn", "-dn",
+            "-c:v", "libx264", "-preset", settings.HLS_PRESET, "-pix_fmt", "yuv420p",
+            "-vf", f"scale=-2:{height}",
+            "-b:v", str(rendition.bitrate), "-maxrate", str(rendition.bitrate),
+            "-bufsize", str(rendition.bitrate * 2),
+            # Keyframes exactly on segment boundaries, so segments from separate jobs line up
+            "-force_key_frames", f"expr:gte(t,n_forced*{seconds})",
+            "-c:a", "aac", "-b:a", str(AUDIO_BITRATE), "-ac", "2",
+            "-output_ts_offset", str(offset),
+            "-f", "hls", "-hls_time", str(seconds), "-hls_list_size", "0",
+            "-hls_segment_type", "mpegts", "-hls_flags", "temp_file",
+            "-start_number", str(start),
+            "-hls_segment_filename", str(directory / "%05d.ts"),
+            str(directory / "ffmpeg.m3u8"),
+        ]
+
+    async def _start_job(self, key: str, source: Path, directory: Path, rendition: Rendition, info: dict, start: int) -> _TranscodeJob:
+        previous = self._jobs.pop(key, None)
+        if previous is not None:
+            previous.kill()
+        if len(self._jobs) >= settings.HLS_MAX_TRANSCODES:
+            # Make room by dropping the job that was requested least recently
+            oldest = min(self._jobs.values(), key=lambda job: job.last_access)
+            if time.monotonic() - oldest.last_access < settings.HLS_SEGMENT_SECONDS:
+                raise HlsError("Too many videos are being transcoded", 503)
+            oldest.kill()
+            self._jobs.pop(oldest.key, None)
+
+        directory.mkdir(parents=True, exist_ok=True)
+        process = await asyncio.create_subprocess_exec(
+            *self._command(source, directory, rendition, info, start),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        job = _TranscodeJob(key, directory, process, start, self.segment_count(info))
+        self._jobs[key] = job
+        self.started += 1
+        logger.info(f"HLS transcode started: {key} from segment {start}")
+        return job
+
+    async def segment(self, source: Path, rel_path: str, rendition_name: str, index: int) -> Path:
+        """
+        Returns the path of a segment, transcoding it if needed.
+
+        Raises:
+            HlsError: If the segment doesn't exist or can't be produced in time.
+        """
+        version = self.version_dir(rel_path, source.stat())
+        info = await self.info(source, version)
+        rendition = self.rendition(info, rendition_name)
+        if not 0 <= index < self.segment_count(info):
+            raise HlsError("Segment not found", 404)
+        directory = version / rendition.name
+        path = directory / segment_name(index)
+        key = f"{rel_path}:{rendition.name}"
+
+        async with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.directory != directory:
+                # The video changed since the job started
+                job.kill()
+                job = None
+            if job is not None:
+                job.last_access = time.monotonic()
+                job.last_requested = index
+            if not path.exists():
+                if job is None or not job.alive or not job.start <= index <= job.frontier() + settings.HLS_SEEK_TOLERANCE_SEGMENTS:
+                    job = await self._start_job(key, source, directory, rendition, info, index)
+                elif job.paused:
+                    job.signal(signal.SIGCONT)
+                    job.paused = False
+
+        deadline = time.monotonic() + settings.HLS_SEGMENT_WAIT_SECONDS
+        while not path.exists():
+            if not job.alive and not path.exists():
+                # Replaced by a job another request started for the same rendition?
+                current = self._jobs.get(key)
+                if current is None or current is job or not current.alive:
+                    raise HlsError("Transcoding failed", 500)
+                job = current
+            if time.monotonic() > deadline:
+                raise HlsError("Timed out waiting for segment", 504)
+            await asyncio.sleep(0.2)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    # --- Housekeeping ---
+
+    def _supervise(self):
+        now = time.monotonic()
+        for key, job in list(self._jobs.items()):
+            if not job.alive:
+                self._jobs.pop(key, None)
+                continue
+            if now - job.last_access > settings.HLS_IDLE_TIMEOUT_SECONDS:
+                # Nobody is watching any more
+                job.kill()
+                self._jobs.pop(key, None)
+                self.cancelled_idle += 1
+                logger.info(f"HLS transcode cancelled (idle): {key}")
+                continue
+            ahead = job.frontier() - job.last_requested
+            if not job.paused and ahead > settings.HLS_MAX_SEGMENTS_AHEAD:
+                job.signal(signal.SIGSTOP)
+                job.paused = True
+            elif job.paused and ahead <= settings.HLS_MAX_SEGMENTS_AHEAD // 2:
+                job.signal(signal.SIGCONT)
+                job.paused = False
+
+    def trim_cache(self):
+        """Deletes the least recently served segments until the cache fits its quota."""
+        active = {job.directory for job in self._jobs.values()}
+        segments = []
+        total = 0
+        for path in self.cache_dir.glob("*/*/*/*.ts"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            total += st.st_size
+            if path.parent not in active:
+                segments.append((st.st_mtime, st.st_size, path))
+        segments.sort()
+        for _, size, path in segments:
+            if total <= settings.HLS_CACHE_MAX_BYTES:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.evicted_bytes += size
+        self.cache_bytes = total
+
+    async def _run(self):
+        passes = 0
+        while True:
+            await asyncio.sleep(1.0)
+            async with self._lock:
+                self._supervise()
+            passes += 1
+            if passes % 30 == 0:
+                await asyncio.to_thread(self.trim_cache)
+
+    def start(self):
+        """Starts the job supervisor on the running event loop."""
+        if settings.HLS_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for job in self._jobs.values():
+            job.kill()
+        self._jobs.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "available": self.available,
+            "renditions": [r.name for r in self.renditions],
+            "active_jobs": len(self._jobs),
+            "paused_jobs": sum(1 for job in self._jobs.values() if job.paused),
+            "started": self.started,
+            "cancelled_idle": self.cancelled_idle,
+            "cache_bytes": self.cache_bytes,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+# Initialize global instance
+hls_transcoder = HlsTranscoder(settings.HLS_CACHE_DIR)
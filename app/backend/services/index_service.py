@@ -0,0 +1,367 @@
+import os
+import asyncio
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.constants import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS, TEXT_EXTENSIONS
+from app.core.listing import FSEntry, iter_directory, sort_key
+from app.backend.database.models import IndexedFile
+from app.backend.database.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Rows are committed in batches of this size during a full scan
+SCAN_BATCH_SIZE = 2000
+
+def media_type_for(name: str, is_dir: bool) -> str:
+    """Classifies an entry the same way the gallery does."""
+    if is_dir:
+        return "directory"
+    suffix = os.path.splitext(name)[1].lower()
+    if suffix in IMAGE_EXTENSIONS:
+        return "image"
+    if suffix in VIDEO_EXTENSIONS:
+        return "video"
+    if suffix in TEXT_EXTENSIONS:
+        return "text"
+    return "other"
+
+def _join(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+def _subtree_filter(rel: str):
+    """Matches `rel` and everything below it."""
+    return or_(IndexedFile.path == rel, IndexedFile.path.startswith(rel + "/", autoescape=True))
+
+class FileIndex:
+    """
+    Persistent metadata index of the serve directory, stored in the `file_index` table.
+
+    A full scan walks the tree once with `iter_directory` and tags every row with a
+    scan generation; rows from older generations are removed when it finishes.
+    Single directories are refreshed with `rescan_directory`, which routes and the
+    change detector trigger through `schedule_rescan`. The index survives
+    restarts, so it can answer queries before the first scan of a new run completes.
+    """
+    def __init__(self, root: Path, session_factory: Callable[[], Session] = SessionLocal):
+        self.root = Path(root)
+        self._session_factory = session_factory
+        self._lock = threading.Lock()   # Serializes scans
+        self._pending_lock = threading.Lock()
+        self._pending: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.ready = False
+        self.scanning = False
+        # Bumped on every change to the table, so derived caches know when to rebuild
+        self.version = 0
+        self._epoch = f"{time.time_ns():x}"
+        self.last_full_scan: Optional[float] = None
+        self.last_scan_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    # --- Helpers ---
+
+    @property
+    def state(self) -> str:
+        """Identifies the index contents (unique across restarts), for ETags of listings served from it."""
+        return f"{self._epoch}.{self.version}"
+
+    def relative(self, path: Path) -> Optional[str]:
+        """Returns the index key (relative POSIX path) for a path, or None if outside the root."""
+        path = Path(path)
+        if path.is_absolute():
+            try:
+                path = path.relative_to(self.root)
+            except ValueError:
+                return None
+        posix = path.as_posix().strip("/")
+        return "" if posix == "." else posix
+
+    def _row(self, parent: str, entry: FSEntry, generation: int) -> dict:
+        is_dir = entry.is_dir()
+        return {
+            "path": _join(parent, entry.name),
+            "parent": parent,
+            "name": entry.name,
+            "is_dir": is_dir,
+            "size": 0 if is_dir else entry.size,
+            "mtime": entry.mtime,
+            "extension": "" if is_dir else entry.suffix.lower(),
+            "media_type": media_type_for(entry.name, is_dir),
+            "generation": generation,
+        }
+
+    def _list_disk(self, rel: str) -> Optional[List[FSEntry]]:
+        try:
+            return list(iter_directory(self.root / rel, with_stat=True))
+        except OSError as e:
+            logger.debug(f"Index could not read '{rel}': {e}")
+            return None
+
+    def load_state(self):
+        """Marks the index ready if a previous run left rows behind."""
+        try:
+            with self._session_factory() as db:
+                self.ready = db.execute(select(IndexedFile.id).limit(1)).first() is not None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Could not read the file index: {e}")
+
+    # --- Scanning ---
+
+    def full_scan(self) -> int:
+        """
+        Re-indexes the whole serve directory and returns the number of entries seen.
+        Symlinked directories are indexed but not descended into.
+        """
+        with self._lock:
+            self.scanning = True
+            started = time.monotonic()
+            count = 0
+            try:
+                with self._session_factory() as db:
+                    generation = (db.execute(select(func.max(IndexedFile.generation))).scalar() or 0) + 1
+                    pending_rows = 0
+                    stack = [""]
+                    while stack:
+                        parent = stack.pop()
+                        entries = self._list_disk(parent)
+                        if entries is None:
+                            continue
+                        rows = [self._row(parent, entry, generation) for entry in entries]
+                        db.execute(delete(IndexedFile).where(IndexedFile.parent == parent))
+                        if rows:
+                            db.execute(IndexedFile.__table__.insert(), rows)
+                        count += len(rows)
+                        pending_rows += len(rows)
+                        for entry in entries:
+                            if entry.is_dir() and not os.path.islink(self.root / parent / entry.name):
+                                stack.append(_join(parent, entry.name))
+                        if pending_rows >= SCAN_BATCH_SIZE:
+                            db.commit()
+                            pending_rows = 0
+
+                    # Anything not seen by this scan no longer exists
+                    db.execute(delete(IndexedFile).where(IndexedFile.generation < generation))
+                    db.commit()
+
+                self.ready = True
+                self.version += 1
+                self.last_error = None
+                self.last_full_scan = time.time()
+                self.last_scan_duration = round(time.monotonic() - started, 3)
+                logger.info(f"File index scan finished: {count} entries in {self.last_scan_duration}s")
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"File index scan failed: {e}")
+            finally:
+                self.scanning = False
+            return count
+
+    def _index_subtree(self, db: Session, rel: str, generation: int):
+        """Indexes every directory below `rel` (which must already be in the table)."""
+        stack = [rel]
+        while stack:
+            parent = stack.pop()
+            entries = self._list_disk(parent)
+            if entries is None:
+                continue
+            db.execute(delete(IndexedFile).where(IndexedFile.parent == parent))
+            if entries:
+                db.execute(IndexedFile.__table__.insert(), [self._row(parent, e, generation) for e in entries])
+            for entry in entries:
+                if entry.is_dir() and not os.path.islink(self.root / parent / entry.name):
+                    stack.append(_join(parent, entry.name))
+
+    def rescan_directory(self, rel: str):
+        """
+        Brings one directory's rows in line with the disk. Vanished subdirectories
+        are dropped with their whole subtree and new subdirectories are indexed
+        recursively; existing subdirectories are not descended into.
+        """
+        with self._lock:
+            try:
+                with self._session_factory() as db:
+                    generation = db.execute(select(func.max(IndexedFile.generation))).scalar() or 0
+                    entries = self._list_disk(rel)
+                    if entries is None:
+                        # The directory itself is gone
+                        if rel:
+                            db.execute(delete(IndexedFile).where(_subtree_filter(rel)))
+                        db.commit()
+                        self.version += 1
+                        return
+
+                    existing: Dict[str, bool] = {
+                        name: is_dir for name, is_dir in db.execute(
+                            select(IndexedFile.name, IndexedFile.is_dir).where(IndexedFile.parent == rel)
+                        )
+                    }
+                    on_disk = {entry.name: entry for entry in entries}
+
+                    for name, was_dir in existing.items():
+                        entry = on_disk.get(name)
+                        if entry is None or entry.is_dir() != was_dir:
+                            db.execute(delete(IndexedFile).where(_subtree_filter(_join(rel, name))))
+
+                    new_dirs = []
+                    for name, entry in on_disk.items():
+                        row = self._row(rel, entry, generation)
+                        if name in existing and existing[name] == entry.is_dir():
+                            db.execute(
+                                update(IndexedFile)
+                                .where(IndexedFile.path == row["path"])
+                                .values(size=row["size"], mtime=row["mtime"])
+                            )
+                        else:
+                            db.execute(IndexedFile.__table__.insert(), [row])
+                            if entry.is_dir() and not os.path.islink(self.root / rel / name):
+                                new_dirs.append(row["path"])
+
+                    for path in new_dirs:
+                        self._index_subtree(db, path, generation)
+                    db.commit()
+                    self.version += 1
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"File index rescan of '{rel}' failed: {e}")
+
+    def schedule_rescan(self, path: Path):
+        """Queues a directory (absolute or relative to the root) for the background rescan."""
+        rel = self.relative(path)
+        if rel is None:
+            return
+        with self._pending_lock:
+            self._pending.add(rel)
+
+    def process_pending(self) -> int:
+        """Rescans every queued directory and returns how many were processed."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        # Parents first, so a removed subtree isn't rescanned piecemeal
+        for rel in sorted(pending, key=lambda p: p.count("/")):
+            self.rescan_directory(rel)
+        return len(pending)
+
+    # --- Queries ---
+
+    def list_directory(self, rel: str) -> Optional[List[FSEntry]]:
+        """
+        Returns a directory's entries sorted like `scan_directory`, or None if the
+        index can't answer (not built yet, or the directory isn't indexed).
+        """
+        if not self.ready:
+            return None
+        with self._session_factory() as db:
+            if rel and db.execute(
+                select(IndexedFile.id).where(IndexedFile.path == rel, IndexedFile.is_dir == True)
+            ).first() is None:
+                return None
+            rows = db.execute(
+                select(IndexedFile.name, IndexedFile.is_dir, IndexedFile.size, IndexedFile.mtime)
+                .where(IndexedFile.parent == rel)
+            ).all()
+        entries = [FSEntry(name, is_dir, size, mtime) for name, is_dir, size, mtime in rows]
+        entries.sort(key=sort_key)
+        return entries
+
+    def search(self, query: str, rel: str = "", limit: int = 1000) -> Optional[List[dict]]:
+        """
+        Case-insensitive substring search on file names below `rel`. Returns hits
+        in copyparty's format (`p` with a trailing slash for directories, `s`, `t`),
+        or None if the index isn't ready.
+        """
+        if not self.ready:
+            return None
+        with self._session_factory() as db:
+            stmt = select(IndexedFile.path, IndexedFile.is_dir, IndexedFile.size, IndexedFile.mtime).where(
+                IndexedFile.name.icontains(query, autoescape=True)
+            )
+            if rel:
+                stmt = stmt.where(IndexedFile.path.startswith(rel + "/", autoescape=True))
+            rows = db.execute(stmt.order_by(IndexedFile.path).limit(limit)).all()
+        return [
+            {"p": path + "/" if is_dir else path, "s": size, "t": mtime}
+            for path, is_dir, size, mtime in rows
+        ]
+
+    def iter_rows(self) -> Iterator[Tuple[str, bool, int, float, str]]:
+        """Streams (path, is_dir, size, mtime, media_type) for every indexed entry."""
+        with self._session_factory() as db:
+            result = db.execute(
+                select(IndexedFile.path, IndexedFile.is_dir, IndexedFile.size, IndexedFile.mtime, IndexedFile.media_type)
+                .execution_options(yield_per=5000)
+            )
+            for row in result:
+                yield tuple(row)
+
+    def get_stats(self) -> dict:
+        try:
+            with self._session_factory() as db:
+                entries = db.execute(select(func.count(IndexedFile.id))).scalar()
+        except Exception:
+            entries = None
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "enabled": settings.INDEX_ENABLED,
+            "ready": self.ready,
+            "scanning": self.scanning,
+            "entries": entries,
+            "pending_rescans": pending,
+            "last_full_scan": self.last_full_scan,
+            "last_scan_duration": self.last_scan_duration,
+            "last_error": self.last_error,
+        }
+
+    # --- Lifecycle ---
+
+    async def _run(self):
+        await asyncio.to_thread(self.load_state)
+        # An index left by the previous run is kept current by the change detector,
+        # so the full scan waits for the regular interval instead of running now
+        last_scan = time.monotonic() if self.ready else float("-inf")
+        while True:
+            if time.monotonic() - last_scan >= settings.INDEX_RESCAN_INTERVAL_SECONDS:
+                await asyncio.to_thread(self.full_scan)
+                last_scan = time.monotonic()
+            if self._pending:
+                await asyncio.to_thread(self.process_pending)
+            await asyncio.sleep(1.0)
+
+    def start(self):
+        """Starts the background indexer on the running event loop."""
+        if settings.INDEX_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Initialize global instance
+file_index = FileIndex(settings.SERVE_PATH)
+
+def use_index(source: Optional[str], default: Optional[str] = None) -> bool:
+    """
+    Resolves a request's `source` flag ('index' or 'live') against `default`,
+    which falls back to LISTING_SOURCE.
+
+    Raises:
+        ValueError: If the source is unknown.
+    """
+    source = source or default or settings.LISTING_SOURCE
+    if source not in ("index", "live"):
+        raise ValueError("Invalid source. Use 'index' or 'live'")
+    return source == "index"
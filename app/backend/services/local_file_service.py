@@ -0,0 +1,242 @@
+import os
+import mmap
+import logging
+import secrets
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Query parameters the local path understands; anything else goes to copyparty
+LOCAL_QUERY_PARAMS = {"media"}
+# More ranges than this in one request is treated as abuse and answered with the whole file
+MAX_RANGES = 16
+
+def file_etag(st: os.stat_result) -> str:
+    """Strong validator built from the file's mtime and size."""
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+def _etag_list_matches(header: str, etag: str, weak: bool) -> bool:
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def _parse_http_date(value: str) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parses a `Range: bytes=...` header into sorted, merged (start, end) pairs with
+    inclusive ends. Returns None if the header should be ignored (not bytes,
+    malformed, too many ranges) and [] if no range is satisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    parts = spec.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+    for part in parts:
+        start_s, sep, end_s = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if not start_s:
+                # Suffix range: the last N bytes
+                length = int(end_s)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(start_s)
+                end = int(end_s) if end_s else size - 1
+                if end_s and start > end:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < size and start >= 0:
+            ranges.append((start, end))
+
+    # Merge overlapping or adjacent ranges
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+class LocalFileResponse(Response):
+    """
+    Serves a file straight from disk with conditional and Range support.
+
+    The body is sent with the ASGI zero-copy extension (`os.sendfile` in the
+    server) when the server offers it; otherwise it is read through a memory map
+    (or `os.pread`, see LOCAL_SERVING_READER) in a worker thread, so the event
+    loop never blocks on disk I/O. Handles If-None-Match, If-Modified-Since,
+    single and multiple byte ranges (multipart/byteranges) and If-Range.
+    """
+    def __init__(self, path: Path, request_headers, inline: bool = False, stat_result: Optional[os.stat_result] = None):
+        self.path = path
+        self.st = stat_result or os.stat(path)
+        self.chunk_size = settings.LOCAL_SERVING_CHUNK_SIZE
+        self.media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        self.background = None
+        self.body = b""
+
+        etag = file_etag(self.st)
+        quoted_name = quote(path.name)
+        disposition = "inline" if inline else "attachment"
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(self.st.st_mtime, usegmt=True),
+            "content-disposition": f'{disposition}; filename="{quoted_name}"; filename*=UTF-8\'\'{quoted_name}',
+        }
+        self.status_code, self.ranges = self._evaluate(request_headers, etag)
+        self.multipart = self.status_code == 206 and len(self.ranges) > 1
+        size = self.st.st_size
+
+        if self.status_code == 304:
+            self.ranges = []
+        elif self.status_code == 416:
+            headers["content-range"] = f"bytes */{size}"
+            headers["content-length"] = "0"
+            self.ranges = []
+        elif self.status_code == 206 and len(self.ranges) == 1:
+            start, end = self.ranges[0]
+            headers["content-type"] = self.media_type
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            headers["content-length"] = str(end - start + 1)
+        elif self.multipart:
+            self.boundary = secrets.token_hex(12)
+            self.part_headers = [
+                (
+                    f"--{self.boundary}\r\nContent-Type: {self.media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+                ).encode("latin-1")
+                for start, end in self.ranges
+            ]
+            self.closing = f"--{self.boundary}--\r\n".encode("latin-1")
+            length = sum(len(h) + end - start + 1 + 2 for h, (start, end) in zip(self.part_headers, self.ranges))
+            headers["content-type"] = f"multipart/byteranges; boundary={self.boundary}"
+            headers["content-length"] = str(length + len(self.closing))
+        else:
+            headers["content-type"] = self.media_type
+            headers["content-length"] = str(size)
+            self.ranges = [(0, size - 1)] if size else []
+
+        self.init_headers(headers)
+
+    def _evaluate(self, request_headers, etag: str) -> Tuple[int, List[Tuple[int, int]]]:
+        """Returns the status code and byte ranges to send."""
+        mtime = int(self.st.st_mtime)
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            if _etag_list_matches(if_none_match, etag, weak=True):
+                return 304, []
+        else:
+            since = request_headers.get("if-modified-since")
+            since_ts = _parse_http_date(since) if since else None
+            if since_ts is not None and mtime <= since_ts:
+                return 304, []
+
+        range_header = request_headers.get("range")
+        if not range_header:
+            return 200, []
+
+        if_range = request_headers.get("if-range")
+        if if_range:
+            if_range = if_range.strip()
+            if if_range.startswith('"') or if_range.startswith("W/"):
+                # Strong comparison only
+                if if_range != etag:
+                    return 200, []
+            elif _parse_http_date(if_range) != mtime:
+                return 200, []
+
+        ranges = parse_range(range_header, self.st.st_size)
+        if ranges is None:
+            return 200, []
+        if not ranges:
+            return 416, []
+        return 206, ranges
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or not self.ranges:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        zero_copy = "http.response.zerocopysend" in scope.get("extensions", {})
+        fd = await anyio.to_thread.run_sync(os.open, str(self.path), os.O_RDONLY)
+        mapped = None
+        metrics.stream_started()
+        try:
+            if not zero_copy and settings.LOCAL_SERVING_READER == "mmap":
+                mapped = await anyio.to_thread.run_sync(mmap.mmap, fd, 0, mmap.MAP_SHARED, mmap.PROT_READ)
+            multipart = self.multipart
+            for i, (start, end) in enumerate(self.ranges):
+                if multipart:
+                    await send({"type": "http.response.body", "body": self.part_headers[i], "more_body": True})
+                await self._send_range(send, fd, mapped, start, end, zero_copy)
+                if multipart:
+                    await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+            await send({"type": "http.response.body", "body": self.closing if multipart else b"", "more_body": False})
+        finally:
+            metrics.stream_finished()
+            if mapped is not None:
+                mapped.close()
+            os.close(fd)
+
+    async def _send_range(self, send: Send, fd: int, mapped: Optional[mmap.mmap], start: int, end: int, zero_copy: bool):
+        if zero_copy:
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": fd,
+                "offset": start,
+                "count": end - start + 1,
+                "more_body": True,
+            })
+            return
+
+        offset = start
+        while offset <= end:
+            length = min(self.chunk_size, end - offset + 1)
+            if mapped is not None:
+                chunk = await anyio.to_thread.run_sync(mapped.__getitem__, slice(offset, offset + length))
+            else:
+                chunk = await anyio.to_thread.run_sync(os.pread, fd, length, offset)
+            if not chunk:
+                # Truncated while being served
+                raise OSError(f"Unexpected end of file in {self.path}")
+            offset += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+def can_serve_locally(query_params) -> bool:
+    """True if local serving is enabled and the request uses no copyparty-only options (e.g. thumbnails)."""
+    return settings.LOCAL_SERVING_ENABLED and all(key in LOCAL_QUERY_PARAMS for key in query_params)
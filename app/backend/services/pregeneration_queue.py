@@ -0,0 +1,203 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.file_security import is_path_forbidden
+from app.backend.database.models import PregenerationJob
+from app.backend.database.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first: a folder someone is about to open beats fresh uploads
+PRIORITY_DIRECTORY = 0
+PRIORITY_UPLOAD = 10
+
+Handler = Callable[[Path, str], Awaitable[None]]
+
+class PregenerationQueue:
+    """
+    Persistent, prioritized queue of preview jobs (thumbnails, posters...).
+
+    Job kinds are registered with a predicate choosing the files they apply to
+    and an async handler doing the work. Jobs live in the `pregeneration_jobs`
+    table and are only removed once they succeed (or fail PREGENERATE_MAX_ATTEMPTS
+    times), so work interrupted by a restart is picked up again. One job runs at
+    a time, followed by a pause that keeps the worker's share of wall-clock time
+    at PREGENERATE_CPU_SHARE.
+    """
+    def __init__(self, root: Path, session_factory: Callable[[], Session] = SessionLocal):
+        self.root = Path(root)
+        self._session_factory = session_factory
+        self._handlers: Dict[str, Tuple[Callable[[Path], bool], Handler]] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.current: Optional[str] = None
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def register(self, kind: str, accepts: Callable[[Path], bool], handler: Handler):
+        """Adds a job kind: `handler(path, rel)` runs for every enqueued file `accepts` matches."""
+        self._handlers[kind] = (accepts, handler)
+
+    def _relative(self, path: Path) -> Optional[str]:
+        try:
+            return Path(path).relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    # --- Enqueueing ---
+
+    def enqueue(self, paths: Iterable[Path], priority: int = PRIORITY_UPLOAD) -> int:
+        """
+        Queues every registered job kind that applies to `paths`. A job already in
+        the queue keeps its place unless the new priority is more urgent.
+        Returns the number of jobs added or promoted.
+        """
+        if not settings.PREGENERATE_ENABLED:
+            return 0
+        jobs = []
+        for path in paths:
+            rel = self._relative(path)
+            if rel is None or is_path_forbidden(Path(rel)):
+                continue
+            for kind, (accepts, _) in self._handlers.items():
+                if accepts(Path(path)):
+                    jobs.append((rel, kind))
+        if not jobs:
+            return 0
+
+        changed = 0
+        now = time.time()
+        with self._lock, self._session_factory() as db:
+            for rel, kind in jobs:
+                existing = db.execute(
+                    select(PregenerationJob).where(PregenerationJob.path == rel, PregenerationJob.kind == kind)
+                ).scalar_one_or_none()
+                if existing is None:
+                    db.add(PregenerationJob(path=rel, kind=kind, priority=priority, created_at=now, attempts=0))
+                    changed += 1
+                elif priority < existing.priority:
+                    existing.priority = priority
+                    changed += 1
+            db.commit()
+        return changed
+
+    def enqueue_directory(self, directory: Path, priority: int = PRIORITY_DIRECTORY, recursive: bool = False) -> int:
+        """Queues the files of a directory (and its subdirectories if `recursive`)."""
+        files = []
+        for current, dirnames, filenames in os.walk(directory):
+            if not recursive:
+                dirnames.clear()
+            dirnames[:] = [d for d in dirnames if not is_path_forbidden(Path(d))]
+            files.extend(Path(current) / name for name in filenames)
+        return self.enqueue(files, priority)
+
+    # --- Processing ---
+
+    def _next_job(self) -> Optional[Tuple[int, str, str]]:
+        with self._lock, self._session_factory() as db:
+            row = db.execute(
+                select(PregenerationJob.id, PregenerationJob.path, PregenerationJob.kind)
+                .order_by(PregenerationJob.priority, PregenerationJob.id)
+                .limit(1)
+            ).first()
+        return tuple(row) if row else None
+
+    def _finish(self, job_id: int, error: Optional[Exception]):
+        with self._lock, self._session_factory() as db:
+            if error is None:
+                db.execute(delete(PregenerationJob).where(PregenerationJob.id == job_id))
+            else:
+                db.execute(
+                    update(PregenerationJob)
+                    .where(PregenerationJob.id == job_id)
+                    .values(attempts=PregenerationJob.attempts + 1, priority=PregenerationJob.priority + 1)
+                )
+                db.execute(delete(PregenerationJob).where(
+                    PregenerationJob.id == job_id,
+                    PregenerationJob.attempts >= settings.PREGENERATE_MAX_ATTEMPTS
+                ))
+            db.commit()
+
+    async def run_next(self) -> bool:
+        """Runs the most urgent job. Returns False if the queue is empty."""
+        job = await asyncio.to_thread(self._next_job)
+        if job is None:
+            return False
+        job_id, rel, kind = job
+        source = self.root / rel
+        handler = self._handlers.get(kind)
+
+        error = None
+        started = time.monotonic()
+        self.current = f"{kind}:{rel}"
+        try:
+            # Jobs for files deleted since, or for kinds no longer registered, are dropped
+            if handler is not None and source.is_file():
+                await handler[1](source, rel)
+            self.completed += 1
+        except Exception as e:
+            error = e
+            self.failed += 1
+            logger.warning(f"Pre-generation of {kind} for '{rel}' failed: {e}")
+        finally:
+            self.current = None
+            self.busy_seconds += time.monotonic() - started
+        await asyncio.to_thread(self._finish, job_id, error)
+        return True
+
+    async def _run(self):
+        share = min(max(settings.PREGENERATE_CPU_SHARE, 0.01), 1.0)
+        while True:
+            started = time.monotonic()
+            if not await self.run_next():
+                await asyncio.sleep(1.0)
+                continue
+            # Idle long enough that work takes at most `share` of the time
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(elapsed * (1.0 - share) / share)
+
+    def start(self):
+        """Starts the background worker on the running event loop."""
+        if settings.PREGENERATE_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> dict:
+        try:
+            with self._session_factory() as db:
+                depth = dict(db.execute(
+                    select(PregenerationJob.kind, func.count(PregenerationJob.id)).group_by(PregenerationJob.kind)
+                ).all())
+        except Exception:
+            depth = None
+        return {
+            "enabled": settings.PREGENERATE_ENABLED,
+            "cpu_share": settings.PREGENERATE_CPU_SHARE,
+            "depth": sum(depth.values()) if depth is not None else None,
+            "depth_by_kind": depth,
+            "current": self.current,
+            "completed": self.completed,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+# Initialize global instance
+pregeneration_queue = PregenerationQueue(settings.SERVE_PATH)
@@ -0,0 +1,304 @@
+import time
+import heapq
+import bisect
+import logging
+import threading
+from array import array
+from collections import Counter
+from typing import Iterable, List, Optional, Set, Tuple
+
+from app.backend.services.index_service import media_type_for
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = ("directory", "image", "video", "text", "other")
+# Trigrams shared by more names than this are too common to help fuzzy matching
+FUZZY_MAX_POSTING = 20000
+# Share of a query's trigrams a name needs for a fuzzy match
+FUZZY_MIN_OVERLAP = 0.5
+# Names verified per query at most; broader queries (e.g. 'jpg') are ranked among
+# the names starting with the query plus the first ones sharing its rarest trigram
+MAX_CANDIDATES = 2000
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchFilters:
+    """Optional constraints applied to every search hit."""
+    def __init__(
+        self,
+        extensions: Optional[Iterable[str]] = None,
+        media_type: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_after: Optional[float] = None,
+        modified_before: Optional[float] = None
+    ):
+        """
+        Raises:
+            ValueError: If the media type is unknown.
+        """
+        if media_type is not None and media_type not in MEDIA_TYPES:
+            raise ValueError(f"Invalid type '{media_type}'. Use one of: {', '.join(MEDIA_TYPES)}")
+        self.extensions = {"." + ext.strip().lower().lstrip(".") for ext in extensions if ext.strip()} if extensions else None
+        self.media_type = media_type
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_after = modified_after
+        self.modified_before = modified_before
+
+    def matches(self, path: str, is_dir: bool, size: int, mtime: float, media_type: Optional[str] = None) -> bool:
+        if self.media_type is not None:
+            if media_type is None:
+                media_type = media_type_for(path.rpartition("/")[2], is_dir)
+            if media_type != self.media_type:
+                return False
+        if self.extensions is not None:
+            name = path.rpartition("/")[2].lower()
+            dot = name.rfind(".")
+            if is_dir or dot <= 0 or name[dot:] not in self.extensions:
+                return False
+        if self.min_size is not None and size < self.min_size:
+            return False
+        if self.max_size is not None and size > self.max_size:
+            return False
+        if self.modified_after is not None and mtime < self.modified_after:
+            return False
+        if self.modified_before is not None and mtime > self.modified_before:
+            return False
+        return True
+
+    def matches_hit(self, hit: dict) -> bool:
+        """Applies the filters to a copyparty-style hit (`p`, `s`, `t`)."""
+        path = hit["p"]
+        return self.matches(path.rstrip("/"), path.endswith("/"), hit.get("s", 0), hit.get("t", 0))
+
+class _Snapshot:
+    """Immutable search structures for one version of the file index."""
+    def __init__(self, rows: Iterable[Tuple[str, bool, int, float, str]], version: int):
+        self.version = version
+        self.paths: List[str] = []
+        self.names: List[str] = []          # Lowercase file names
+        self.sizes = array("q")
+        self.mtimes = array("d")
+        self.types = bytearray()
+        self.is_dir = bytearray()
+        postings = {}
+
+        for doc_id, (path, is_dir, size, mtime, media_type) in enumerate(rows):
+            name = path.rpartition("/")[2].lower()
+            self.paths.append(path)
+            self.names.append(name)
+            self.sizes.append(size or 0)
+            self.mtimes.append(mtime or 0.0)
+            self.types.append(MEDIA_TYPES.index(media_type) if media_type in MEDIA_TYPES else len(MEDIA_TYPES) - 1)
+            self.is_dir.append(1 if is_dir else 0)
+            for gram in _trigrams(name):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("I")
+                posting.append(doc_id)
+        self.trigrams = postings
+
+        # Name-sorted view for prefix lookups of queries too short for trigrams
+        order = sorted(range(len(self.names)), key=self.names.__getitem__)
+        self.sorted_names = [self.names[i] for i in order]
+        self.sorted_ids = array("I", order)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def prefixed(self, token: str, cap: int) -> array:
+        """Ids of up to `cap` names starting with `token`."""
+        start = bisect.bisect_left(self.sorted_names, token)
+        end = bisect.bisect_left(self.sorted_names, token + "\uffff", lo=start)
+        return self.sorted_ids[start:min(end, start + cap)]
+
+    def candidates(self, token: str) -> Iterable[int]:
+        """Ids of names that may contain `token` (a superset), at most about 2 * MAX_CANDIDATES."""
+        if len(token) < 3:
+            return self.prefixed(token, MAX_CANDIDATES)
+        smallest = None
+        for gram in _trigrams(token):
+            posting = self.trigrams.get(gram)
+            if posting is None:
+                return ()
+            if smallest is None or len(posting) < len(smallest):
+                smallest = posting
+        if len(smallest) <= MAX_CANDIDATES:
+            return smallest
+        prefixed = self.prefixed(token, MAX_CANDIDATES)
+        return dict.fromkeys([*prefixed, *smallest[:MAX_CANDIDATES]])
+
+    def hit(self, doc_id: int) -> dict:
+        path = self.paths[doc_id]
+        is_dir = self.is_dir[doc_id]
+        return {"p": path + "/" if is_dir else path, "s": self.sizes[doc_id], "t": self.mtimes[doc_id]}
+
+    def passes(self, doc_id: int, filters: Optional[SearchFilters]) -> bool:
+        if filters is None:
+            return True
+        return filters.matches(
+            self.paths[doc_id], bool(self.is_dir[doc_id]), self.sizes[doc_id],
+            self.mtimes[doc_id], MEDIA_TYPES[self.types[doc_id]]
+        )
+
+def _score(name: str, path: str, tokens: List[str], query: str) -> Optional[float]:
+    """
+    Ranks a name against the query tokens, or returns None if a token is missing.
+    Name matches beat matches in parent folders, and matches at the start of the
+    name or of a word beat matches in the middle; shorter names win ties.
+    """
+    score = 0.0
+    for token in tokens:
+        i = name.find(token)
+        if i < 0:
+            if token in path.lower():
+                score += 1.0
+                continue
+            return None
+        score += 10.0
+        if i == 0:
+            score += 8.0
+        elif not name[i - 1].isalnum():
+            score += 4.0
+    if name == query or name.rpartition(".")[0] == query:
+        score += 50.0
+    return score - len(name) * 0.05
+
+class SearchEngine:
+    """
+    In-memory filename search over the file index.
+
+    Names are indexed by trigram, so a query only verifies the names sharing its
+    rarest trigram instead of scanning every entry; queries shorter than three
+    characters use a sorted name list instead. The longest query token must appear
+    in the name; the others may also match a parent folder. When exact matches
+    don't fill the result limit,
+    names sharing most of the query's trigrams are added as fuzzy matches, which
+    tolerates typos.
+
+    The structures are rebuilt in a background thread whenever the file index
+    changes (`refresh`); queries keep using the previous snapshot meanwhile.
+    """
+    def __init__(self):
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+        self.building = False
+        self.last_build_duration: Optional[float] = None
+        self.last_query_ms: Optional[float] = None
+        self.queries = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def build(self, rows: Iterable[Tuple[str, bool, int, float, str]], version: int = 0):
+        """Builds a new snapshot from (path, is_dir, size, mtime, media_type) rows and swaps it in."""
+        started = time.monotonic()
+        snapshot = _Snapshot(rows, version)
+        self._snapshot = snapshot
+        self.last_build_duration = round(time.monotonic() - started, 3)
+        logger.info(f"Search index built: {len(snapshot)} entries in {self.last_build_duration}s")
+
+    def refresh(self, file_index) -> bool:
+        """
+        Starts a background rebuild if `file_index` changed since the last build.
+        Returns True if a rebuild was started.
+        """
+        if not file_index.ready:
+            return False
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == file_index.version:
+            return False
+        with self._lock:
+            if self.building:
+                return False
+            self.building = True
+
+        def run(version: int):
+            try:
+                self.build(file_index.iter_rows(), version)
+            except Exception as e:
+                logger.error(f"Search index build failed: {e}")
+            finally:
+                self.building = False
+
+        threading.Thread(target=run, args=(file_index.version,), name="search-index", daemon=True).start()
+        return True
+
+    def search(self, query: str, filters: Optional[SearchFilters] = None, limit: int = 100) -> Optional[List[dict]]:
+        """
+        Returns up to `limit` ranked hits in copyparty's format (`p` with a trailing
+        slash for directories, `s`, `t`), or None if no snapshot is built yet.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        started = time.perf_counter()
+        query = " ".join(query.lower().split())
+        tokens = query.split()
+        if not tokens:
+            return []
+
+        # The longest token is usually the most selective
+        driver = max(tokens, key=len)
+        scored = []
+        seen = set()
+        names = snapshot.names
+        for doc_id in snapshot.candidates(driver):
+            name = names[doc_id]
+            if driver not in name:
+                continue
+            seen.add(doc_id)
+            if filters is not None and not snapshot.passes(doc_id, filters):
+                continue
+            score = _score(name, snapshot.paths[doc_id], tokens, query)
+            if score is not None:
+                scored.append((score, doc_id))
+
+        if len(scored) < limit and len(driver) >= 3:
+            scored.extend(self._fuzzy(snapshot, driver, tokens, filters, seen))
+
+        top = heapq.nlargest(limit, scored, key=lambda item: (item[0], -item[1]))
+        hits = [snapshot.hit(doc_id) for _, doc_id in top]
+        self.queries += 1
+        self.last_query_ms = round((time.perf_counter() - started) * 1000, 3)
+        return hits
+
+    def _fuzzy(self, snapshot: _Snapshot, driver: str, tokens: List[str], filters, seen: Set[int]) -> List[Tuple[float, int]]:
+        grams = _trigrams(driver)
+        counts = Counter()
+        for gram in grams:
+            posting = snapshot.trigrams.get(gram)
+            if posting is not None and len(posting) <= FUZZY_MAX_POSTING:
+                counts.update(posting)
+
+        needed = max(2, int(len(grams) * FUZZY_MIN_OVERLAP + 0.5)) if len(grams) > 1 else 1
+        others = [t for t in tokens if t != driver]
+        results = []
+        for doc_id, count in counts.items():
+            if count < needed or doc_id in seen or not snapshot.passes(doc_id, filters):
+                continue
+            path = snapshot.paths[doc_id].lower()
+            if any(t not in path for t in others):
+                continue
+            # Always ranked below exact matches
+            results.append((count / len(grams) * 5.0 - len(snapshot.names[doc_id]) * 0.05 - 10.0, doc_id))
+        return results
+
+    def get_stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "ready": snapshot is not None,
+            "building": self.building,
+            "entries": len(snapshot) if snapshot else 0,
+            "trigrams": len(snapshot.trigrams) if snapshot else 0,
+            "index_version": snapshot.version if snapshot else None,
+            "last_build_duration": self.last_build_duration,
+            "queries": self.queries,
+            "last_query_ms": self.last_query_ms,
+        }
+
+# Initialize global instance
+search_engine = SearchEngine()
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+class _SessionState:
+    __slots__ = ("generation", "task", "query", "key", "hits")
+
+    def __init__(self):
+        self.generation = 0
+        self.task: Optional[asyncio.Task] = None
+        self.query: Optional[str] = None
+        self.key: Optional[Hashable] = None
+        self.hits: Optional[List[dict]] = None
+
+class SearchSessionManager:
+    """
+    Tracks the latest search-as-you-type query per browser session.
+
+    Starting a query supersedes the previous one from the same session: its
+    backend search is cancelled and its response stops streaming. The last
+    complete result set of a substring search (copyparty's) can be kept so that
+    a refinement (the new query extends the previous one) is answered by
+    filtering it instead of searching again. The local engine's results can't
+    be narrowed this way, since it also matches fuzzily and by parent folder.
+    Sessions are kept in a bounded LRU.
+    """
+    def __init__(self, max_sessions: int):
+        self._sessions: OrderedDict[str, _SessionState] = OrderedDict()
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self.cancelled = 0
+        self.refinement_hits = 0
+        self.refinement_misses = 0
+
+    def _state(self, session_id: str) -> _SessionState:
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = _SessionState()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        return state
+
+    def begin(self, session_id: str) -> int:
+        """Starts a new query for the session, cancelling the one in flight. Returns its generation."""
+        with self._lock:
+            state = self._state(session_id)
+            state.generation += 1
+            task, state.task = state.task, None
+        if task is not None and not task.done():
+            task.cancel()
+            self.cancelled += 1
+        return state.generation
+
+    def attach(self, session_id: str, generation: int, task: asyncio.Task):
+        """Registers the backend search of a query so a newer query can cancel it."""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None and state.generation == generation:
+                state.task = task
+                return
+        # Already superseded
+        task.cancel()
+
+    def is_current(self, session_id: str, generation: int) -> bool:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            return state is not None and state.generation == generation
+
+    def refine(self, session_id: str, query: str, key: Hashable) -> Optional[List[dict]]:
+        """
+        Returns the previous results filtered down to `query` if it refines the
+        previous query under the same `key` (source, scope, filters), else None.
+        """
+        query = normalize_query(query)
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None or state.hits is None or state.key != key or not query.startswith(state.query):
+                self.refinement_misses += 1
+                return None
+            hits = state.hits
+            self.refinement_hits += 1
+        tokens = query.split()
+        return [hit for hit in hits if all(token in hit["p"].lower() for token in tokens)]
+
+    def remember(self, session_id: str, query: str, key: Hashable, hits: List[dict], complete: bool):
+        """
+        Stores a result set for later refinements. Only complete (untruncated)
+        sets are kept, since a refinement could match hits a truncated one left out.
+        """
+        query = normalize_query(query)
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return
+            state.query, state.key, state.hits = (query, key, hits) if complete else (None, None, None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "cancelled": self.cancelled,
+                "refinement_hits": self.refinement_hits,
+                "refinement_misses": self.refinement_misses,
+            }
+
+# Initialize global instance
+search_sessions = SearchSessionManager(max_sessions=settings.SESSION_MAX_COUNT)
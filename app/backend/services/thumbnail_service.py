@@ -0,0 +1,213 @@
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    # Optional: without Pillow, thumbnails keep coming from copyparty
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# Formats Pillow decodes that we thumbnail locally (SVG is not a raster format)
+THUMBNAIL_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.ico'}
+
+def parse_thumb_size(value: str) -> Optional[Tuple[int, int]]:
+    """
+    Parses copyparty-style `thumb` values ('300x300', '400') into a bounding box,
+    clamped to THUMBNAIL_MAX_SIZE. Returns None for anything else.
+    """
+    width_s, _, height_s = (value or "").lower().partition("x")
+    try:
+        width = int(width_s)
+        height = int(height_s) if height_s else width
+    except ValueError:
+        return None
+    if width <= 0 or height <= 0:
+        return None
+    limit = settings.THUMBNAIL_MAX_SIZE
+    return min(width, limit), min(height, limit)
+
+def thumbnail_key(rel_path: str, size: Tuple[int, int], st: os.stat_result) -> str:
+    """Cache key from the source path, requested size and the source's mtime."""
+    raw = f"{rel_path}\0{size[0]}x{size[1]}\0{st.st_mtime_ns}\0{st.st_size}"
+    return hashlib.sha1(raw.encode("utf-8", "surrogateescape")).hexdigest()
+
+def render_thumbnail(source: Path, destination: Path, size: Tuple[int, int], quality: int):
+    """Decodes an image, fits it into `size` and writes it as WebP (atomically)."""
+    with Image.open(source) as image:
+        # Lets JPEG decode at a reduced scale, which is much faster for camera photos
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        tmp = destination.with_name(destination.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            image.save(tmp, "WEBP", quality=quality, method=4)
+            os.replace(tmp, destination)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+class ThumbnailCache:
+    """
+    On-disk WebP thumbnail cache with a total size budget.
+
+    Thumbnails are stored as `<cache_dir>/<key[:2]>/<key>.webp`. Since the key
+    includes the source mtime, an edited image simply gets a new entry and the old
+    one ages out. Recency is tracked in memory (seeded from file mtimes at
+    startup, and hits touch the file), and the least recently used thumbnails are
+    deleted once the budget is exceeded. Rendering runs in a thread pool, and
+    concurrent requests for the same thumbnail share one render.
+    """
+    def __init__(self, cache_dir: Path, max_bytes: int, workers: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.webp"
+
+    def _load(self):
+        """Rebuilds the LRU from the files on disk, oldest first. Called with the lock held."""
+        found = []
+        if self.cache_dir.is_dir():
+            for entry in self.cache_dir.glob("*/*.webp"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                found.append((st.st_mtime, entry.stem, st.st_size))
+        found.sort()
+        self._entries = OrderedDict((key, size) for _, key, size in found)
+        self._total = sum(size for _, _, size in found)
+        self._loaded = True
+
+    def _evict(self):
+        victims = []
+        with self._lock:
+            while self._total > self.max_bytes and self._entries:
+                key, size = self._entries.popitem(last=False)
+                self._total -= size
+                self.evictions += 1
+                victims.append(key)
+        for key in victims:
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Returns the cached thumbnail for `key` and marks it recently used."""
+        if not self._loaded:
+            # Under the lock, so concurrent first lookups scan once and a
+            # thumbnail stored meanwhile isn't dropped from the LRU
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+            self._evict()
+        path = self._path(key)
+        with self._lock:
+            known = key in self._entries
+            if known:
+                self._entries.move_to_end(key)
+        if not known or not path.exists():
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def _store(self, source: Path, key: str, size: Tuple[int, int]) -> Path:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        render_thumbnail(source, path, size, settings.THUMBNAIL_QUALITY)
+        stored = path.stat().st_size
+        with self._lock:
+            self._total += stored - self._entries.pop(key, 0)
+            self._entries[key] = stored
+        self._evict()
+        return path
+
+    async def get(self, source: Path, key: str, size: Tuple[int, int]) -> Optional[Path]:
+        """
+        Returns the thumbnail path, rendering it in the worker pool on a miss.
+        Returns None if the image can't be decoded.
+        """
+        cached = await asyncio.to_thread(self.lookup, key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        future = self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, self._store, source, key, size)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        try:
+            return await asyncio.shield(future)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Could not render thumbnail for {source}: {e}")
+            return None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "available": self.available,
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "rendering": len(self._inflight),
+            }
+
+# Initialize global instance
+thumbnail_cache = ThumbnailCache(
+    cache_dir=settings.THUMBNAIL_CACHE_DIR,
+    max_bytes=settings.THUMBNAIL_CACHE_MAX_BYTES,
+    workers=settings.THUMBNAIL_WORKERS
+)
+
+def can_thumbnail_locally(path: Path) -> bool:
+    return settings.THUMBNAILS_ENABLED and thumbnail_cache.available and path.suffix.lower() in THUMBNAIL_EXTENSIONS
+
+async def pregenerate_thumbnails(source: Path, rel_path: str):
+    """Pre-generation job: renders the THUMBNAIL_PREGENERATE_SIZES the UI asks for."""
+    st = source.stat()
+    for value in settings.THUMBNAIL_PREGENERATE_SIZES:
+        size = parse_thumb_size(value)
+        if size is None:
+            continue
+        if await thumbnail_cache.get(source, thumbnail_key(rel_path, size, st), size) is None:
+            raise RuntimeError(f"Could not render {value} thumbnail")
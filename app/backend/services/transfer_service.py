@@ -0,0 +1,582 @@
+import os
+import json
+import time
+import errno
+import shutil
+import asyncio
+import logging
+import secrets
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.constants import PARTIAL_UPLOAD_SUFFIX, PENDING_DELETE_DIR
+from app.core.file_security import is_name_forbidden
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_OPERATIONS = ("copy", "move")
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+# Kernel copies fail with these where the filesystems can't do them; fall back to read/write
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM, errno.EBADF}
+
+class TransferError(Exception):
+    """Raised when a copy or move can't be started (see `status_code`)."""
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+class TransferCancelled(Exception):
+    pass
+
+def _kernel_copy(src_fd: int, dst_fd: int, count: int) -> Optional[int]:
+    """
+    Copies up to `count` bytes between the files' current offsets without going
+    through user space. Returns the number of bytes copied (0 at the end of the
+    source), or None if neither copy_file_range nor sendfile works here.
+    """
+    if settings.TRANSFER_COPY_FILE_RANGE and hasattr(os, "copy_file_range"):
+        try:
+            return os.copy_file_range(src_fd, dst_fd, count)
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+    if hasattr(os, "sendfile"):
+        try:
+            return os.sendfile(dst_fd, src_fd, None, count)
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+    return None
+
+def iter_bottom_up(path: Path):
+    """Yields (path, is_dir) for everything in `path`, contents before their folder."""
+    if not path.is_dir() or path.is_symlink():
+        yield path, False
+        return
+    for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+        for name in filenames:
+            yield Path(dirpath) / name, False
+        for name in dirnames:
+            # Linked folders were not walked into; remove the link only
+            if os.path.islink(os.path.join(dirpath, name)):
+                yield Path(dirpath) / name, False
+            else:
+                yield Path(dirpath) / name, True
+    yield path, True
+
+class TransferJob:
+    """A copy, move or delete of files and folders, run in the background."""
+    def __init__(self, operation: str, sources: List[Path], destination: Optional[Path], username: str):
+        self.id = secrets.token_urlsafe(12)
+        self.operation = operation
+        self.sources = sources
+        self.destination = destination
+        self.username = username
+        self.state = "queued"
+        self.error: Optional[str] = None
+        # Items are the requested sources; files and bytes count what had to be copied
+        self.items_done = 0
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.current: Optional[Path] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        # Deletes: (original path, hidden path it was renamed to)
+        self.staged: List[Tuple[Path, Path]] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def _finish(self, state: str, error: Optional[str] = None):
+        self.state = state
+        self.error = error
+        self.current = None
+        self.finished_at = time.time()
+
+    def to_dict(self, root: Path) -> dict:
+        def rel(path: Path) -> str:
+            return path.relative_to(root).as_posix()
+        return {
+            "id": self.id,
+            "operation": self.operation,
+            "state": self.state,
+            "sources": [rel(p) for p in self.sources],
+            "destination": rel(self.destination) if self.destination is not None else None,
+            "items": {"done": self.items_done, "total": len(self.sources) or len(self.staged)},
+            "files": {"done": self.files_done, "total": self.files_total},
+            "bytes": {"done": self.bytes_done, "total": self.bytes_total},
+            "current": rel(self.current) if self.current is not None else None,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+class TransferManager:
+    """
+    Copies and moves trees on the server as background jobs.
+
+    A move is an `os.rename` when source and destination share a filesystem.
+    Otherwise, and for copies, files are copied in TRANSFER_CHUNK_SIZE steps
+    with copy_file_range or sendfile (read/write where neither works), so the
+    data never passes through Python and the job can be cancelled between
+    chunks. Each file is written under a hidden partial name and renamed when
+    complete. A cancelled or failed job removes what it created, and a moved
+    source is only deleted once its copy is complete.
+
+    A delete renames its items into a hidden PENDING_DELETE_DIR first, so they
+    are gone from their folder at once, then unlinks them in batches of
+    DELETE_BATCH_SIZE with a pause in between, leaving the disk to other
+    requests. Cancelling a delete puts back whatever wasn't removed yet. Items
+    on another mounted filesystem use a PENDING_DELETE_DIR next to them; those
+    folders are recorded in `pending_dirs_file`, so deletes interrupted by a
+    restart are resumed in all of them.
+
+    Jobs are kept in memory for TRANSFER_JOB_RETENTION_SECONDS after they
+    finish; at most TRANSFER_MAX_JOBS run at once, the rest wait their turn.
+    """
+    def __init__(self, root: Path, pending_dirs_file: Optional[Path] = None):
+        self.root = Path(root)
+        self._pending_dirs_file = pending_dirs_file
+        self._pending_dirs: Set[Path] = {self.root / PENDING_DELETE_DIR}
+        self._pending_dirs_lock = threading.Lock()
+        self._jobs: Dict[str, TransferJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._slots = asyncio.Semaphore(settings.TRANSFER_MAX_JOBS)
+        self._subscribers: List[Callable[[Path], None]] = []
+        self._stopping = False
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.renamed = 0
+        self.bytes_copied = 0
+
+    def subscribe(self, callback: Callable[[Path], None]):
+        """Registers a callback taking the absolute path of a directory a job changed."""
+        self._subscribers.append(callback)
+
+    def _notify(self, job: TransferJob):
+        changed = {source.parent for source in job.sources}
+        if job.destination is not None:
+            changed.add(job.destination)
+            changed.update(job.destination / source.name for source in job.sources)
+        for path in changed:
+            for callback in self._subscribers:
+                try:
+                    callback(path)
+                except Exception as e:
+                    logger.error(f"Transfer subscriber failed for '{path}': {e}")
+
+    # --- Jobs ---
+
+    def submit(self, operation: str, sources: List[Path], destination: Path, username: str) -> TransferJob:
+        """
+        Starts copying or moving `sources` into the `destination` directory
+        (absolute paths under root) on the running event loop.
+
+        Raises:
+            TransferError: If a target name is taken (409) or a folder would be
+                copied into itself (400).
+        """
+        if operation not in TRANSFER_OPERATIONS:
+            raise TransferError(f"Operation must be one of: {', '.join(TRANSFER_OPERATIONS)}")
+        if not destination.is_dir():
+            raise TransferError("Destination is not a directory")
+        names = set()
+        for source in sources:
+            if source == self.root:
+                raise TransferError("Can't copy or move the root folder")
+            if source.is_dir() and destination.is_relative_to(source):
+                raise TransferError(f"Can't {operation} '{source.name}' into itself")
+            if source.name in names or (destination / source.name).exists():
+                raise TransferError(f"'{source.name}' already exists in the destination", 409)
+            names.add(source.name)
+
+        job = TransferJob(operation, list(sources), destination, username)
+        self._start(job)
+        logger.info(f"Transfer {job.id}: {operation} of {len(sources)} items to '{destination}'")
+        return job
+
+    async def delete(self, sources: List[Path], username: str) -> TransferJob:
+        """
+        Hides `sources` (absolute paths under root) right away and starts
+        removing them in the background.
+
+        Raises:
+            OSError: If an item couldn't be hidden; none of them are then.
+        """
+        job = TransferJob("delete", list(sources), None, username)
+        await asyncio.to_thread(self._stage, job)
+        self._notify(job)
+        self._start(job)
+        logger.info(f"Transfer {job.id}: delete of {len(sources)} items")
+        return job
+
+    def _start(self, job: TransferJob):
+        self._prune()
+        self._jobs[job.id] = job
+        self._tasks[job.id] = asyncio.create_task(self._run(job))
+
+    def get(self, job_id: str, username: str) -> TransferJob:
+        """
+        Raises:
+            TransferError: If the job doesn't exist or belongs to someone else.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.username != username:
+            raise TransferError("Job not found", 404)
+        return job
+
+    def list_jobs(self, username: str) -> List[TransferJob]:
+        self._prune()
+        return [job for job in self._jobs.values() if job.username == username]
+
+    def cancel(self, job_id: str, username: str) -> TransferJob:
+        """Asks a job to stop; it cleans up after the chunk in flight."""
+        job = self.get(job_id, username)
+        if not job.finished:
+            job.cancel_event.set()
+            if job.state == "queued":
+                job._finish("cancelled")
+                self.cancelled += 1
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - settings.TRANSFER_JOB_RETENTION_SECONDS
+        for job_id in [i for i, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    async def _run(self, job: TransferJob):
+        try:
+            async with self._slots:
+                if job.cancel_event.is_set():
+                    # Cancelled while queued
+                    if job.staged:
+                        await asyncio.to_thread(self._unstage, job)
+                        self._notify(job)
+                    return
+                await asyncio.to_thread(self._execute, job)
+            self._notify(job)
+        finally:
+            self._tasks.pop(job.id, None)
+
+    # --- Work (in a thread) ---
+
+    def _execute(self, job: TransferJob):
+        job.state = "running"
+        if job.operation == "delete":
+            self._purge(job)
+            return
+        created: List[Path] = []
+        try:
+            pending = []
+            for source in job.sources:
+                target = job.destination / source.name
+                if job.operation == "move" and self._rename(source, target):
+                    job.items_done += 1
+                    self.renamed += 1
+                else:
+                    pending.append((source, target))
+
+            for source, target in pending:
+                self._measure(job, source)
+            for source, target in pending:
+                self._check_cancelled(job)
+                if target.exists() or target.is_symlink():
+                    raise FileExistsError(f"'{target.name}' already exists in the destination")
+                created.append(target)
+                self._copy_tree(job, source, target)
+                if job.operation == "move":
+                    # Only now is the data safe in its new place
+                    created.remove(target)
+                    if source.is_dir() and not source.is_symlink():
+                        shutil.rmtree(source)
+                    else:
+                        source.unlink()
+                job.items_done += 1
+        except TransferCancelled:
+            self._discard(created)
+            job._finish("cancelled")
+            self.cancelled += 1
+            logger.info(f"Transfer {job.id} cancelled")
+            return
+        except Exception as e:
+            self._discard(created)
+            job._finish("failed", str(e))
+            self.failed += 1
+            logger.error(f"Transfer {job.id} failed: {e}")
+            return
+        job._finish("completed")
+        self.completed += 1
+        logger.info(f"Transfer {job.id} completed: {job.files_done} files, {job.bytes_done} bytes copied")
+
+    @staticmethod
+    def _rename(source: Path, target: Path) -> bool:
+        """Moves within a filesystem. Returns False if a copy is needed instead."""
+        try:
+            # os.rename would silently replace an existing file
+            if target.exists() or target.is_symlink():
+                raise FileExistsError(f"'{target.name}' already exists in the destination")
+            os.rename(source, target)
+            return True
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                return False
+            raise
+
+    @staticmethod
+    def _check_cancelled(job: TransferJob):
+        if job.cancel_event.is_set():
+            raise TransferCancelled()
+
+    @staticmethod
+    def _walk(job: TransferJob, source: Path):
+        """
+        Yields (directory, dir names, file names) below `source`. Copies leave
+        out forbidden names; moves take everything, as a rename would, since
+        the source is deleted afterwards.
+        """
+        for dirpath, dirnames, filenames in os.walk(source):
+            if job.operation != "move":
+                dirnames[:] = [d for d in dirnames if not is_name_forbidden(d, os.path.splitext(d)[1])]
+                filenames = [f for f in filenames if not is_name_forbidden(f, os.path.splitext(f)[1])]
+            yield dirpath, dirnames, filenames
+
+    def _measure(self, job: TransferJob, source: Path):
+        if not source.is_dir() or source.is_symlink():
+            job.files_total += 1
+            job.bytes_total += source.lstat().st_size
+            return
+        for dirpath, _, filenames in self._walk(job, source):
+            for name in filenames:
+                try:
+                    job.bytes_total += os.lstat(os.path.join(dirpath, name)).st_size
+                    job.files_total += 1
+                except OSError:
+                    pass
+
+    def _copy_tree(self, job: TransferJob, source: Path, target: Path):
+        if not source.is_dir() or source.is_symlink():
+            self._copy_entry(job, source, target)
+            return
+        os.mkdir(target)
+        for dirpath, dirnames, filenames in self._walk(job, source):
+            into = target / Path(dirpath).relative_to(source)
+            for name in list(dirnames):
+                self._check_cancelled(job)
+                if os.path.islink(os.path.join(dirpath, name)):
+                    # Linked folders are recreated as links, not followed
+                    dirnames.remove(name)
+                    self._copy_entry(job, Path(dirpath) / name, into / name)
+                else:
+                    os.mkdir(into / name)
+            for name in filenames:
+                self._copy_entry(job, Path(dirpath) / name, into / name)
+            shutil.copystat(dirpath, into)
+
+    def _copy_entry(self, job: TransferJob, source: Path, target: Path):
+        self._check_cancelled(job)
+        job.current = source
+        if source.is_symlink():
+            os.symlink(os.readlink(source), target)
+        else:
+            temp = target.parent / f".{target.name}.{job.id[:8]}{PARTIAL_UPLOAD_SUFFIX}"
+            try:
+                self._copy_file(job, source, temp)
+                shutil.copystat(source, temp)
+                os.rename(temp, target)
+            except BaseException:
+                temp.unlink(missing_ok=True)
+                raise
+        job.files_done += 1
+
+    def _copy_file(self, job: TransferJob, source: Path, target: Path):
+        chunk = settings.TRANSFER_CHUNK_SIZE
+        with open(source, "rb") as src, open(target, "xb") as dst:
+            src_fd, dst_fd = src.fileno(), dst.fileno()
+            kernel = True
+            while True:
+                self._check_cancelled(job)
+                copied = _kernel_copy(src_fd, dst_fd, chunk) if kernel else None
+                if copied is None:
+                    kernel = False
+                    data = os.read(src_fd, chunk)
+                    copied = len(data)
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(dst_fd, view):]
+                if not copied:
+                    break
+                job.bytes_done += copied
+                self.bytes_copied += copied
+            os.fsync(dst_fd)
+
+    @staticmethod
+    def _discard(created: List[Path]):
+        for path in created:
+            try:
+                if path.is_dir() and not path.is_symlink():
+                    shutil.rmtree(path)
+                else:
+                    path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.error(f"Could not remove '{path}' after an unfinished transfer: {e}")
+
+    # --- Deletes ---
+
+    def _load_pending_dirs(self):
+        if self._pending_dirs_file is None or not self._pending_dirs_file.exists():
+            return
+        try:
+            with open(self._pending_dirs_file, "r") as f:
+                self._pending_dirs.update(Path(path) for path in json.load(f))
+        except Exception as e:
+            logger.error(f"Failed to load pending-delete folders from {self._pending_dirs_file}: {e}")
+
+    def _save_pending_dirs(self):
+        if self._pending_dirs_file is None:
+            return
+        extra = sorted(str(path) for path in self._pending_dirs if path != self.root / PENDING_DELETE_DIR)
+        with open(self._pending_dirs_file, "w") as f:
+            json.dump(extra, f, indent=2)
+
+    def _add_pending_dir(self, pending_dir: Path):
+        """Records a pending-delete folder on another filesystem before anything is staged in it."""
+        with self._pending_dirs_lock:
+            if pending_dir not in self._pending_dirs:
+                self._pending_dirs.add(pending_dir)
+                try:
+                    self._save_pending_dirs()
+                except OSError:
+                    self._pending_dirs.discard(pending_dir)
+                    raise
+
+    def _stage(self, job: TransferJob):
+        """Renames every source into a pending-delete folder on its filesystem."""
+        for n, source in enumerate(job.sources):
+            hidden_name = f"{job.id}-{n}-{source.name}"
+            pending_dir = self.root / PENDING_DELETE_DIR
+            try:
+                pending_dir.mkdir(exist_ok=True)
+                os.rename(source, pending_dir / hidden_name)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    self._unstage(job)
+                    raise
+                # Another filesystem is mounted here; stay on it
+                pending_dir = source.parent / PENDING_DELETE_DIR
+                try:
+                    pending_dir.mkdir(exist_ok=True)
+                    self._add_pending_dir(pending_dir)
+                    os.rename(source, pending_dir / hidden_name)
+                except OSError:
+                    self._unstage(job)
+                    raise
+            job.staged.append((source, pending_dir / hidden_name))
+
+    def _unstage(self, job: TransferJob):
+        """Puts back whatever of a delete is left, where the name is still free."""
+        for original, hidden in job.staged:
+            if original == hidden or not (hidden.exists() or hidden.is_symlink()):
+                continue
+            if original.exists() or original.is_symlink():
+                logger.warning(f"Can't restore '{original}': the name is taken; it stays in '{hidden}'")
+                continue
+            os.rename(hidden, original)
+
+    def _purge(self, job: TransferJob):
+        for _, hidden in job.staged:
+            self._measure_all(job, hidden)
+        removed = 0
+        try:
+            for _, hidden in job.staged:
+                for path, is_dir in iter_bottom_up(hidden):
+                    self._check_cancelled(job)
+                    job.current = path
+                    if is_dir:
+                        os.rmdir(path)
+                    else:
+                        size = path.lstat().st_size
+                        path.unlink()
+                        job.files_done += 1
+                        job.bytes_done += size
+                    removed += 1
+                    if removed % settings.DELETE_BATCH_SIZE == 0:
+                        time.sleep(settings.DELETE_BATCH_PAUSE_SECONDS)
+                job.items_done += 1
+        except TransferCancelled:
+            # On shutdown the rest stays pending and is removed after the restart
+            if not self._stopping:
+                self._unstage(job)
+            job._finish("cancelled")
+            self.cancelled += 1
+            logger.info(f"Transfer {job.id} cancelled, {job.files_done} files had been deleted")
+            return
+        except Exception as e:
+            job._finish("failed", str(e))
+            self.failed += 1
+            logger.error(f"Transfer {job.id} failed: {e}")
+            return
+        job._finish("completed")
+        self.completed += 1
+        logger.info(f"Transfer {job.id} completed: {job.files_done} files, {job.bytes_done} bytes deleted")
+
+    @staticmethod
+    def _measure_all(job: TransferJob, path: Path):
+        for entry, is_dir in iter_bottom_up(path):
+            if not is_dir:
+                try:
+                    job.bytes_total += entry.lstat().st_size
+                    job.files_total += 1
+                except OSError:
+                    pass
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Starts removing what deletes interrupted by a restart left pending."""
+        self._stopping = False
+        self._load_pending_dirs()
+        leftovers = []
+        with self._pending_dirs_lock:
+            for pending_dir in sorted(self._pending_dirs):
+                try:
+                    leftovers.extend(pending_dir.iterdir())
+                except OSError:
+                    # Gone with its mount, or not created yet
+                    continue
+        if leftovers:
+            job = TransferJob("delete", [], None, "")
+            job.staged = [(path, path) for path in leftovers]
+            self._start(job)
+            logger.info(f"Removing {len(leftovers)} items left by interrupted deletes")
+
+    async def stop(self):
+        """Cancels every job and waits for them to clean up."""
+        self._stopping = True
+        for job in self._jobs.values():
+            job.cancel_event.set()
+        tasks = list(self._tasks.values())
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "running": sum(1 for job in self._jobs.values() if job.state == "running"),
+            "queued": sum(1 for job in self._jobs.values() if job.state == "queued"),
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "renamed": self.renamed,
+            "bytes_copied": self.bytes_copied,
+        }
+
+# Initialize global instance
+transfers = TransferManager(settings.SERVE_PATH, settings.BASE_DIR / "storage" / "db" / "pending_deletes.json")
@@ -0,0 +1,336 @@
+import os
+import stat
+import time
+import errno
+import asyncio
+import logging
+import secrets
+import shutil
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.constants import TRASH_DIR_NAME
+from app.core.metrics import metrics
+from app.backend.database.models import TrashItem
+from app.backend.database.session import SessionLocal
+from app.backend.services.transfer_service import iter_bottom_up
+
+logger = logging.getLogger(__name__)
+
+class TrashError(Exception):
+    """Raised when a trash request can't be honoured (see `status_code`)."""
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+class TrashStore:
+    """
+    Soft delete: deleted items are moved into a trash folder and recorded in
+    the `trash_items` table, so they can be restored until they are purged.
+
+    Moving must stay a rename, so an item goes to TRASH_DIR when that is on its
+    filesystem, else to a hidden .trash folder at the top of the served folder
+    or, for another mounted filesystem, next to the item. The purger removes
+    items past TRASH_RETENTION_DAYS, and the oldest ones of a trash folder whose
+    volume is short of TRASH_MIN_FREE_BYTES. It unlinks in batches of
+    DELETE_BATCH_SIZE and, unless space is short, waits while files are being
+    streamed. Data left in a trash folder without a record (a purge interrupted
+    by a restart) is removed when the purger starts, from every folder an item
+    is recorded in as well as the default ones.
+    """
+    def __init__(self, root: Path, trash_dir: Path, session_factory: Callable[[], Session] = SessionLocal):
+        self.root = Path(root)
+        self.trash_dir = Path(trash_dir)
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        # Held while an item is moved in and recorded, so the orphan sweep never sees it half done
+        self._moving = threading.Lock()
+        self._subscribers: List[Callable[[Path], None]] = []
+        self._backlog: List[Path] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.trashed = 0
+        self.restored = 0
+        self.purged = 0
+        self.bytes_purged = 0
+
+    def _locations(self, source: Path) -> List[Path]:
+        return [self.trash_dir, self.root / TRASH_DIR_NAME, source.parent / TRASH_DIR_NAME]
+
+    def _describe(self, item: TrashItem) -> dict:
+        return {
+            "id": item.id,
+            "name": Path(item.original_path).name,
+            "original_path": item.original_path,
+            "is_dir": item.is_dir,
+            "size": item.size,
+            "deleted_at": item.deleted_at,
+            "expires_at": item.deleted_at + settings.TRASH_RETENTION_DAYS * 86400,
+        }
+
+    def subscribe(self, callback: Callable[[Path], None]):
+        """Registers a callback taking the absolute path of a directory an item left or returned to."""
+        self._subscribers.append(callback)
+
+    def _notify(self, path: Path):
+        for callback in self._subscribers:
+            try:
+                callback(path)
+            except Exception as e:
+                logger.error(f"Trash subscriber failed for '{path}': {e}")
+
+    # --- Items ---
+
+    def trash(self, source: Path, username: str) -> dict:
+        """
+        Moves `source` (an absolute path under root) into the trash.
+
+        Raises:
+            OSError: If it can't be moved; it is then left in place.
+        """
+        item_id = secrets.token_urlsafe(12)
+        st = source.lstat()
+        with self._moving:
+            for location in self._locations(source):
+                try:
+                    location.mkdir(parents=True, exist_ok=True)
+                    os.rename(source, location / item_id)
+                    break
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+            else:
+                # Not even next to it, e.g. `source` is itself a mount point
+                raise OSError(errno.EXDEV, f"No trash folder on the filesystem of '{source}'")
+
+            is_dir = stat.S_ISDIR(st.st_mode)
+            item = TrashItem(
+                id=item_id, username=username, original_path=source.relative_to(self.root).as_posix(),
+                location=str(location), is_dir=is_dir, size=None if is_dir else st.st_size,
+                deleted_at=time.time()
+            )
+            try:
+                with self._session_factory() as db:
+                    db.add(item)
+                    db.commit()
+                    described = self._describe(item)
+            except Exception:
+                os.rename(location / item_id, source)
+                raise
+        self.trashed += 1
+        self._notify(source.parent)
+        logger.info(f"Moved '{item.original_path}' to the trash ({location})")
+        return described
+
+    def list_items(self, username: str) -> List[dict]:
+        with self._session_factory() as db:
+            items = db.execute(
+                select(TrashItem).where(TrashItem.username == username).order_by(TrashItem.deleted_at.desc())
+            ).scalars().all()
+            return [self._describe(item) for item in items]
+
+    def get(self, item_id: str, username: str) -> dict:
+        with self._session_factory() as db:
+            item = db.get(TrashItem, item_id)
+            if item is None or item.username != username:
+                raise TrashError("Item not found", 404)
+            return self._describe(item)
+
+    def restore(self, item_id: str, username: str) -> Path:
+        """
+        Moves an item back to where it was deleted from and returns that path.
+
+        Raises:
+            TrashError: If it doesn't exist (404), its name is taken (409) or its
+                data is gone from the trash folder (410; the record is dropped).
+        """
+        with self._session_factory() as db:
+            item = db.get(TrashItem, item_id)
+            if item is None or item.username != username:
+                raise TrashError("Item not found", 404)
+            target = self.root / item.original_path
+            if target.exists() or target.is_symlink():
+                raise TrashError("An item with this name already exists", 409)
+            data = Path(item.location) / item.id
+            if not (data.exists() or data.is_symlink()):
+                db.delete(item)
+                db.commit()
+                logger.warning(f"Dropped trash record of '{item.original_path}': its data is missing")
+                raise TrashError("The item's data is missing from the trash", 410)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(data, target)
+            db.delete(item)
+            db.commit()
+        self.restored += 1
+        self._notify(target.parent)
+        self._notify(target)
+        logger.info(f"Restored '{target}' from the trash")
+        return target
+
+    def purge(self, username: str, ids: Optional[List[str]] = None) -> int:
+        """
+        Permanently deletes the user's items (all, or those in `ids`). They are
+        gone from the trash at once and removed from disk by the purger.
+        """
+        with self._session_factory() as db:
+            query = select(TrashItem).where(TrashItem.username == username)
+            if ids is not None:
+                query = query.where(TrashItem.id.in_(ids))
+            items = db.execute(query).scalars().all()
+            self._queue(db, items)
+        return len(items)
+
+    def _queue(self, db: Session, items: List[TrashItem]):
+        """Drops the records of `items` and hands their data to the purger."""
+        with self._lock:
+            self._backlog.extend(Path(item.location) / item.id for item in items)
+        for item in items:
+            db.delete(item)
+        db.commit()
+
+    # --- Purging (in a thread) ---
+
+    def _short_of_space(self, location: Path) -> bool:
+        try:
+            return shutil.disk_usage(location).free < settings.TRASH_MIN_FREE_BYTES
+        except OSError:
+            return False
+
+    def _queue_for_space(self) -> bool:
+        """Queues the oldest item of a trash folder short on space, if any."""
+        with self._session_factory() as db:
+            short: Dict[str, bool] = {}
+            for item in db.execute(select(TrashItem).order_by(TrashItem.deleted_at)).scalars():
+                if item.location not in short:
+                    short[item.location] = self._short_of_space(Path(item.location))
+                if short[item.location]:
+                    logger.info(f"Purging '{item.original_path}' from the trash to free space")
+                    self._queue(db, [item])
+                    return True
+        return False
+
+    def _sweep_orphans(self):
+        """Queues data in the trash folders that no record points to."""
+        orphans = []
+        with self._moving:
+            with self._session_factory() as db:
+                known = set(db.execute(select(TrashItem.id)).scalars())
+                recorded = db.execute(select(TrashItem.location).distinct()).scalars()
+                locations = {self.trash_dir, self.root / TRASH_DIR_NAME, *map(Path, recorded)}
+            for location in locations:
+                try:
+                    orphans.extend(p for p in location.iterdir() if p.name not in known)
+                except OSError:
+                    continue
+        if orphans:
+            logger.info(f"Removing {len(orphans)} orphaned items from the trash")
+            with self._lock:
+                self._backlog.extend(orphans)
+
+    def purge_due(self) -> int:
+        """
+        Purges expired and explicitly purged items, then the oldest items while
+        a trash folder is short on space. Returns how many items were removed.
+        """
+        cutoff = time.time() - settings.TRASH_RETENTION_DAYS * 86400
+        with self._session_factory() as db:
+            expired = db.execute(select(TrashItem).where(TrashItem.deleted_at < cutoff)).scalars().all()
+            if expired:
+                logger.info(f"Purging {len(expired)} expired items from the trash")
+                self._queue(db, expired)
+
+        removed = 0
+        while not self._stopping:
+            with self._lock:
+                path = self._backlog.pop(0) if self._backlog else None
+            if path is None:
+                if self._queue_for_space():
+                    continue
+                break
+            self._remove(path, urgent=self._short_of_space(path.parent))
+            removed += 1
+        return removed
+
+    def _remove(self, path: Path, urgent: bool):
+        count = 0
+        for entry, is_dir in iter_bottom_up(path):
+            if self._stopping:
+                # The rest is found again by the orphan sweep
+                return
+            try:
+                if is_dir:
+                    os.rmdir(entry)
+                else:
+                    size = entry.lstat().st_size
+                    entry.unlink()
+                    self.bytes_purged += size
+            except FileNotFoundError:
+                pass
+            count += 1
+            if count % settings.DELETE_BATCH_SIZE == 0:
+                while not urgent and metrics.active_streams > 0 and not self._stopping:
+                    time.sleep(settings.TRASH_STREAM_WAIT_SECONDS)
+                time.sleep(settings.DELETE_BATCH_PAUSE_SECONDS)
+        self.purged += 1
+
+    async def _run(self):
+        await asyncio.to_thread(self._sweep_orphans)
+        while True:
+            try:
+                await asyncio.to_thread(self.purge_due)
+            except Exception as e:
+                logger.error(f"Trash purge failed: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.TRASH_PURGE_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def wake(self):
+        """Runs the purger now instead of at its next interval."""
+        if self._wake is not None:
+            self._wake.set()
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Starts the purger on the running event loop."""
+        if self._task is None:
+            self._stopping = False
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> dict:
+        try:
+            with self._session_factory() as db:
+                items = len(db.execute(select(TrashItem.id)).all())
+        except Exception:
+            items = None
+        return {
+            "items": items,
+            "pending_purge": len(self._backlog),
+            "trashed": self.trashed,
+            "restored": self.restored,
+            "purged": self.purged,
+            "bytes_purged": self.bytes_purged,
+        }
+
+# Initialize global instance
+trash = TrashStore(settings.SERVE_PATH, settings.TRASH_DIR)
@@ -0,0 +1,419 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import logging
+import hashlib
+import secrets
+import threading
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.constants import PARTIAL_UPLOAD_SUFFIX
+from app.backend.database.models import UploadSession
+from app.backend.database.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+class UploadError(Exception):
+    """Raised when an upload request can't be honoured (see `status_code`)."""
+    def __init__(self, detail: str, status_code: int = 400, offset: Optional[int] = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.offset = offset
+
+class ResumableUploadManager:
+    """
+    Resumable uploads written straight to disk.
+
+    An upload announces its final path and size, then sends chunks at explicit
+    offsets. Chunks go to a hidden partial file in the target directory, so
+    finishing is an atomic rename on the same volume and a dropped connection
+    only loses the chunk in flight: the offset to resume from is the partial
+    file's size. Sessions are stored in the `upload_sessions` table and survive
+    restarts; those untouched for UPLOAD_SESSION_EXPIRY_SECONDS are removed with
+    their partial files.
+
+    Single-request uploads (`write_stream`) use the same partial files without
+    a session. They remove their partial file however they end, unless the
+    server stops mid-body, so their partial files are recorded in
+    `streams_file` while they run; those a restart left behind are removed
+    once just as old.
+    """
+    def __init__(self, root: Path, session_factory: Callable[[], Session] = SessionLocal,
+                 streams_file: Optional[Path] = None):
+        self.root = Path(root)
+        self._session_factory = session_factory
+        self._streams_file = streams_file
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._streams: Set[Path] = set()
+        self._streams_lock = threading.Lock()
+        self._orphans: Set[Path] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.completed = 0
+        self.streamed = 0
+        self.expired = 0
+        self.bytes_received = 0
+
+    def _temp_path(self, upload: UploadSession) -> Path:
+        return (self.root / upload.path).parent / upload.temp_name
+
+    @staticmethod
+    def _describe(upload: UploadSession, offset: int) -> dict:
+        return {"id": upload.id, "path": upload.path, "size": upload.size, "offset": offset}
+
+    @staticmethod
+    def _check_space(directory: Path, needed: int):
+        if shutil.disk_usage(directory).free - needed < settings.UPLOAD_MIN_FREE_BYTES:
+            raise UploadError("Not enough free space", 507)
+
+    @staticmethod
+    def _publish(temp: Path, target: Path, offset: Optional[int] = None):
+        """Moves a finished partial file to `target`, never replacing an existing file."""
+        fd = os.open(temp, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        try:
+            # A hard link never replaces an existing file
+            os.link(temp, target)
+            os.unlink(temp)
+        except FileExistsError:
+            raise UploadError("A file with this name already exists", 409, offset)
+        except OSError:
+            # Filesystems without hard links (e.g. Android shared storage)
+            if target.exists():
+                raise UploadError("A file with this name already exists", 409, offset)
+            os.replace(temp, target)
+
+    def offset(self, upload: UploadSession) -> int:
+        try:
+            return self._temp_path(upload).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    # --- Sessions ---
+
+    def create(self, username: str, target: Path, size: int) -> dict:
+        """
+        Starts an upload of `size` bytes to `target` (an absolute path under root).
+
+        Raises:
+            UploadError: If the file exists, is too large or doesn't fit on the volume.
+        """
+        if size < 0 or size > settings.UPLOAD_MAX_SIZE:
+            raise UploadError(f"Size must be between 0 and {settings.UPLOAD_MAX_SIZE} bytes", 413)
+        if target.exists():
+            raise UploadError("A file with this name already exists", 409)
+        self._check_space(target.parent, size)
+
+        upload_id = secrets.token_urlsafe(18)
+        now = time.time()
+        upload = UploadSession(
+            id=upload_id, username=username, path=target.relative_to(self.root).as_posix(),
+            temp_name=f".{target.name}.{upload_id[:12]}{PARTIAL_UPLOAD_SUFFIX}",
+            size=size, created_at=now, updated_at=now
+        )
+        temp = self._temp_path(upload)
+        temp.touch(exist_ok=False)
+        try:
+            with self._session_factory() as db:
+                db.add(upload)
+                db.commit()
+                return self._describe(upload, 0)
+        except Exception:
+            temp.unlink(missing_ok=True)
+            raise
+
+    def get(self, upload_id: str, username: str) -> UploadSession:
+        """
+        Raises:
+            UploadError: If the upload doesn't exist or belongs to someone else.
+        """
+        with self._session_factory() as db:
+            upload = db.get(UploadSession, upload_id)
+            if upload is None or upload.username != username:
+                raise UploadError("Upload not found", 404)
+            db.expunge(upload)
+            return upload
+
+    def status(self, upload_id: str, username: str) -> dict:
+        upload = self.get(upload_id, username)
+        return self._describe(upload, self.offset(upload))
+
+    def _touch(self, upload_id: str):
+        with self._session_factory() as db:
+            upload = db.get(UploadSession, upload_id)
+            if upload is not None:
+                upload.updated_at = time.time()
+                db.commit()
+
+    def _forget(self, upload_id: str):
+        with self._session_factory() as db:
+            upload = db.get(UploadSession, upload_id)
+            if upload is not None:
+                db.delete(upload)
+                db.commit()
+        self._locks.pop(upload_id, None)
+
+    # --- Data ---
+
+    async def write_chunk(self, upload_id: str, username: str, offset: int, chunks: AsyncIterator[bytes]) -> dict:
+        """
+        Appends a chunk that must start at the current offset.
+
+        Raises:
+            UploadError: On an offset mismatch (409, with the current offset), if
+                the chunk runs past the announced size (413) or another chunk
+                for this upload is still being written (409).
+        """
+        upload = await asyncio.to_thread(self.get, upload_id, username)
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        if lock.locked():
+            raise UploadError("Another chunk is being written", 409, await asyncio.to_thread(self.offset, upload))
+
+        async with lock:
+            temp = self._temp_path(upload)
+            try:
+                fd = await asyncio.to_thread(os.open, temp, os.O_WRONLY)
+            except FileNotFoundError:
+                raise UploadError("Upload not found", 404)
+            try:
+                current = os.fstat(fd).st_size
+                if offset != current:
+                    raise UploadError("Offset mismatch", 409, current)
+                position = offset
+                async for data in chunks:
+                    if not data:
+                        continue
+                    if position + len(data) > upload.size:
+                        raise UploadError("Chunk runs past the announced size", 413, position)
+                    await asyncio.to_thread(os.pwrite, fd, data, position)
+                    position += len(data)
+                    self.bytes_received += len(data)
+            finally:
+                os.close(fd)
+                await asyncio.to_thread(self._touch, upload_id)
+        return self._describe(upload, position)
+
+    def complete(self, upload_id: str, username: str) -> Path:
+        """
+        Moves a fully received upload into place and returns its final path.
+
+        Raises:
+            UploadError: If bytes are missing (409) or the name was taken meanwhile (409).
+        """
+        upload = self.get(upload_id, username)
+        temp = self._temp_path(upload)
+        target = self.root / upload.path
+        received = self.offset(upload)
+        if received != upload.size:
+            raise UploadError(f"Upload incomplete ({received} of {upload.size} bytes)", 409, received)
+
+        self._publish(temp, target, received)
+        self._forget(upload_id)
+        self.completed += 1
+        return target
+
+    def abort(self, upload_id: str, username: str):
+        upload = self.get(upload_id, username)
+        self._temp_path(upload).unlink(missing_ok=True)
+        self._forget(upload_id)
+
+    # --- Streaming ---
+
+    @staticmethod
+    def _write_block(fd: int, block: bytearray, digest):
+        digest.update(block)
+        view = memoryview(block)
+        while view:
+            view = view[os.write(fd, view):]
+
+    async def write_stream(self, target: Path, chunks: AsyncIterator[bytes], size: Optional[int] = None,
+                           sha256: Optional[str] = None) -> dict:
+        """
+        Writes a request body straight to `target` (an absolute path under root).
+
+        The body goes to a hidden partial file in UPLOAD_WRITE_BUFFER_SIZE blocks
+        and is moved into place once complete. The next chunk is read only after
+        the previous block is on disk, so a client can't outrun the storage.
+
+        Raises:
+            UploadError: If the file exists (409), the body is larger than `size`
+                or UPLOAD_MAX_SIZE (413), free space runs out (507), or the body
+                doesn't match `size` (400) or `sha256` (422).
+        """
+        limit = settings.UPLOAD_MAX_SIZE if size is None else size
+        if limit < 0 or limit > settings.UPLOAD_MAX_SIZE:
+            raise UploadError(f"Size must be between 0 and {settings.UPLOAD_MAX_SIZE} bytes", 413)
+        if target.exists():
+            raise UploadError("A file with this name already exists", 409)
+        await asyncio.to_thread(self._check_space, target.parent, size or 0)
+
+        temp = target.parent / f".{target.name}.{secrets.token_urlsafe(9)}{PARTIAL_UPLOAD_SUFFIX}"
+        digest = hashlib.sha256()
+        received = 0
+        checked = 0
+        buffer = bytearray()
+        await asyncio.to_thread(self._record_stream, temp, True)
+        try:
+            fd = await asyncio.to_thread(os.open, temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except BaseException:
+            await asyncio.to_thread(self._record_stream, temp, False)
+            raise
+        try:
+            try:
+                async for data in chunks:
+                    received += len(data)
+                    if received > limit:
+                        raise UploadError("Body is larger than allowed", 413)
+                    buffer += data
+                    if len(buffer) < settings.UPLOAD_WRITE_BUFFER_SIZE:
+                        continue
+                    block, buffer = buffer, bytearray()
+                    await asyncio.to_thread(self._write_block, fd, block, digest)
+                    # Without a known size the volume could fill up mid-body
+                    if received - checked >= settings.UPLOAD_CHUNK_SIZE:
+                        checked = received
+                        remaining = size - received if size is not None else 0
+                        await asyncio.to_thread(self._check_space, target.parent, remaining)
+                if buffer:
+                    await asyncio.to_thread(self._write_block, fd, buffer, digest)
+            finally:
+                os.close(fd)
+
+            if size is not None and received != size:
+                raise UploadError(f"Body ended after {received} of {size} bytes", 400)
+            if sha256 and digest.hexdigest() != sha256.lower():
+                raise UploadError("Checksum mismatch", 422)
+            await asyncio.to_thread(self._publish, temp, target)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+        finally:
+            await asyncio.to_thread(self._record_stream, temp, False)
+
+        self.streamed += 1
+        self.bytes_received += received
+        return {"path": target.relative_to(self.root).as_posix(), "size": received, "sha256": digest.hexdigest()}
+
+    # --- Housekeeping ---
+
+    def _save_streams(self):
+        if self._streams_file is None:
+            return
+        try:
+            with open(self._streams_file, "w") as f:
+                json.dump(sorted(str(path) for path in self._streams), f, indent=2)
+        except Exception as e:
+            logger.error(f"Failed to save streamed uploads to {self._streams_file}: {e}")
+
+    def _record_stream(self, temp: Path, running: bool):
+        """Adds or drops the partial file of a single-request upload in `streams_file`."""
+        with self._streams_lock:
+            if running:
+                self._streams.add(temp)
+            else:
+                self._streams.discard(temp)
+            self._save_streams()
+
+    def _find_orphans(self):
+        """Collects the partial files of single-request uploads that a restart cut off."""
+        if self._streams_file is None or not self._streams_file.exists():
+            return
+        try:
+            with open(self._streams_file, "r") as f:
+                recorded = {Path(path) for path in json.load(f)}
+        except Exception as e:
+            logger.error(f"Failed to load streamed uploads from {self._streams_file}: {e}")
+            return
+        with self._streams_lock:
+            # Kept recorded until removed, in case of another restart
+            self._orphans.update(recorded - self._streams)
+            self._streams.update(recorded)
+
+    def cleanup_expired(self) -> int:
+        """
+        Removes uploads untouched for UPLOAD_SESSION_EXPIRY_SECONDS, and orphaned
+        partial files unmodified for as long. Returns how many.
+        """
+        cutoff = time.time() - settings.UPLOAD_SESSION_EXPIRY_SECONDS
+        removed = 0
+        with self._session_factory() as db:
+            stale = db.execute(select(UploadSession).where(UploadSession.updated_at < cutoff)).scalars().all()
+            for upload in stale:
+                if upload.id in self._locks and self._locks[upload.id].locked():
+                    continue
+                self._temp_path(upload).unlink(missing_ok=True)
+                db.delete(upload)
+                self._locks.pop(upload.id, None)
+                self.expired += 1
+                removed += 1
+                logger.info(f"Removed abandoned upload of '{upload.path}'")
+            db.commit()
+
+        for path in list(self._orphans):
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    continue
+                path.unlink()
+                self.expired += 1
+                removed += 1
+                logger.info(f"Removed orphaned partial upload '{path}'")
+            except FileNotFoundError:
+                pass
+            self._orphans.discard(path)
+            self._record_stream(path, False)
+        return removed
+
+    async def _run(self):
+        try:
+            await asyncio.to_thread(self._find_orphans)
+        except Exception as e:
+            logger.error(f"Looking up cut off uploads failed: {e}")
+        while True:
+            try:
+                await asyncio.to_thread(self.cleanup_expired)
+            except Exception as e:
+                logger.error(f"Upload cleanup failed: {e}")
+            await asyncio.sleep(settings.UPLOAD_CLEANUP_INTERVAL_SECONDS)
+
+    def start(self):
+        """Starts the cleanup of abandoned uploads on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> dict:
+        try:
+            with self._session_factory() as db:
+                active = len(db.execute(select(UploadSession.id)).all())
+        except Exception:
+            active = None
+        return {
+            "active": active,
+            "completed": self.completed,
+            "streamed": self.streamed,
+            "expired": self.expired,
+            "bytes_received": self.bytes_received,
+        }
+
+# Initialize global instance
+resumable_uploads = ResumableUploadManager(
+    settings.SERVE_PATH, streams_file=settings.BASE_DIR / "storage" / "db" / "streaming_uploads.json"
+)
@@ -0,0 +1,223 @@
+import os
+import json
+import math
+import shutil
+import asyncio
+import hashlib
+import logging
+import subprocess
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.constants import VIDEO_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+POSTER_NAME = "poster.jpg"
+SPRITE_NAME = "sprite.jpg"
+META_NAME = "meta.json"
+
+def probe_video(ffprobe: str, source: str, timeout: float) -> dict:
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "format=duration:stream=width,height", "-of", "json", source],
+        capture_output=True, timeout=timeout, check=True
+    )
+    info = json.loads(result.stdout)
+    stream = (info.get("streams") or [{}])[0]
+    duration = float(info.get("format", {}).get("duration") or 0)
+    if not stream.get("width") or not stream.get("height") or duration <= 0:
+        raise ValueError("No video stream or unknown duration")
+    return {"duration": duration, "width": int(stream["width"]), "height": int(stream["height"])}
+
+def render_video_previews(
+    ffmpeg: str, ffprobe: str, source: str, destination: str,
+    max_frames: int, columns: int, tile_width: int, poster_width: int, timeout: float
+) -> dict:
+    """
+    Writes a poster frame, a sprite sheet of evenly spaced frames and their
+    layout (meta.json) into `destination`. Runs in a worker process.
+    """
+    info = probe_video(ffprobe, source, timeout)
+    duration = info["duration"]
+    # Frames at least a second apart, so short clips get a smaller sheet
+    frames = max(1, min(max_frames, int(duration)))
+    columns = min(columns, frames)
+    rows = math.ceil(frames / columns)
+    interval = duration / frames
+    tile_height = max(2, round(tile_width * info["height"] / info["width"] / 2) * 2)
+    out = Path(destination)
+
+    subprocess.run(
+        [ffmpeg, "-v", "error", "-y", "-ss", f"{min(duration * 0.1, 10.0):.3f}", "-i", source,
+         "-frames:v", "1", "-vf", f"scale={poster_width}:-2", "-q:v", "4", str(out / POSTER_NAME)],
+        capture_output=True, timeout=timeout, check=True
+    )
+    # Decoding keyframes only is far cheaper than decoding every frame, and close
+    # enough for seek previews
+    subprocess.run(
+        [ffmpeg, "-v", "error", "-y", "-skip_frame", "nokey", "-i", source,
+         "-vf", f"fps=1/{interval:.6f},scale={tile_width}:{tile_height},tile={columns}x{rows}",
+         "-frames:v", "1", "-q:v", "5", str(out / SPRITE_NAME)],
+        capture_output=True, timeout=timeout, check=True
+    )
+
+    meta = {
+        "duration": duration,
+        "width": info["width"],
+        "height": info["height"],
+        "frames": frames,
+        "columns": columns,
+        "rows": rows,
+        "interval": interval,
+        "tile_width": tile_width,
+        "tile_height": tile_height,
+    }
+    (out / META_NAME).write_text(json.dumps(meta))
+    return meta
+
+def _timestamp(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+def build_vtt(meta: dict, sprite_url: str) -> str:
+    """WebVTT thumbnail track pointing each interval at its tile (`#xywh=`) in the sprite."""
+    lines = ["WEBVTT", ""]
+    width, height = meta["tile_width"], meta["tile_height"]
+    for i in range(meta["frames"]):
+        start = i * meta["interval"]
+        end = min((i + 1) * meta["interval"], meta["duration"])
+        x, y = (i % meta["columns"]) * width, (i // meta["columns"]) * height
+        lines += [f"{_timestamp(start)} --> {_timestamp(end)}", f"{sprite_url}#xywh={x},{y},{width},{height}", ""]
+    return "\n".join(lines)
+
+class VideoPreviewCache:
+    """
+    Poster frames and seek-preview sprite sheets rendered by a local ffmpeg.
+
+    Each video gets `<cache_dir>/<sha1(path)>/<mtime>-<size>/`, so an edited video
+    gets a fresh entry and older versions are removed when it is rendered.
+    Rendering runs in a process pool (a thread pool where the platform lacks
+    working process semaphores, e.g. Android), and concurrent requests for the
+    same video share one render.
+    """
+    def __init__(self, cache_dir: Path, workers: int):
+        self.cache_dir = Path(cache_dir)
+        self.workers = workers
+        self._executor: Optional[Executor] = None
+        self._executor_lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.rendered = 0
+        self.hits = 0
+        self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return bool(settings.VIDEO_PREVIEWS_ENABLED and shutil.which(settings.FFMPEG_PATH) and shutil.which(settings.FFPROBE_PATH))
+
+    def _get_executor(self) -> Executor:
+        with self._executor_lock:
+            if self._executor is None:
+                try:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                except (ImportError, NotImplementedError, OSError) as e:
+                    logger.info(f"Process pool unavailable ({e}), rendering video previews in threads")
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="video-preview")
+            return self._executor
+
+    def entry_dir(self, rel_path: str, st: os.stat_result) -> Path:
+        digest = hashlib.sha1(rel_path.encode("utf-8", "surrogateescape")).hexdigest()
+        return self.cache_dir / digest / f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    @staticmethod
+    def load_meta(entry: Path) -> Optional[dict]:
+        try:
+            return json.loads((entry / META_NAME).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _render(self, source: Path, entry: Path):
+        tmp = entry.with_name(entry.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        try:
+            future = self._get_executor().submit(
+                render_video_previews,
+                settings.FFMPEG_PATH, settings.FFPROBE_PATH, str(source), str(tmp),
+                settings.VIDEO_PREVIEW_FRAMES, settings.VIDEO_PREVIEW_COLUMNS,
+                settings.VIDEO_PREVIEW_TILE_WIDTH, settings.VIDEO_PREVIEW_POSTER_WIDTH,
+                settings.VIDEO_PREVIEW_TIMEOUT_SECONDS
+            )
+            future.result()
+            # Replace older versions of the same video
+            for sibling in entry.parent.iterdir():
+                if sibling != tmp:
+                    shutil.rmtree(sibling, ignore_errors=True)
+            os.replace(tmp, entry)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    async def get(self, source: Path, rel_path: str) -> Optional[Path]:
+        """
+        Returns the cache entry (poster, sprite, meta.json) for a video, rendering
+        it on a miss. Returns None if ffmpeg fails on the file.
+        """
+        entry = self.entry_dir(rel_path, source.stat())
+        if (entry / META_NAME).exists():
+            self.hits += 1
+            return entry
+
+        key = str(entry)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(asyncio.to_thread(self._render, source, entry))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            future.add_done_callback(self._count)
+        try:
+            await asyncio.shield(future)
+            return entry
+        except Exception as e:
+            logger.warning(f"Could not render video previews for {source}: {e}")
+            return None
+
+    def _count(self, future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None:
+            self.errors += 1
+        else:
+            self.rendered += 1
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def get_stats(self) -> dict:
+        return {
+            "available": self.available,
+            "rendered": self.rendered,
+            "hits": self.hits,
+            "errors": self.errors,
+            "rendering": len(self._inflight),
+        }
+
+# Initialize global instance
+video_previews = VideoPreviewCache(
+    cache_dir=settings.VIDEO_PREVIEW_CACHE_DIR,
+    workers=settings.VIDEO_PREVIEW_WORKERS
+)
+
+def can_preview_video(path: Path) -> bool:
+    return path.suffix.lower() in VIDEO_EXTENSIONS and video_previews.available
+
+async def pregenerate_video_previews(source: Path, rel_path: str):
+    """Pre-generation job: renders the poster and sprite sheet of an uploaded video."""
+    if await video_previews.get(source, rel_path) is None:
+        raise RuntimeError("ffmpeg failed")
@@ -64,6 +64,154 @@ class Settings(BaseSettings):
     COPYPARTY_ADMIN_USER: str = "admin"
     COPYPARTY_ADMIN_PASS: Optional[str] = None
 
+    # Copyparty HTTP client (shared keep-alive pool and per-operation timeouts, in seconds)
+    COPYPARTY_POOL_SIZE: int = 20
+    COPYPARTY_POOL_KEEPALIVE: int = 10
+    COPYPARTY_CONNECT_TIMEOUT: float = 5.0
+    COPYPARTY_API_TIMEOUT: float = 10.0
+    COPYPARTY_PMASK_TIMEOUT: float = 5.0
+    COPYPARTY_STREAM_TIMEOUT: float = 3600.0
+
+    # Directory listing API
+    LIST_MAX_PAGE_SIZE: int = 5000
+    # Listing cache, bounded by the total number of cached entries
+    LISTING_CACHE_MAX_ENTRIES: int = 200000
+    LISTING_CACHE_TTL_SECONDS: float = 300.0
+
+    # Persistent file index (storage/db). LISTING_SOURCE picks what listing, gallery
+    # and search answer from by default: 'live' (filesystem/copyparty) or 'index'.
+    INDEX_ENABLED: bool = True
+    # Full rescans are a safety net; the change detector keeps the index current
+    INDEX_RESCAN_INTERVAL_SECONDS: float = 86400.0
+    LISTING_SOURCE: str = "live"
+
+    # Change detection under SERVE_PATH: directory mtime polling, plus inotify
+    # when the optional inotify_simple package is installed (the 'inotify' extra:
+    # `pip install .[inotify]`); without it, changes inside files that don't touch
+    # their directory are only seen by the full rescan
+    CHANGE_DETECTION_ENABLED: bool = True
+    CHANGE_DETECTION_INTERVAL_SECONDS: float = 30.0
+    CHANGE_DETECTION_INOTIFY: bool = True
+
+    # Search: 'index' uses the local in-memory engine, 'live' asks copyparty.
+    # Search-as-you-type only answers a refined query (one extending the last)
+    # from the previous results with 'live'; the local engine is asked again.
+    SEARCH_SOURCE: str = "index"
+    SEARCH_DEFAULT_LIMIT: int = 200
+    SEARCH_MAX_LIMIT: int = 1000
+    # Search-as-you-type results are streamed: a small first batch, then larger ones
+    SEARCH_STREAM_FIRST_BATCH: int = 12
+    SEARCH_STREAM_BATCH: int = 48
+
+    # Permission mask cache (per user and directory)
+    PMASK_CACHE_TTL_SECONDS: float = 30.0
+    PMASK_CACHE_MAX_ENTRIES: int = 4096
+
+    # Downloads readable by the user are served from disk instead of through
+    # copyparty. The body is read via 'mmap' or 'pread' unless the ASGI server
+    # supports zero-copy sends.
+    LOCAL_SERVING_ENABLED: bool = True
+    LOCAL_SERVING_READER: str = "mmap"
+    LOCAL_SERVING_CHUNK_SIZE: int = 256 * 1024
+
+    # Image thumbnails rendered locally as WebP (needs the optional Pillow package;
+    # without it, and for videos, thumbnails come from copyparty)
+    THUMBNAILS_ENABLED: bool = True
+    THUMBNAIL_CACHE_DIR: Path = BASE_DIR / "storage" / "cache" / "thumbs"
+    THUMBNAIL_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    THUMBNAIL_WORKERS: int = 2
+    THUMBNAIL_MAX_SIZE: int = 1024
+    THUMBNAIL_QUALITY: int = 80
+    THUMBNAIL_MAX_AGE_SECONDS: int = 7 * 86400
+    # Sizes rendered ahead of time (the gallery asks for 300x300)
+    THUMBNAIL_PREGENERATE_SIZES: list[str] = ["300x300"]
+
+    # Video poster frames and seek-preview sprite sheets, rendered by a local
+    # ffmpeg. Answered with 503 when ffmpeg/ffprobe aren't on the PATH.
+    VIDEO_PREVIEWS_ENABLED: bool = True
+    FFMPEG_PATH: str = "ffmpeg"
+    FFPROBE_PATH: str = "ffprobe"
+    VIDEO_PREVIEW_CACHE_DIR: Path = BASE_DIR / "storage" / "cache" / "video"
+    VIDEO_PREVIEW_WORKERS: int = 1
+    VIDEO_PREVIEW_TIMEOUT_SECONDS: float = 300.0
+    # Sprite sheet: up to FRAMES tiles of TILE_WIDTH pixels, COLUMNS per row
+    VIDEO_PREVIEW_FRAMES: int = 60
+    VIDEO_PREVIEW_COLUMNS: int = 10
+    VIDEO_PREVIEW_TILE_WIDTH: int = 160
+    VIDEO_PREVIEW_POSTER_WIDTH: int = 640
+    VIDEO_PREVIEW_MAX_AGE_SECONDS: int = 7 * 86400
+
+    # On-demand HLS transcoding (/hls/...) for videos browsers can't play directly
+    # or that are too heavy for mobile data. Renditions are 'height:video bitrate'.
+    HLS_ENABLED: bool = True
+    HLS_RENDITIONS: list[str] = ["360:800k", "720:2500k"]
+    HLS_SEGMENT_SECONDS: int = 6
+    HLS_PRESET: str = "veryfast"
+    HLS_CACHE_DIR: Path = BASE_DIR / "storage" / "cache" / "hls"
+    HLS_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    HLS_MAX_TRANSCODES: int = 2
+    # A job pauses this far ahead of its viewer and stops once nobody asks for segments
+    HLS_MAX_SEGMENTS_AHEAD: int = 10
+    HLS_IDLE_TIMEOUT_SECONDS: float = 60.0
+    # Requests this far past a running job wait for it instead of starting a new one
+    HLS_SEEK_TOLERANCE_SEGMENTS: int = 3
+    HLS_SEGMENT_WAIT_SECONDS: float = 60.0
+
+    # Archive downloads (/api/v1/fs/archive) are generated while they are sent,
+    # reading files in chunks of this size.
+    ARCHIVE_CHUNK_SIZE: int = 256 * 1024
+    ARCHIVE_MAX_PATHS: int = 1000
+
+    # Server-side copy and move jobs (/api/v1/fs/copy, /api/v1/fs/move). Turn off
+    # TRANSFER_COPY_FILE_RANGE on kernels whose seccomp filter rejects the call;
+    # sendfile, then plain read/write are used instead.
+    TRANSFER_MAX_JOBS: int = 2
+    TRANSFER_CHUNK_SIZE: int = 8 * 1024 * 1024
+    TRANSFER_COPY_FILE_RANGE: bool = True
+    TRANSFER_JOB_RETENTION_SECONDS: float = 3600.0
+    TRANSFER_PROGRESS_INTERVAL_SECONDS: float = 0.5
+    # Background deletes pause this long after every batch of removed entries
+    DELETE_BATCH_SIZE: int = 500
+    DELETE_BATCH_PAUSE_SECONDS: float = 0.05
+
+    # Trash: deletes move items here (or to a hidden .trash folder when the item
+    # is on another filesystem) for restoring. Items are purged after the
+    # retention period, oldest first while a trash folder's volume has less than
+    # TRASH_MIN_FREE_BYTES free. Purging waits while files are being streamed,
+    # checking every TRASH_STREAM_WAIT_SECONDS, unless space is short.
+    TRASH_ENABLED: bool = True
+    TRASH_DIR: Path = BASE_DIR / "storage" / "trash"
+    TRASH_RETENTION_DAYS: float = 30.0
+    TRASH_MIN_FREE_BYTES: int = 1024 * 1024 * 1024
+    TRASH_PURGE_INTERVAL_SECONDS: float = 3600.0
+    TRASH_STREAM_WAIT_SECONDS: float = 1.0
+
+    # Batch operations (/api/v1/fs/batch): renames and moves to the trash run
+    # this many at a time
+    BATCH_MAX_OPERATIONS: int = 1000
+    BATCH_CONCURRENCY: int = 8
+
+    # Multi-file uploads are proxied to copyparty concurrently
+    UPLOAD_CONCURRENCY_PER_REQUEST: int = 4
+    UPLOAD_MAX_CONCURRENCY: int = 8
+
+    # Resumable uploads (/uploads): chunks are written straight to a hidden partial
+    # file in the target directory. Uploads untouched for the expiry are removed.
+    UPLOAD_MAX_SIZE: int = 64 * 1024 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024
+    UPLOAD_SESSION_EXPIRY_SECONDS: float = 86400.0
+    UPLOAD_CLEANUP_INTERVAL_SECONDS: float = 600.0
+    # Streaming uploads (PUT /upload/{path}) write the body to disk in blocks of
+    # this size and stop once the volume's free space drops below the reserve.
+    UPLOAD_WRITE_BUFFER_SIZE: int = 1024 * 1024
+    UPLOAD_MIN_FREE_BYTES: int = 256 * 1024 * 1024
+
+    # Background pre-generation of previews for uploaded files and requested
+    # folders. The worker keeps its share of wall-clock time at PREGENERATE_CPU_SHARE.
+    PREGENERATE_ENABLED: bool = True
+    PREGENERATE_CPU_SHARE: float = 0.25
+    PREGENERATE_MAX_ATTEMPTS: int = 3
+
     # Directory to serve files from
     CUSTOM_SERVE_DIR: Optional[str] = None
     SERVE_DIR: str = ""
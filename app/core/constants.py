@@ -1,6 +1,12 @@
 # File and directory names to be hidden and blocked
-FORBIDDEN_NAMES = {'.git', '.idea', 'venv', '__pycache__', 'node_modules'}
-FORBIDDEN_EXTENSIONS = {'.pyc', '.gitignore', '.env', '.iml'}
+# Items being deleted in the background are renamed into this folder first
+PENDING_DELETE_DIR = '.deleting'
+# Trash for items on a different filesystem than TRASH_DIR
+TRASH_DIR_NAME = '.trash'
+FORBIDDEN_NAMES = {'.git', '.idea', 'venv', '__pycache__', 'node_modules', PENDING_DELETE_DIR, TRASH_DIR_NAME}
+# Partial files of resumable uploads, hidden until they are complete
+PARTIAL_UPLOAD_SUFFIX = '.partial-upload'
+FORBIDDEN_EXTENSIONS = {'.pyc', '.gitignore', '.env', '.iml', PARTIAL_UPLOAD_SUFFIX}
 
 # Extensions that we want to show in the gallery preview
 IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.ico', '.bmp'}
@@ -11,3 +17,9 @@ TEXT_EXTENSIONS = {
 }
 
 PREVIEWABLE_EXTENSIONS = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS | TEXT_EXTENSIONS
+
+# Already compressed formats, stored as-is in ZIP archives
+COMPRESSED_EXTENSIONS = (IMAGE_EXTENSIONS - {'.svg', '.bmp', '.ico'}) | VIDEO_EXTENSIONS | {
+    '.mp3', '.m4a', '.aac', '.ogg', '.opus', '.flac', '.heic', '.avif',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.zst', '.apk', '.pdf'
+}
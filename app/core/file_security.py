@@ -7,11 +7,18 @@ from .config import settings
 
 logger = logging.getLogger(__name__)
 
+def is_name_forbidden(name: str, suffix: str) -> bool:
+    """
+    Checks if an entry is forbidden from its already split name and extension.
+    Used by the directory listing engine to avoid building a Path per entry.
+    """
+    return name in FORBIDDEN_NAMES or suffix.lower() in FORBIDDEN_EXTENSIONS
+
 def is_path_forbidden(path: Path) -> bool:
     """
     Checks if a given path is forbidden based on its name or extension.
     """
-    return path.name in FORBIDDEN_NAMES or path.suffix.lower() in FORBIDDEN_EXTENSIONS
+    return is_name_forbidden(path.name, path.suffix)
 
 def validate_and_resolve_path(
     requested_path: Path, 
@@ -0,0 +1,336 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import heapq
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from .config import settings
+from .file_security import is_name_forbidden
+
+logger = logging.getLogger(__name__)
+
+def _suffix(name: str) -> str:
+    """Returns the file extension the same way as `Path.suffix`."""
+    i = name.rfind(".")
+    if 0 < i < len(name) - 1:
+        return name[i:]
+    return ""
+
+class FSEntry:
+    """
+    A compact directory entry produced by `scan_directory`.
+    Mirrors the parts of the `Path` API used by templates (`name`, `suffix`,
+    `is_dir()`, `is_file()`) without touching the filesystem again.
+    """
+    __slots__ = ("name", "suffix", "_is_dir", "size", "mtime")
+
+    def __init__(self, name: str, is_dir: bool, size: int = 0, mtime: float = 0.0):
+        self.name = name
+        self.suffix = _suffix(name)
+        self._is_dir = is_dir
+        self.size = size
+        self.mtime = mtime
+
+    def is_dir(self) -> bool:
+        return self._is_dir
+
+    def is_file(self) -> bool:
+        return not self._is_dir
+
+    def __repr__(self) -> str:
+        return f"FSEntry({self.name!r}, is_dir={self._is_dir})"
+
+def sort_key(entry: FSEntry):
+    """Directories first, then case-insensitive name."""
+    return (not entry.is_dir(), entry.name.lower())
+
+def iter_directory(path: Path, with_stat: bool = False) -> Iterator[FSEntry]:
+    """
+    Yields the entries of a directory in on-disk order, one `os.scandir` pass.
+
+    Forbidden entries are dropped (same rule as `is_path_forbidden`). The entry
+    type comes from the cached `DirEntry` data, so no extra syscall is made per
+    entry unless `with_stat` is set, in which case size and mtime are filled in
+    from one `stat()` per entry. Nothing is buffered, so memory stays flat.
+
+    Raises:
+        PermissionError, FileNotFoundError, NotADirectoryError: From `os.scandir`.
+    """
+    with os.scandir(path) as it:
+        for dir_entry in it:
+            entry = FSEntry(dir_entry.name, False)
+            if is_name_forbidden(entry.name, entry.suffix):
+                continue
+
+            try:
+                entry._is_dir = dir_entry.is_dir()
+            except OSError:
+                pass
+
+            if with_stat:
+                try:
+                    st = dir_entry.stat()
+                    entry.size = st.st_size
+                    entry.mtime = st.st_mtime
+                except OSError as e:
+                    # Broken symlink or entry removed mid-scan
+                    logger.debug(f"Could not stat '{dir_entry.path}': {e}")
+            yield entry
+
+class ListingCache:
+    """
+    In-process cache of sorted directory listings keyed by resolved path.
+
+    An entry is reused only while the directory's (st_dev, st_ino, st_mtime_ns)
+    is unchanged and it is younger than the TTL; the TTL bounds how stale child
+    sizes/mtimes can get, since editing a file in place doesn't touch its parent.
+    The cache is bounded by the total number of entries across all directories
+    and evicts least recently used directories first. The app's own mutations
+    call `invalidate()` explicitly.
+    """
+    # Directories modified this recently are not cached: on coarse-timestamp
+    # filesystems (FAT/exFAT SD cards) a second change could keep the same mtime.
+    RACY_SECONDS = 2.0
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._dirs: OrderedDict[str, Tuple[tuple, float, bool, List[FSEntry]]] = OrderedDict()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _signature(st: os.stat_result) -> tuple:
+        return (st.st_dev, st.st_ino, st.st_mtime_ns)
+
+    def get(self, path: Path, with_stat: bool) -> Optional[List[FSEntry]]:
+        key = str(path)
+        try:
+            signature = self._signature(os.stat(key))
+        except OSError:
+            signature = None
+
+        with self._lock:
+            cached = self._dirs.get(key)
+            if cached is not None:
+                cached_signature, stored_at, has_stat, entries = cached
+                fresh = time.monotonic() - stored_at < self.ttl_seconds
+                if cached_signature == signature and fresh and (has_stat or not with_stat):
+                    self._dirs.move_to_end(key)
+                    self.hits += 1
+                    return entries
+                if cached_signature != signature or not fresh:
+                    self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, path: Path, with_stat: bool, entries: List[FSEntry]):
+        if len(entries) > self.max_entries:
+            return
+        key = str(path)
+        try:
+            st = os.stat(key)
+        except OSError:
+            return
+        if time.time() - st.st_mtime < self.RACY_SECONDS:
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._dirs[key] = (self._signature(st), time.monotonic(), with_stat, entries)
+            self._total += len(entries)
+            while self._total > self.max_entries and self._dirs:
+                oldest = next(iter(self._dirs))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        cached = self._dirs.pop(key, None)
+        if cached is not None:
+            self._total -= len(cached[3])
+
+    def invalidate(self, path: Path):
+        """Drops the listing of `path` and of every directory below it."""
+        key = str(path)
+        prefix = key.rstrip(os.sep) + os.sep
+        with self._lock:
+            for cached_key in [k for k in self._dirs if k == key or k.startswith(prefix)]:
+                self._remove(cached_key)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._dirs.clear()
+            self._total = 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directories": len(self._dirs),
+                "entries": self._total,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+# Initialize global instance
+listing_cache = ListingCache(
+    max_entries=settings.LISTING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.LISTING_CACHE_TTL_SECONDS
+)
+
+def scan_directory(path: Path, with_stat: bool = False) -> List[FSEntry]:
+    """
+    Lists a directory via `iter_directory`, sorted directories first, then by name.
+    Results are served from `listing_cache` while the directory is unchanged, so
+    callers must treat the returned list as read-only.
+
+    Raises:
+        PermissionError, FileNotFoundError, NotADirectoryError: From `os.scandir`.
+    """
+    cached = listing_cache.get(path, with_stat)
+    if cached is not None:
+        return cached
+
+    entries = list(iter_directory(path, with_stat=with_stat))
+    entries.sort(key=sort_key)
+    listing_cache.put(path, with_stat, entries)
+    return entries
+
+def directory_etag(path: Path, *variant: str) -> str:
+    """
+    Builds a weak ETag for a listing of `path` from the directory identity and
+    mtime plus anything else the response body depends on (pmask, query options).
+
+    Raises:
+        OSError: If the directory can't be stat'ed.
+    """
+    st = os.stat(path)
+    raw = "|".join([str(st.st_dev), str(st.st_ino), str(st.st_mtime_ns), *variant])
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:20]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+SORT_FIELDS = {
+    "name": lambda entry: entry.name.lower(),
+    "mtime": lambda entry: entry.mtime,
+    "size": lambda entry: entry.size,
+}
+SORT_ORDERS = ("asc", "desc")
+
+def _order_key(entry: FSEntry, sort: str) -> tuple:
+    """Full ordering key: directory flag, sort field, then name as a tiebreaker."""
+    return (not entry.is_dir(), SORT_FIELDS[sort](entry), entry.name.lower(), entry.name)
+
+def _is_after(key: tuple, cursor_key: tuple, descending: bool) -> bool:
+    """True if `key` comes after `cursor_key` in the listing order."""
+    if key[0] != cursor_key[0]:
+        # Directories always come first, regardless of order
+        return key[0] > cursor_key[0]
+    return key[1:] < cursor_key[1:] if descending else key[1:] > cursor_key[1:]
+
+class _PageKey:
+    """Orders entries as listed, for `heapq` (string keys can't be negated for descending order)."""
+    __slots__ = ("key", "descending")
+
+    def __init__(self, key: tuple, descending: bool):
+        self.key = key
+        self.descending = descending
+
+    def __lt__(self, other: "_PageKey") -> bool:
+        return _is_after(other.key, self.key, self.descending)
+
+def sort_entries(entries: List[FSEntry], sort: str = "name", order: str = "asc") -> List[FSEntry]:
+    """
+    Sorts entries directories first, then by `sort` in the given `order`.
+    Ties are broken by name, so the order is stable across requests.
+    """
+    descending = order == "desc"
+    dirs = [e for e in entries if e.is_dir()]
+    files = [e for e in entries if not e.is_dir()]
+    key = lambda entry: _order_key(entry, sort)[1:]
+    dirs.sort(key=key, reverse=descending)
+    files.sort(key=key, reverse=descending)
+    return dirs + files
+
+def encode_cursor(entry: FSEntry, sort: str, order: str) -> str:
+    """Builds an opaque cursor pointing just after `entry`."""
+    payload = {"s": sort, "o": order, "k": list(_order_key(entry, sort))}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, order: str) -> tuple:
+    """
+    Returns the ordering key stored in a cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed or was issued for another sort/order.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key = tuple(payload["k"])
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if payload.get("s") != sort or payload.get("o") != order or len(key) != 4:
+        raise ValueError("Cursor does not match the requested sort order")
+    return key
+
+def paginate(
+    entries: List[FSEntry],
+    sort: str = "name",
+    order: str = "asc",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Tuple[List[FSEntry], Optional[str]]:
+    """
+    Returns one page of sorted entries and the cursor for the next page (or None).
+    Cursors hold the last entry's sort key rather than an offset, so pages stay
+    consistent when entries are added or removed between requests. With a
+    `limit`, only the entries after the cursor are considered and just the page
+    is ordered (a bounded heap), instead of sorting the whole directory.
+
+    Raises:
+        ValueError: If the cursor is invalid.
+    """
+    descending = order == "desc"
+    if cursor:
+        cursor_key = decode_cursor(cursor, sort, order)
+        entries = [e for e in entries if _is_after(_order_key(e, sort), cursor_key, descending)]
+
+    if limit is None:
+        return sort_entries(entries, sort, order), None
+
+    # One entry past the page tells whether there is a next one
+    page = heapq.nsmallest(limit + 1, entries, key=lambda entry: _PageKey(_order_key(entry, sort), descending))
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1], sort, order)
+    return page, next_cursor
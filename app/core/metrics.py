@@ -18,6 +18,8 @@ class MetricsManager:
             "start_time": datetime.utcnow().isoformat(),
             "errors": 0
         }
+        # File bodies being sent right now (not persisted); background disk work yields to them
+        self.active_streams = 0
         self._load()
 
     def _load(self):
@@ -58,8 +60,16 @@ class MetricsManager:
             self.data["total_requests"] += 1
             self._save()
 
+    def stream_started(self):
+        with self.lock:
+            self.active_streams += 1
+
+    def stream_finished(self):
+        with self.lock:
+            self.active_streams -= 1
+
     def get_stats(self):
         with self.lock:
-            return self.data.copy()
+            return {**self.data, "active_streams": self.active_streams}
 
 metrics = MetricsManager(settings.BASE_DIR / "storage" / "db" / "metrics.json")
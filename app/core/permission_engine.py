@@ -0,0 +1,169 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Copyparty permission letters, in the order we report them
+PERMISSION_ORDER = "rwmdgGha."
+# 'A' is copyparty shorthand for all permissions
+PERMISSION_ALIASES = {"A": "rwmda."}
+
+class Volume:
+    """A single `-v src:dst:perms,users...` volume from copyparty.conf."""
+    def __init__(self, src: str, dst: str, user_perms: Dict[str, str]):
+        self.src = src
+        self.dst = dst
+        self.user_perms = user_perms
+
+    def perms_for(self, username: str) -> str:
+        perms = self.user_perms.get(username, "")
+        return _merge_perms(perms, self.user_perms.get("*", ""))
+
+def _merge_perms(*masks: str) -> str:
+    """Unions permission strings, keeping copyparty's letter order."""
+    letters = set()
+    for mask in masks:
+        for char in mask:
+            letters.update(PERMISSION_ALIASES.get(char, char))
+    ordered = [c for c in PERMISSION_ORDER if c in letters]
+    return "".join(ordered + sorted(letters - set(PERMISSION_ORDER)))
+
+def _normalize_dst(dst: str) -> str:
+    return dst.strip("/")
+
+class PermissionEngine:
+    """
+    Evaluates copyparty permission masks locally from copyparty.conf.
+
+    The file is parsed once and re-parsed whenever its mtime changes. Configurations
+    the engine cannot model (section-style configs, includes, groups) are reported
+    as unsupported so callers can fall back to copyparty's `?pmask` API.
+    """
+    def __init__(self, conf_path: Path):
+        self._conf_path = conf_path
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._volumes: List[Volume] = []
+        self._supported = False
+        self._loaded = False
+
+    def _read_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self._conf_path.stat()
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _parse(self) -> Tuple[List[Volume], bool]:
+        volumes = []
+        supported = True
+        with open(self._conf_path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+
+                if line.startswith("[") or line.startswith("%"):
+                    # Section-style config or include directive
+                    supported = False
+                    continue
+
+                if not line.startswith("-v "):
+                    continue
+
+                # Format: -v src:dst:perm1,u1,u2:perm2,u3
+                parts = line[3:].strip().split(":")
+                if len(parts) < 2:
+                    supported = False
+                    continue
+
+                user_perms: Dict[str, str] = {}
+                for group in parts[2:]:
+                    # Group format: perms,user1,user2...
+                    sub_parts = group.split(",")
+                    perms = sub_parts[0]
+                    users = sub_parts[1:]
+                    if perms == "c" or "=" in group:
+                        # Volume flags don't affect permissions
+                        continue
+                    if not users:
+                        # Bare perms apply to everyone
+                        users = ["*"]
+                    for user in users:
+                        if user.startswith("@"):
+                            supported = False
+                        user_perms[user] = _merge_perms(user_perms.get(user, ""), perms)
+
+                volumes.append(Volume(parts[0], _normalize_dst(parts[1]), user_perms))
+
+        if not volumes:
+            supported = False
+        return volumes, supported
+
+    def _ensure_loaded(self):
+        signature = self._read_signature()
+        with self._lock:
+            if self._loaded and signature == self._signature:
+                return
+            self._signature = signature
+            self._loaded = True
+            if signature is None:
+                logger.warning(f"Copyparty config not found at {self._conf_path}")
+                self._volumes, self._supported = [], False
+                return
+            try:
+                self._volumes, self._supported = self._parse()
+                logger.info(
+                    f"Loaded {len(self._volumes)} volume(s) from {self._conf_path} "
+                    f"(local permission evaluation {'enabled' if self._supported else 'disabled'})"
+                )
+            except Exception as e:
+                logger.error(f"Error parsing copyparty.conf: {e}")
+                self._volumes, self._supported = [], False
+
+    def _volume_for(self, relative_path: Path) -> Optional[Volume]:
+        """Returns the most specific volume containing the path."""
+        target = Path(relative_path).as_posix().strip("/")
+        if target == ".":
+            target = ""
+        best = None
+        for volume in self._volumes:
+            if volume.dst == "" or target == volume.dst or target.startswith(volume.dst + "/"):
+                if best is None or len(volume.dst) > len(best.dst):
+                    best = volume
+        return best
+
+    def get_pmask(self, username: str, relative_path: Path) -> Optional[str]:
+        """
+        Returns the user's permission mask for a directory, or None if the
+        configuration can't be evaluated locally.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if not self._supported:
+                return None
+            volume = self._volume_for(relative_path)
+            if volume is None:
+                return ""
+            return volume.perms_for(username)
+
+    def get_root_permissions(self, username: str) -> str:
+        """Returns the user's permission mask on the root volume, or '' if none."""
+        self._ensure_loaded()
+        with self._lock:
+            for volume in self._volumes:
+                if volume.dst == "":
+                    return volume.perms_for(username)
+        return ""
+
+    def invalidate(self):
+        """Forces the config to be re-parsed on next use."""
+        with self._lock:
+            self._loaded = False
+
+# Initialize global instance
+permission_engine = PermissionEngine(settings.BASE_DIR / "copyparty" / "copyparty.conf")
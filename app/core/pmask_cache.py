@@ -0,0 +1,107 @@
+import logging
+import time
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class PmaskCache:
+    """
+    Bounded LRU cache of copyparty permission masks keyed by (username, directory).
+    Entries expire after a TTL and the whole cache is dropped when copyparty.conf changes.
+    """
+    def __init__(self, conf_path: Path, ttl_seconds: float, max_entries: int):
+        self._entries: OrderedDict[Tuple[str, str], Tuple[str, float]] = OrderedDict()
+        self._conf_path = conf_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conf_mtime = self._read_conf_mtime()
+        self._conf_checked_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(username: str, directory: Path) -> Tuple[str, str]:
+        posix = Path(directory).as_posix().strip("/")
+        return (username, "" if posix == "." else posix)
+
+    def _read_conf_mtime(self) -> Optional[int]:
+        try:
+            return self._conf_path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_conf(self):
+        """Drops all entries if copyparty.conf was rewritten (e.g. by the manage.py CLI)."""
+        now = time.monotonic()
+        if now - self._conf_checked_at < 1.0:
+            return
+        self._conf_checked_at = now
+        mtime = self._read_conf_mtime()
+        if mtime != self._conf_mtime:
+            self._conf_mtime = mtime
+            if self._entries:
+                logger.info("copyparty.conf changed, clearing pmask cache.")
+                self._entries.clear()
+                self.invalidations += 1
+
+    def get(self, username: str, directory: Path) -> Optional[str]:
+        key = self._key(username, directory)
+        with self._lock:
+            self._check_conf()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            pmask, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return pmask
+
+    def set(self, username: str, directory: Path, pmask: str):
+        key = self._key(username, directory)
+        with self._lock:
+            self._entries[key] = (pmask, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: Optional[str] = None):
+        """Clears cached masks for one user, or for everyone if no user is given."""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+                self._conf_mtime = self._read_conf_mtime()
+            else:
+                for key in [k for k in self._entries if k[0] == username]:
+                    del self._entries[key]
+            self.invalidations += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+# Initialize global instance
+pmask_cache = PmaskCache(
+    conf_path=settings.BASE_DIR / "copyparty" / "copyparty.conf",
+    ttl_seconds=settings.PMASK_CACHE_TTL_SECONDS,
+    max_entries=settings.PMASK_CACHE_MAX_ENTRIES
+)
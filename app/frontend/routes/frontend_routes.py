@@ -5,10 +5,23 @@ from fastapi.templating import Jinja2Templates
 from pathlib import Path
 
 from app.core.config import settings
-from app.core.file_security import validate_and_resolve_path, is_path_forbidden
+from app.core.file_security import validate_and_resolve_path
+from app.core.listing import scan_directory, listing_cache
 from app.core.metrics import metrics
+from app.core.pmask_cache import pmask_cache
 from app.core.templates import templates
 from app.backend.services.copyparty_service import get_pmask
+from app.backend.services.index_service import file_index
+from app.backend.services.change_detector import change_detector
+from app.backend.services.search_engine import search_engine
+from app.backend.services.search_sessions import search_sessions
+from app.backend.services.thumbnail_service import thumbnail_cache
+from app.backend.services.pregeneration_queue import pregeneration_queue
+from app.backend.services.video_preview_service import video_previews
+from app.backend.services.hls_service import hls_transcoder
+from app.backend.services.upload_service import resumable_uploads
+from app.backend.services.transfer_service import transfers
+from app.backend.services.trash_service import trash
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -16,7 +29,21 @@ logger = logging.getLogger(__name__)
 @router.get("/api/v1/stats")
 async def get_server_stats():
     """Returns real-time server metrics."""
-    return metrics.get_stats()
+    stats = metrics.get_stats()
+    stats["pmask_cache"] = pmask_cache.get_stats()
+    stats["listing_cache"] = listing_cache.get_stats()
+    stats["file_index"] = file_index.get_stats()
+    stats["change_detector"] = change_detector.get_stats()
+    stats["search_engine"] = search_engine.get_stats()
+    stats["search_sessions"] = search_sessions.get_stats()
+    stats["thumbnails"] = thumbnail_cache.get_stats()
+    stats["pregeneration_queue"] = pregeneration_queue.get_stats()
+    stats["video_previews"] = video_previews.get_stats()
+    stats["hls"] = hls_transcoder.get_stats()
+    stats["resumable_uploads"] = resumable_uploads.get_stats()
+    stats["transfers"] = transfers.get_stats()
+    stats["trash"] = trash.get_stats()
+    return stats
 
 @router.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
@@ -66,12 +93,11 @@ async def read_path(request: Request, full_path: str):
         if resolved_path.is_dir():
             logger.debug("Path is a directory, preparing to list contents.")
             try:
-                contents = sorted(resolved_path.iterdir(), key=lambda f: (not f.is_dir(), f.name.lower()))
+                filtered_contents = scan_directory(resolved_path)
             except PermissionError:
                 logger.warning(f"Permission denied for directory: {resolved_path}")
                 raise HTTPException(status_code=403, detail="Permission denied")
 
-            filtered_contents = [item for item in contents if not is_path_forbidden(item)]
             logger.debug(f"Found {len(filtered_contents)} items to display.")
 
             # Determine which template to render based on the request headers
@@ -83,7 +109,7 @@ async def read_path(request: Request, full_path: str):
                 "request": request,
                 "path": full_path,
                 "contents": filtered_contents,
-                "pmask": get_pmask(request, full_path if isinstance(full_path, Path) else Path(full_path))
+                "pmask": await get_pmask(request, full_path if isinstance(full_path, Path) else Path(full_path))
             }
             return templates.TemplateResponse(template_name, context)
 
@@ -7,9 +7,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from .core.config import settings
 from .core.logger import setup_logging
 from .core.session_manager import session_manager
+from .core.listing import listing_cache
 from .core.utils import get_lan_ip
 from .core.user_sync import sync_users_to_copyparty
-from app.backend.routes import download_routes, upload_routes, api_routes, auth_routes
+from app.backend.routes import download_routes, stream_routes, upload_routes, api_routes, auth_routes
+from app.backend.services import copyparty_service
+from app.backend.services.index_service import file_index
+from app.backend.services.change_detector import change_detector
+from app.backend.services.pregeneration_queue import pregeneration_queue
+from app.backend.services.thumbnail_service import can_thumbnail_locally, pregenerate_thumbnails
+from app.backend.services.video_preview_service import video_previews, can_preview_video, pregenerate_video_previews
+from app.backend.services.hls_service import hls_transcoder
+from app.backend.services.upload_service import resumable_uploads
+from app.backend.services.transfer_service import transfers
+from app.backend.services.trash_service import trash
 from app.frontend.routes import frontend_routes
 
 app = FastAPI(title="Media Vault")
@@ -78,6 +89,18 @@ async def session_middleware(request: Request, call_next):
     
     return response
 
+# Keep the file index and listing cache in step with changes made outside the app
+change_detector.subscribe(file_index.schedule_rescan)
+change_detector.subscribe(lambda rel: listing_cache.invalidate(settings.SERVE_PATH / rel))
+# Directories changed by copy and move jobs
+transfers.subscribe(listing_cache.invalidate)
+transfers.subscribe(file_index.schedule_rescan)
+# Directories items were moved to the trash from or restored to
+trash.subscribe(listing_cache.invalidate)
+trash.subscribe(file_index.schedule_rescan)
+pregeneration_queue.register("thumbnail", can_thumbnail_locally, pregenerate_thumbnails)
+pregeneration_queue.register("video_preview", can_preview_video, pregenerate_video_previews)
+
 @app.on_event("startup")
 async def startup_event():
     """
@@ -90,6 +113,14 @@ async def startup_event():
     
     logging.info(f"FastAPI Worker starting...")
     logging.info(f"Serving files from: {settings.SERVE_DIR}")
+    await copyparty_service.start_http_client()
+    file_index.start()
+    change_detector.start()
+    pregeneration_queue.start()
+    hls_transcoder.start()
+    resumable_uploads.start()
+    transfers.start()
+    trash.start()
     
     if host_ip.startswith("127."):
         logging.warning("Note: Network Access IP is loopback. Ensure your device is connected to a network.")
@@ -100,9 +131,20 @@ async def shutdown_event():
     Actions to perform on application shutdown.
     """
     logging.info("FastAPI Worker shutting down...")
+    await trash.stop()
+    await transfers.stop()
+    await resumable_uploads.stop()
+    await hls_transcoder.stop()
+    await pregeneration_queue.stop()
+    video_previews.shutdown()
+    await change_detector.stop()
+    await file_index.stop()
+    await copyparty_service.close_http_client()
 
 # Include the router for handling file downloads
 app.include_router(download_routes.router)
+# Include the router for HLS streaming
+app.include_router(stream_routes.router)
 # Include the router for handling file uploads
 app.include_router(upload_routes.router)
 # Include the API router
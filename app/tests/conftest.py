@@ -0,0 +1,14 @@
+import pytest
+from app.main import app
+from app.core.auth import auth_required
+
+@pytest.fixture
+def authenticated():
+    """Lets requests past `auth_required`, restoring any override set before."""
+    previous_override = app.dependency_overrides.get(auth_required)
+    app.dependency_overrides[auth_required] = lambda: True
+    yield
+    if previous_override is None:
+        app.dependency_overrides.pop(auth_required, None)
+    else:
+        app.dependency_overrides[auth_required] = previous_override
@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 from app.main import app
 from app.core.auth import auth_required
@@ -61,11 +61,25 @@ def test_delete_file_success(mock_resolve, mock_get_pmask, mock_authenticated_se
     mock_resolve.return_value = mock_file
     mock_get_pmask.return_value = "rwd"
     
-    with TestClient(app) as client:
+    with TestClient(app) as client, \
+         patch("app.backend.routes.api_routes.trash") as mock_trash, \
+         patch("app.backend.routes.api_routes.transfers") as mock_transfers:
+        mock_trash.trash.return_value = {"id": "item1"}
+        mock_transfers.delete = AsyncMock(return_value=MagicMock(id="job1"))
         client.cookies.set("session_id", "test_id")
         response = client.delete("/api/v1/fs/test.txt")
         assert response.status_code == 204
-        mock_file.unlink.assert_called_once()
+        # Moved to the trash, not removed
+        mock_trash.trash.assert_called_once_with(mock_file, "")
+        assert response.headers["X-Trash-Id"] == "item1"
+        mock_transfers.delete.assert_not_called()
+
+        response = client.delete("/api/v1/fs/test.txt?permanent=true")
+        assert response.status_code == 204
+        # Removed by a background job, not inline
+        mock_transfers.delete.assert_awaited_once_with([mock_file], "")
+        assert response.headers["X-Job-Id"] == "job1"
+        mock_file.unlink.assert_not_called()
 
 @patch("app.backend.routes.api_routes.get_pmask")
 @patch("app.backend.routes.api_routes.validate_and_resolve_path")
@@ -90,7 +104,8 @@ def test_mkdir_success(mock_resolve, mock_get_pmask, mock_authenticated_session)
     mock_resolve.return_value = mock_dir
     mock_get_pmask.return_value = "rw"
     
-    with TestClient(app) as client:
+    with TestClient(app) as client, \
+         patch("app.backend.routes.api_routes.scan_directory", return_value=[]):
         client.cookies.set("session_id", "test_id")
         response = client.post("/api/v1/fs/mkdir/new_folder")
         assert response.status_code == 200 # Returns refreshed partial
@@ -0,0 +1,71 @@
+import io
+import os
+import tarfile
+import zipfile
+import pytest
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.config import settings
+from app.backend.services.archive_service import iter_archive, archive_roots
+
+PHOTO = os.urandom(5000)
+NOTES = b"notes " * 1000
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    root = tmp_path / "files"
+    (root / "album" / "empty").mkdir(parents=True)
+    (root / "album" / "photo.jpg").write_bytes(PHOTO)
+    (root / "album" / "notes.txt").write_bytes(NOTES)
+    (root / "album" / "cache.pyc").write_bytes(b"x")
+    (root / "other").mkdir()
+    (root / "other" / "notes.txt").write_bytes(b"other")
+    os.symlink(tmp_path, root / "album" / "escape")
+    monkeypatch.setattr(settings, "SERVE_DIR", str(root))
+    monkeypatch.setattr(settings, "ARCHIVE_CHUNK_SIZE", 1024)
+    return root
+
+def test_archive_roots(root):
+    names = [name for _, name in archive_roots([root / "album" / "notes.txt", root / "other" / "notes.txt", root / "album"])]
+    assert names == ["notes.txt", "notes (2).txt", "album"]
+
+def test_zip_is_streamed(root):
+    chunks = list(iter_archive([root / "album", root / "other" / "notes.txt"], "zip"))
+    assert len(chunks) > 5
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.namelist() == ["album/", "album/empty/", "album/notes.txt", "album/photo.jpg", "notes.txt"]
+    assert archive.read("album/photo.jpg") == PHOTO
+    assert archive.read("notes.txt") == b"other"
+    # Media is stored, text deflated
+    assert archive.getinfo("album/photo.jpg").compress_type == zipfile.ZIP_STORED
+    assert archive.getinfo("album/notes.txt").compress_type == zipfile.ZIP_DEFLATED
+    assert archive.testzip() is None
+
+def test_tar_is_streamed(root):
+    data = b"".join(iter_archive([root / "album"], "tar"))
+    assert len(data) % tarfile.BLOCKSIZE == 0
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert archive.getnames() == ["album", "album/empty", "album/notes.txt", "album/photo.jpg"]
+        assert archive.getmember("album/empty").isdir()
+        assert archive.extractfile("album/photo.jpg").read() == PHOTO
+
+def test_archive_route(root, authenticated):
+    pmask = AsyncMock(return_value="r")
+    with patch("app.backend.routes.api_routes.get_pmask", new=pmask):
+        client = TestClient(app)
+        response = client.post("/api/v1/fs/archive", json={"paths": ["album/photo.jpg", "album/notes.txt"]})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/zip"
+        assert 'filename="download.zip"' in response.headers["content-disposition"]
+        assert zipfile.ZipFile(io.BytesIO(response.content)).namelist() == ["photo.jpg", "notes.txt"]
+        # Both files live in the same directory
+        assert pmask.await_count == 1
+
+        response = client.post("/api/v1/fs/archive", json={"paths": ["album"], "format": "tar"})
+        assert 'filename="album.tar"' in response.headers["content-disposition"]
+        assert client.post("/api/v1/fs/archive", json={"paths": ["album"], "format": "rar"}).status_code == 400
+        assert client.post("/api/v1/fs/archive", json={"paths": ["missing"]}).status_code == 404
+
+        pmask.return_value = ""
+        assert client.post("/api/v1/fs/archive", json={"paths": ["album"]}).status_code == 403
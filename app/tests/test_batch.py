@@ -0,0 +1,103 @@
+import os
+import asyncio
+import pytest
+import httpx
+from unittest.mock import patch, AsyncMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.main import app
+from app.core.config import settings
+from app.backend.database.models import Base
+from app.backend.services.transfer_service import TransferManager
+from app.backend.services.trash_service import TrashStore
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    root = tmp_path / "files"
+    (root / "docs").mkdir(parents=True)
+    (root / "backup").mkdir()
+    (root / "locked").mkdir()
+    for name in ("a.txt", "b.txt", "old.log", "docs/x.txt", "docs/y.txt", "locked/z.txt"):
+        (root / name).write_text(name)
+    monkeypatch.setattr(settings, "SERVE_DIR", str(root))
+    return root
+
+@pytest.fixture
+def services(root, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'trash.db'}")
+    Base.metadata.create_all(engine)
+    return TransferManager(root), TrashStore(root, tmp_path / "trash", sessionmaker(bind=engine))
+
+@pytest.fixture
+def client_patches(root, services, authenticated):
+    transfers, trash = services
+
+    async def rename_item(request, relative_path, new_name):
+        # Stands in for copyparty's move API
+        os.rename(root / relative_path, root / relative_path.parent / new_name)
+
+    async def get_pmask(request, relative_path):
+        return "r" if relative_path.as_posix() == "locked" else "rwmd"
+
+    pmask = AsyncMock(side_effect=get_pmask)
+    with patch("app.backend.routes.api_routes.transfers", transfers), \
+         patch("app.backend.routes.api_routes.trash", trash), \
+         patch("app.backend.routes.api_routes.rename_item", new=AsyncMock(side_effect=rename_item)), \
+         patch("app.backend.routes.api_routes.get_pmask", new=pmask):
+        yield pmask
+
+@pytest.mark.anyio
+async def test_batch_runs_each_operation(root, services, client_patches):
+    transfers, trash = services
+    operations = [
+        {"op": "delete", "path": "a.txt"},
+        {"op": "rename", "path": "b.txt", "new_name": "c.txt"},
+        {"op": "move", "path": "docs/x.txt", "destination": "backup"},
+        {"op": "move", "path": "docs/y.txt", "destination": "backup"},
+        {"op": "delete", "path": "old.log", "permanent": True},
+    ]
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/api/v1/fs/batch", json={"operations": operations})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["done"], body["started"], body["failed"]) == (2, 3, 0)
+    results = body["results"]
+    assert [r["path"] for r in results] == [op["path"] for op in operations]
+    assert [i["id"] for i in trash.list_items("")] == [results[0]["trash_id"]]
+    # Both moves to the same folder share one job
+    assert results[2]["job_id"] == results[3]["job_id"]
+    await asyncio.gather(*transfers._tasks.values())
+
+    assert not (root / "a.txt").exists() and not (root / "old.log").exists()
+    assert (root / "c.txt").read_text() == "b.txt"
+    assert sorted(p.name for p in (root / "backup").iterdir()) == ["x.txt", "y.txt"]
+    # root for the top-level items, docs and backup
+    assert client_patches.await_count == 3
+
+@pytest.mark.anyio
+async def test_batch_reports_failures_per_item(root, services, client_patches):
+    operations = [
+        {"op": "delete", "path": "locked/z.txt"},
+        {"op": "rename", "path": "a.txt", "new_name": "../escape.txt"},
+        {"op": "rename", "path": "a.txt", "new_name": "b.txt"},
+        {"op": "delete", "path": "missing.txt"},
+        {"op": "delete", "path": "docs/x.txt"},
+        {"op": "delete", "path": "docs"},
+        {"op": "move", "path": "docs", "destination": "docs"},
+        {"op": "copy", "path": "a.txt"},
+        {"op": "delete", "path": "a.txt"},
+    ]
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/api/v1/fs/batch", json={"operations": operations})
+        results = response.json()["results"]
+        assert [r["status"] for r in results] == ["failed"] * 4 + ["done"] + ["failed"] * 3 + ["done"]
+        assert results[0]["reason"] == "Permission denied"
+        assert results[1]["reason"] == "Invalid new name"
+        assert "already exists" in results[2]["reason"]
+        assert results[3]["reason"].startswith("Path not found")
+        assert results[5]["reason"] == "Overlaps an earlier operation in this batch"
+        assert "into itself" in results[6]["reason"]
+        assert (root / "locked" / "z.txt").exists() and (root / "docs").exists()
+
+        too_many = [{"op": "delete", "path": "a.txt"}] * (settings.BATCH_MAX_OPERATIONS + 1)
+        assert (await client.post("/api/v1/fs/batch", json={"operations": too_many})).status_code == 400
@@ -0,0 +1,92 @@
+import os
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.backend.database.base import Base
+from app.backend.services.change_detector import ChangeDetector
+
+def _backdate(path, seconds=60):
+    """Moves a directory's mtime out of the racy window."""
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "files"
+    (root / "a" / "deep").mkdir(parents=True)
+    (root / "b").mkdir()
+    for d in [root / "a" / "deep", root / "a", root / "b", root]:
+        _backdate(d)
+    return root
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'watermarks.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+@pytest.fixture
+def detector(tree, session_factory):
+    return ChangeDetector(tree, session_factory)
+
+def test_first_pass_records_without_reporting(detector):
+    seen = []
+    detector.subscribe(seen.append)
+    assert detector.scan_pass() == []
+    assert seen == []
+    assert set(detector._watermarks) == {"", "a", "a/deep", "b"}
+
+def test_only_changed_directories_are_reported(detector, tree):
+    detector.scan_pass()
+    (tree / "a" / "deep" / "new.txt").write_text("x")
+    _backdate(tree / "a" / "deep", 30)
+
+    seen = []
+    detector.subscribe(seen.append)
+    assert detector.scan_pass() == ["a/deep"]
+    assert seen == ["a/deep"]
+    # Nothing changed since
+    assert detector.scan_pass() == []
+
+def test_removed_directories_are_forgotten(detector, tree):
+    detector.scan_pass()
+    (tree / "a" / "deep").rmdir()
+    _backdate(tree / "a", 30)
+
+    assert detector.scan_pass() == ["a"]
+    assert "a/deep" not in detector._watermarks
+
+def test_new_directories_are_tracked(detector, tree):
+    detector.scan_pass()
+    (tree / "b" / "c").mkdir()
+    _backdate(tree / "b" / "c")
+    _backdate(tree / "b", 30)
+
+    # The parent is reported; the new child is recorded silently
+    assert detector.scan_pass() == ["b"]
+    assert "b/c" in detector._watermarks
+
+def test_recent_changes_are_rechecked(detector, tree):
+    detector.scan_pass()
+    (tree / "b" / "x.txt").write_text("x")
+    assert detector.scan_pass() == ["b"]
+    # Still inside the racy window, so it is looked at again
+    assert detector.scan_pass() == ["b"]
+
+def test_watermarks_survive_restart(detector, tree, session_factory):
+    detector.scan_pass()
+    (tree / "b" / "x.txt").write_text("x")
+    _backdate(tree / "b", 30)
+
+    restarted = ChangeDetector(tree, session_factory)
+    assert restarted.scan_pass() == ["b"]
+
+def test_stats(detector):
+    assert detector.get_stats()["lag_seconds"] is None
+    detector.scan_pass()
+    stats = detector.get_stats()
+    assert stats["directories"] == 4
+    assert stats["passes"] == 1
+    assert stats["mode"] == "polling"
+    assert stats["lag_seconds"] >= 0
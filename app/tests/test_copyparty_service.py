@@ -1,55 +1,116 @@
 import pytest
-from unittest.mock import patch, mock_open, MagicMock
+from unittest.mock import patch, mock_open, MagicMock, AsyncMock
 from fastapi import Request
 from app.backend.services.copyparty_service import get_user_permissions_from_config, get_pmask
+from app.core.permission_engine import PermissionEngine
 from pathlib import Path
 
-def test_get_user_permissions_from_config_success():
-    mock_conf = """# Generated by manage.py
+@pytest.fixture
+def conf_file(tmp_path):
+    """Points the permission engine at a temporary copyparty.conf."""
+    conf = tmp_path / "copyparty.conf"
+    with patch("app.backend.services.copyparty_service.permission_engine", PermissionEngine(conf)):
+        yield conf
+
+def test_get_user_permissions_from_config_success(conf_file):
+    conf_file.write_text("""# Generated by manage.py
 --ah-alg sha2,424242
 -a admin:pass
 -a testuser:hash
 -v /some/path:/:rwmda.,admin:r,testuser:rw,rwuser
-"""
-    with patch("builtins.open", mock_open(read_data=mock_conf)):
-        assert get_user_permissions_from_config("admin") == "rwmda."
-        assert get_user_permissions_from_config("testuser") == "r"
-        assert get_user_permissions_from_config("rwuser") == "rw"
-
-def test_get_user_permissions_from_config_grouped_users():
-    mock_conf = "-v /some/path:/:r,user1,user2:rw,user3,user4\n"
-    with patch("builtins.open", mock_open(read_data=mock_conf)):
-        assert get_user_permissions_from_config("user1") == "r"
-        assert get_user_permissions_from_config("user2") == "r"
-        assert get_user_permissions_from_config("user3") == "rw"
-        assert get_user_permissions_from_config("user4") == "rw"
-
-def test_get_user_permissions_from_config_not_found():
-    mock_conf = "-v /some/path:/:r,testuser\n"
-    with patch("builtins.open", mock_open(read_data=mock_conf)):
-        assert get_user_permissions_from_config("nonexistent") == ""
-
-def test_get_user_permissions_from_config_file_missing():
-    with patch("builtins.open", side_effect=FileNotFoundError):
-        assert get_user_permissions_from_config("admin") == ""
-
-def test_get_pmask_fallback_to_session():
+""")
+    assert get_user_permissions_from_config("admin") == "rwmda."
+    assert get_user_permissions_from_config("testuser") == "r"
+    assert get_user_permissions_from_config("rwuser") == "rw"
+
+def test_get_user_permissions_from_config_grouped_users(conf_file):
+    conf_file.write_text("-v /some/path:/:r,user1,user2:rw,user3,user4\n")
+    assert get_user_permissions_from_config("user1") == "r"
+    assert get_user_permissions_from_config("user2") == "r"
+    assert get_user_permissions_from_config("user3") == "rw"
+    assert get_user_permissions_from_config("user4") == "rw"
+
+def test_get_user_permissions_from_config_not_found(conf_file):
+    conf_file.write_text("-v /some/path:/:r,testuser\n")
+    assert get_user_permissions_from_config("nonexistent") == ""
+
+def test_get_user_permissions_from_config_file_missing(conf_file):
+    assert get_user_permissions_from_config("admin") == ""
+
+def test_get_user_permissions_from_config_reloads_on_change(conf_file):
+    conf_file.write_text("-v /some/path:/:r,testuser\n")
+    assert get_user_permissions_from_config("testuser") == "r"
+    
+    conf_file.write_text("-v /some/path:/:rwm,testuser\n")
+    assert get_user_permissions_from_config("testuser") == "rwm"
+
+def _mock_client(**kwargs):
+    client = MagicMock()
+    client.get = AsyncMock(**kwargs)
+    return client
+
+@pytest.mark.anyio
+async def test_get_pmask_fallback_to_session(conf_file):
     # Mock Request and Session
     request = MagicMock(spec=Request)
     session = MagicMock()
     session.permissions = "rwm"
     request.state.session = session
     
-    # Mock requests.get to fail
-    with patch("requests.get", side_effect=Exception("Backend down")):
-        assert get_pmask(request, Path("some/dir")) == "rwm"
+    # Mock the backend client to fail
+    client = _mock_client(side_effect=Exception("Backend down"))
+    with patch("app.backend.services.copyparty_service.get_http_client", return_value=client):
+        assert await get_pmask(request, Path("some/dir")) == "rwm"
 
-def test_get_pmask_no_session_fallback():
+@pytest.mark.anyio
+async def test_get_pmask_no_session_fallback():
     # Mock Request with no session
     request = MagicMock(spec=Request)
     request.state.session = None
     
-    # Mock requests.get to fail
-    with patch("requests.get", side_effect=Exception("Backend down")):
-        assert get_pmask(request, Path("some/dir")) == "r"
+    # Mock the backend client to fail
+    client = _mock_client(side_effect=Exception("Backend down"))
+    with patch("app.backend.services.copyparty_service.get_http_client", return_value=client):
+        assert await get_pmask(request, Path("some/dir")) == "r"
+
+@pytest.mark.anyio
+async def test_get_pmask_uses_shared_client(conf_file):
+    request = MagicMock(spec=Request)
+    request.state.session = None
+    
+    response = MagicMock()
+    response.status_code = 200
+    response.text = "rw\n"
+    client = _mock_client(return_value=response)
+    with patch("app.backend.services.copyparty_service.get_http_client", return_value=client), \
+         patch("app.backend.services.copyparty_service.get_proxy_headers", return_value={}):
+        assert await get_pmask(request, Path("some/dir")) == "rw"
+        
+    args, kwargs = client.get.call_args
+    assert args[0].endswith("/some/dir?pmask")
+    assert "timeout" in kwargs
+
+@pytest.mark.anyio
+async def test_http_client_lifecycle():
+    from app.backend.services import copyparty_service
+    
+    await copyparty_service.start_http_client()
+    client = copyparty_service.get_http_client()
+    assert not client.is_closed
+    
+    await copyparty_service.close_http_client()
+    assert client.is_closed
 
+
+@pytest.mark.anyio
+async def test_get_pmask_evaluated_locally(conf_file):
+    conf_file.write_text("-v /srv:/:rw,testuser\n")
+    request = MagicMock(spec=Request)
+    session = MagicMock()
+    session.username = "testuser"
+    request.state.session = session
+    
+    client = _mock_client(side_effect=AssertionError("backend must not be queried"))
+    with patch("app.backend.services.copyparty_service.get_http_client", return_value=client):
+        assert await get_pmask(request, Path("some/dir")) == "rw"
+    assert not client.get.called
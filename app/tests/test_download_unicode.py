@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, AsyncMock, patch
 from pathlib import Path
 from fastapi import Request
 from app.backend.services.copyparty_service import proxy_stream_request
@@ -15,7 +15,7 @@ async def test_proxy_stream_request_unicode_filename_crash():
     unicode_filename = "Boys பொളിയா.mp4"
     relative_path = Path(unicode_filename)
     
-    # Mock requests.get response
+    # Mock the streamed backend response
     mock_response = MagicMock()
     mock_response.status_code = 206
     mock_response.headers = {
@@ -23,9 +23,11 @@ async def test_proxy_stream_request_unicode_filename_crash():
         'Content-Length': '100',
         'Accept-Ranges': 'bytes'
     }
-    mock_response.iter_content.return_value = [b"data"]
+    mock_response.aclose = AsyncMock()
+    mock_client = MagicMock()
+    mock_client.send = AsyncMock(return_value=mock_response)
     
-    with patch("app.backend.services.copyparty_service.requests.get", return_value=mock_response), \
+    with patch("app.backend.services.copyparty_service.get_http_client", return_value=mock_client), \
          patch("app.backend.services.copyparty_service.get_proxy_headers", return_value={}), \
          patch("app.backend.services.copyparty_service._get_proxy_url", return_value="http://127.0.0.1:8090/file"):
         
@@ -0,0 +1,145 @@
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from pathlib import Path
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from fastapi.testclient import TestClient
+from app.main import app
+from app.backend.database.base import Base
+from app.backend.services.index_service import FileIndex, media_type_for
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "files"
+    (root / "photos" / "2023").mkdir(parents=True)
+    (root / "docs").mkdir()
+    (root / "photos" / "beach.jpg").write_bytes(b"x" * 10)
+    (root / "photos" / "2023" / "Beach_Party.mp4").write_bytes(b"x" * 20)
+    (root / "docs" / "notes.txt").write_text("hello")
+    (root / "__pycache__").mkdir()
+    return root
+
+@pytest.fixture
+def index(tree, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'index.db'}")
+    Base.metadata.create_all(engine)
+    return FileIndex(tree, sessionmaker(bind=engine))
+
+def _names(entries):
+    return [e.name for e in entries]
+
+def test_not_ready_until_scanned(index):
+    assert index.list_directory("") is None
+    assert index.search("beach") is None
+    index.load_state()
+    assert not index.ready
+
+def test_full_scan_lists_directories(index):
+    assert index.full_scan() == 6
+    assert _names(index.list_directory("")) == ["docs", "photos"]
+    photos = index.list_directory("photos")
+    assert _names(photos) == ["2023", "beach.jpg"]
+    assert photos[1].size == 10 and photos[1].is_file()
+    # Unknown directories fall back to the filesystem
+    assert index.list_directory("missing") is None
+
+def test_full_scan_removes_stale_rows(index, tree):
+    index.full_scan()
+    (tree / "docs" / "notes.txt").unlink()
+    index.full_scan()
+    assert index.list_directory("docs") == []
+
+def test_search(index):
+    index.full_scan()
+    hits = index.search("BEACH")
+    assert [h["p"] for h in hits] == ["photos/2023/Beach_Party.mp4", "photos/beach.jpg"]
+    assert index.search("2023")[0]["p"] == "photos/2023/"
+    assert [h["p"] for h in index.search("beach", rel="photos/2023")] == ["photos/2023/Beach_Party.mp4"]
+    # LIKE wildcards are matched literally
+    assert index.search("%") == []
+
+def test_rescan_directory(index, tree):
+    index.full_scan()
+    (tree / "photos" / "beach.jpg").write_bytes(b"x" * 99)
+    (tree / "photos" / "new").mkdir()
+    (tree / "photos" / "new" / "deep.png").write_bytes(b"")
+    (tree / "photos" / "2023" / "Beach_Party.mp4").unlink()
+    (tree / "photos" / "2023").rmdir()
+
+    index.schedule_rescan(tree / "photos")
+    assert index.process_pending() == 1
+
+    photos = index.list_directory("photos")
+    assert _names(photos) == ["new", "beach.jpg"]
+    assert photos[1].size == 99
+    assert _names(index.list_directory("photos/new")) == ["deep.png"]
+    assert index.search("party") == []
+
+def test_rescan_of_removed_directory(index, tree):
+    index.full_scan()
+    (tree / "docs" / "notes.txt").unlink()
+    (tree / "docs").rmdir()
+    index.rescan_directory("docs")
+    assert index.search("notes") == []
+
+def test_index_persists_across_instances(index, tree):
+    index.full_scan()
+    reopened = FileIndex(tree, index._session_factory)
+    reopened.load_state()
+    assert reopened.ready
+    assert _names(reopened.list_directory("docs")) == ["notes.txt"]
+
+def test_media_type_for():
+    assert media_type_for("a.JPG", False) == "image"
+    assert media_type_for("a.mkv", False) == "video"
+    assert media_type_for("a.md", False) == "text"
+    assert media_type_for("a.bin", False) == "other"
+    assert media_type_for("a.jpg", True) == "directory"
+
+def test_list_endpoint_source_flag(index, tree, authenticated):
+    index.full_scan()
+    # A file the index hasn't seen yet only shows up in the live listing
+    (tree / "docs" / "fresh.txt").write_text("new")
+
+    mock_settings = MagicMock()
+    mock_settings.SERVE_PATH = tree
+    mock_settings.LIST_MAX_PAGE_SIZE = 5000
+    with patch("app.backend.routes.api_routes.settings", mock_settings), \
+         patch("app.backend.routes.api_routes.validate_and_resolve_path", return_value=tree / "docs"), \
+         patch("app.backend.routes.api_routes.get_pmask", return_value="r"), \
+         patch("app.backend.routes.api_routes.file_index", index), \
+         patch("app.backend.services.index_service.settings") as index_settings:
+        index_settings.LISTING_SOURCE = "live"
+        client = TestClient(app)
+        indexed_response = client.get("/api/v1/fs/list/docs?source=index")
+        indexed = indexed_response.json()
+        live = client.get("/api/v1/fs/list/docs?source=live").json()
+        invalid = client.get("/api/v1/fs/list/docs?source=bogus")
+        # The folder is unchanged since, but the index caught up, so the cached listing is stale
+        index.rescan_directory("docs")
+        refreshed = client.get(
+            "/api/v1/fs/list/docs?source=index",
+            headers={"If-None-Match": indexed_response.headers["ETag"]}
+        )
+
+    assert [i["name"] for i in indexed["items"]] == ["notes.txt"]
+    assert [i["name"] for i in live["items"]] == ["fresh.txt", "notes.txt"]
+    assert invalid.status_code == 400
+    assert refreshed.status_code == 200
+    assert [i["name"] for i in refreshed.json()["items"]] == ["fresh.txt", "notes.txt"]
+
+@pytest.mark.anyio
+async def test_search_endpoint_uses_index(index):
+    from app.backend.routes.api_routes import _search_hits
+    from app.backend.services.search_engine import SearchEngine
+    index.full_scan()
+    engine = SearchEngine()
+    # Not built yet, so the index table answers
+    engine.refresh = MagicMock()
+    with patch("app.backend.routes.api_routes.file_index", index), \
+         patch("app.backend.routes.api_routes.search_engine", engine), \
+         patch("app.backend.routes.api_routes.get_pmask", new=AsyncMock(return_value="r")), \
+         patch("app.backend.routes.api_routes.search_files") as remote:
+        results = await _search_hits(MagicMock(), "notes", from_index=True)
+    remote.assert_not_called()
+    assert results["hits"][0]["p"] == "docs/notes.txt"
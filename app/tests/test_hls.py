@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+import pytest
+from app.backend.services.hls_service import HlsTranscoder, HlsError, Rendition, parse_renditions
+from app.backend.routes.stream_routes import _split_hls_path
+
+INFO = {"duration": 20.0, "width": 1920, "height": 1080}
+
+# Stands in for ffmpeg: writes segments from -start_number on, like the hls muxer
+FAKE_FFMPEG = f"""#!{sys.executable}
+import sys, time
+args = sys.argv
+start = int(args[args.index("-start_number") + 1])
+pattern = args[args.index("-hls_segment_filename") + 1]
+with open(pattern.replace("%05d.ts", "calls.log"), "a") as log:
+    log.write(f"{{start}}\\n")
+for i in range(start, start + 2):
+    with open(pattern % i, "wb") as f:
+        f.write(b"ts")
+time.sleep(30)
+"""
+
+@pytest.fixture
+def transcoder(tmp_path, monkeypatch):
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(0o755)
+    monkeypatch.setattr("app.backend.services.hls_service.settings.FFMPEG_PATH", str(ffmpeg))
+    monkeypatch.setattr("app.backend.services.hls_service.settings.HLS_SEGMENT_SECONDS", 6)
+    monkeypatch.setattr("app.backend.services.hls_service.settings.HLS_RENDITIONS", ["360:800k", "720:2500k", "2160:20m"])
+    transcoder = HlsTranscoder(tmp_path / "cache")
+    yield transcoder
+    for job in transcoder._jobs.values():
+        job.kill()
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "movie.mkv"
+    path.write_bytes(b"video")
+    return path
+
+def _seed_info(transcoder, video):
+    version = transcoder.version_dir("movie.mkv", video.stat())
+    version.mkdir(parents=True)
+    (version / "info.json").write_text(json.dumps(INFO))
+    return version
+
+def test_renditions():
+    renditions = parse_renditions(["720:2.5m", "360:800k"])
+    assert [r.name for r in renditions] == ["360p", "720p"]
+    assert renditions[1].bitrate == 2500000
+    # Never upscaled, sides kept even
+    assert Rendition("720:1m").output_size(1920, 1080) == (1280, 720)
+    assert Rendition("720:1m").output_size(640, 361) == (638, 360)
+
+def test_split_hls_path():
+    assert _split_hls_path("a/b c.mkv/master.m3u8") == ("a/b c.mkv", None, "master.m3u8")
+    assert _split_hls_path("a/b.mkv/720p/index.m3u8") == ("a/b.mkv", "720p", "index.m3u8")
+    assert _split_hls_path("b.mkv/360p/00003.ts") == ("b.mkv", "360p", "00003.ts")
+
+def test_playlists(transcoder):
+    master = transcoder.master_playlist(INFO)
+    # No rendition above the source height
+    assert "360p/index.m3u8" in master and "720p/index.m3u8" in master
+    assert "2160p" not in master
+    assert "RESOLUTION=1280x720" in master
+
+    media = transcoder.media_playlist(INFO).splitlines()
+    assert media.count("#EXTINF:6.000,") == 3
+    assert "#EXTINF:2.000," in media
+    assert media[-2:] == ["00003.ts", "#EXT-X-ENDLIST"]
+
+@pytest.mark.anyio
+async def test_segments_are_transcoded_lazily(transcoder, video, monkeypatch):
+    monkeypatch.setattr("app.backend.services.hls_service.settings.HLS_SEEK_TOLERANCE_SEGMENTS", 0)
+    version = _seed_info(transcoder, video)
+    first = await transcoder.segment(video, "movie.mkv", "720p", 0)
+    assert first == version / "720p" / "00000.ts"
+    # Produced by the running job, no second transcode
+    assert await transcoder.segment(video, "movie.mkv", "720p", 1) == version / "720p" / "00001.ts"
+    # Seeking past what the job will produce soon restarts the job at that position
+    await transcoder.segment(video, "movie.mkv", "720p", 3)
+    assert (version / "720p" / "calls.log").read_text().split() == ["0", "3"]
+    assert transcoder.get_stats()["active_jobs"] == 1
+
+    with pytest.raises(HlsError) as error:
+        await transcoder.segment(video, "movie.mkv", "720p", 4)
+    assert error.value.status_code == 404
+    with pytest.raises(HlsError):
+        await transcoder.segment(video, "movie.mkv", "2160p", 0)
+
+@pytest.mark.anyio
+async def test_idle_jobs_are_cancelled(transcoder, video, monkeypatch):
+    _seed_info(transcoder, video)
+    await transcoder.segment(video, "movie.mkv", "360p", 0)
+    job = next(iter(transcoder._jobs.values()))
+    monkeypatch.setattr("app.backend.services.hls_service.settings.HLS_IDLE_TIMEOUT_SECONDS", 10.0)
+    job.last_access = time.monotonic() - 11
+    transcoder._supervise()
+    assert transcoder.get_stats()["active_jobs"] == 0
+    assert transcoder.get_stats()["cancelled_idle"] == 1
+    await job.process.wait()
+
+@pytest.mark.anyio
+async def test_transcode_cap(transcoder, video, monkeypatch):
+    monkeypatch.setattr("app.backend.services.hls_service.settings.HLS_MAX_TRANSCODES", 1)
+    _seed_info(transcoder, video)
+    await transcoder.segment(video, "movie.mkv", "360p", 0)
+    with pytest.raises(HlsError) as error:
+        await transcoder.segment(video, "movie.mkv", "720p", 0)
+    assert error.value.status_code == 503
+
+def test_trim_cache(transcoder, monkeypatch):
+    directory = transcoder.cache_dir / "aa" / "1-1" / "360p"
+    directory.mkdir(parents=True)
+    for i in range(4):
+        segment = directory / f"{i:05d}.ts"
+        segment.write_bytes(b"x" * 100)
+        os.utime(segment, (1_700_000_000 + i, 1_700_000_000 + i))
+    monkeypatch.setattr("app.backend.services.hls_service.settings.HLS_CACHE_MAX_BYTES", 250)
+    transcoder.trim_cache()
+    assert sorted(p.name for p in directory.iterdir()) == ["00002.ts", "00003.ts"]
+    assert transcoder.get_stats()["cache_bytes"] == 200
@@ -0,0 +1,168 @@
+import os
+import pytest
+from app.core.listing import (
+    scan_directory, sort_entries, paginate, FSEntry, ListingCache, directory_etag, etag_matches
+)
+
+@pytest.fixture
+def media_dir(tmp_path):
+    (tmp_path / "b_folder").mkdir()
+    (tmp_path / "A_folder").mkdir()
+    (tmp_path / ".git").mkdir()
+    (tmp_path / "zeta.mp4").write_bytes(b"x" * 10)
+    (tmp_path / "Alpha.JPG").write_bytes(b"x" * 3)
+    (tmp_path / "secret.env").write_text("KEY=1")
+    return tmp_path
+
+def test_scan_sorts_dirs_first_then_name(media_dir):
+    names = [e.name for e in scan_directory(media_dir)]
+    assert names == ["A_folder", "b_folder", "Alpha.JPG", "zeta.mp4"]
+
+def test_scan_filters_forbidden_entries(media_dir):
+    names = {e.name for e in scan_directory(media_dir)}
+    assert ".git" not in names
+    assert "secret.env" not in names
+
+def test_scan_with_stat(media_dir):
+    entries = {e.name: e for e in scan_directory(media_dir, with_stat=True)}
+    assert entries["zeta.mp4"].size == 10
+    assert entries["zeta.mp4"].mtime == os.stat(media_dir / "zeta.mp4").st_mtime
+    assert entries["A_folder"].is_dir()
+    assert not entries["A_folder"].is_file()
+
+def test_scan_without_stat_skips_metadata(media_dir):
+    entry = [e for e in scan_directory(media_dir) if e.name == "zeta.mp4"][0]
+    assert entry.size == 0
+    assert entry.suffix == ".mp4"
+
+def test_scan_tolerates_broken_symlink(media_dir):
+    os.symlink(media_dir / "missing", media_dir / "dangling")
+    entries = {e.name: e for e in scan_directory(media_dir, with_stat=True)}
+    assert entries["dangling"].is_file()
+    assert entries["dangling"].size == 0
+
+def test_entry_suffix_matches_path_semantics():
+    assert FSEntry(".bashrc", False).suffix == ""
+    assert FSEntry("archive.tar.gz", False).suffix == ".gz"
+    assert FSEntry("trailing.", False).suffix == ""
+
+def _entries():
+    return [
+        FSEntry("b.txt", False, size=30, mtime=100),
+        FSEntry("docs", True, size=0, mtime=50),
+        FSEntry("a.txt", False, size=10, mtime=300),
+        FSEntry("C.txt", False, size=20, mtime=200),
+        FSEntry("Albums", True, size=0, mtime=400),
+    ]
+
+def test_sort_entries_by_name_keeps_dirs_first():
+    names = [e.name for e in sort_entries(_entries())]
+    assert names == ["Albums", "docs", "a.txt", "b.txt", "C.txt"]
+
+def test_sort_entries_by_size_desc():
+    names = [e.name for e in sort_entries(_entries(), sort="size", order="desc")]
+    assert names == ["docs", "Albums", "b.txt", "C.txt", "a.txt"]
+
+def test_sort_entries_by_mtime():
+    names = [e.name for e in sort_entries(_entries(), sort="mtime")]
+    assert names == ["docs", "Albums", "b.txt", "C.txt", "a.txt"]
+
+@pytest.mark.parametrize("sort,order", [("name", "asc"), ("name", "desc"), ("mtime", "desc"), ("size", "asc"), ("size", "desc")])
+def test_paginate_walks_every_entry_once(sort, order):
+    entries = _entries()
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = paginate(entries, sort=sort, order=order, limit=2, cursor=cursor)
+        seen.extend(e.name for e in page)
+        if cursor is None:
+            break
+    assert seen == [e.name for e in sort_entries(entries, sort, order)]
+
+def test_paginate_is_stable_when_entries_are_added():
+    entries = _entries()
+    page, cursor = paginate(entries, limit=3)
+    assert [e.name for e in page] == ["Albums", "docs", "a.txt"]
+
+    # A file sorting before the cursor must not shift the next page
+    entries.append(FSEntry("0-new.txt", False))
+    page, cursor = paginate(entries, limit=3, cursor=cursor)
+    assert [e.name for e in page] == ["b.txt", "C.txt"]
+    assert cursor is None
+
+def test_paginate_rejects_bad_cursor():
+    _, cursor = paginate(_entries(), limit=1)
+    with pytest.raises(ValueError):
+        paginate(_entries(), sort="size", limit=1, cursor=cursor)
+    with pytest.raises(ValueError):
+        paginate(_entries(), limit=1, cursor="not-a-cursor")
+
+def _backdate(path, seconds=60):
+    """Moves a directory's mtime out of the racy window so it can be cached."""
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime - seconds))
+
+@pytest.fixture
+def cache():
+    return ListingCache(max_entries=5, ttl_seconds=60)
+
+def test_listing_cache_hit_until_directory_changes(media_dir, cache):
+    _backdate(media_dir)
+    entries = scan_directory(media_dir)
+    cache.put(media_dir, False, entries)
+    assert cache.get(media_dir, False) is entries
+
+    # Adding a file bumps the directory mtime and invalidates the entry
+    (media_dir / "new.txt").write_text("x")
+    assert cache.get(media_dir, False) is None
+    assert cache.get_stats()["hits"] == 1
+
+def test_listing_cache_needs_stat_data_for_stat_lookups(media_dir, cache):
+    _backdate(media_dir)
+    cache.put(media_dir, False, [FSEntry("a", False)])
+    assert cache.get(media_dir, True) is None
+    assert cache.get(media_dir, False) is not None
+
+def test_listing_cache_skips_recently_modified_dirs(media_dir, cache):
+    cache.put(media_dir, False, [FSEntry("a", False)])
+    assert cache.get(media_dir, False) is None
+
+def test_listing_cache_evicts_by_total_entries(tmp_path, cache):
+    dirs = []
+    for name in ["one", "two", "three"]:
+        d = tmp_path / name
+        d.mkdir()
+        _backdate(d)
+        dirs.append(d)
+        cache.put(d, False, [FSEntry(f"{name}-{i}", False) for i in range(2)])
+
+    stats = cache.get_stats()
+    assert stats["entries"] == 4
+    assert stats["evictions"] == 1
+    assert cache.get(dirs[0], False) is None
+    assert cache.get(dirs[2], False) is not None
+
+def test_listing_cache_invalidate_drops_subtree(tmp_path, cache):
+    parent = tmp_path / "parent"
+    child = parent / "child"
+    child.mkdir(parents=True)
+    _backdate(child)
+    _backdate(parent)
+    cache.put(parent, False, [FSEntry("child", True)])
+    cache.put(child, False, [FSEntry("x", False)])
+
+    cache.invalidate(parent)
+    assert cache.get(parent, False) is None
+    assert cache.get(child, False) is None
+
+def test_etag_matches_weak_and_lists():
+    assert etag_matches('W/"abc"', 'W/"abc"')
+    assert etag_matches('"abc"', 'W/"abc"')
+    assert etag_matches('"zzz", W/"abc"', 'W/"abc"')
+    assert etag_matches("*", 'W/"abc"')
+    assert not etag_matches('W/"abd"', 'W/"abc"')
+    assert not etag_matches(None, 'W/"abc"')
+
+def test_directory_etag_depends_on_variant(tmp_path):
+    assert directory_etag(tmp_path, "r") == directory_etag(tmp_path, "r")
+    assert directory_etag(tmp_path, "r") != directory_etag(tmp_path, "rw")
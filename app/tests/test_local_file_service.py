@@ -0,0 +1,113 @@
+import os
+import pytest
+from unittest.mock import patch, AsyncMock
+from email.utils import formatdate
+from fastapi.testclient import TestClient
+from app.main import app
+from app.backend.services.local_file_service import parse_range
+
+CONTENT = bytes(range(256)) * 40  # 10240 bytes
+
+@pytest.fixture
+def media_file(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(CONTENT)
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+    return path
+
+@pytest.fixture
+def client(media_file, authenticated):
+    with patch("app.backend.routes.download_routes.validate_and_resolve_path", return_value=media_file), \
+         patch("app.backend.routes.download_routes.settings") as mock_settings, \
+         patch("app.backend.services.copyparty_service.get_pmask", new=AsyncMock(return_value="r")), \
+         patch("app.backend.services.copyparty_service.proxy_stream_request", new=AsyncMock()) as proxy:
+        mock_settings.SERVE_PATH = media_file.parent
+        test_client = TestClient(app)
+        test_client.proxy = proxy
+        yield test_client
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == [(0, 99)]
+    assert parse_range("bytes=900-", 1000) == [(900, 999)]
+    assert parse_range("bytes=-100", 1000) == [(900, 999)]
+    assert parse_range("bytes=0-5000", 1000) == [(0, 999)]
+    # Overlapping and adjacent ranges are merged
+    assert parse_range("bytes=50-99,0-49,200-299,250-350", 1000) == [(0, 99), (200, 350)]
+    assert parse_range("bytes=2000-3000", 1000) == []
+    assert parse_range("items=0-1", 1000) is None
+    assert parse_range("bytes=5-1", 1000) is None
+    assert parse_range("bytes=abc", 1000) is None
+
+def test_full_download(client):
+    response = client.get("/download/clip.mp4")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "video/mp4"
+    assert response.headers["content-disposition"].startswith("attachment;")
+    client.proxy.assert_not_called()
+
+def test_media_is_inline(client):
+    response = client.get("/download/clip.mp4?media")
+    assert response.headers["content-disposition"].startswith("inline;")
+
+def test_single_range(client):
+    response = client.get("/download/clip.mp4", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+
+def test_multi_range(client):
+    response = client.get("/download/clip.mp4", headers={"Range": "bytes=0-9,1000-1009"})
+    assert response.status_code == 206
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1]
+    body = response.content
+    assert len(body) == int(response.headers["content-length"])
+    assert body.endswith(f"--{boundary}--\r\n".encode())
+    assert f"Content-Range: bytes 0-9/{len(CONTENT)}".encode() in body
+    assert b"\r\n\r\n" + CONTENT[1000:1010] + b"\r\n" in body
+
+def test_unsatisfiable_range(client):
+    response = client.get("/download/clip.mp4", headers={"Range": "bytes=99999-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+def test_conditional_requests(client):
+    first = client.get("/download/clip.mp4")
+    etag = first.headers["etag"]
+    last_modified = first.headers["last-modified"]
+
+    assert client.get("/download/clip.mp4", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/download/clip.mp4", headers={"If-None-Match": '"other"'}).status_code == 200
+    assert client.get("/download/clip.mp4", headers={"If-Modified-Since": last_modified}).status_code == 304
+    older = formatdate(1_600_000_000, usegmt=True)
+    assert client.get("/download/clip.mp4", headers={"If-Modified-Since": older}).status_code == 200
+
+def test_if_range(client):
+    etag = client.get("/download/clip.mp4").headers["etag"]
+    matching = client.get("/download/clip.mp4", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert matching.status_code == 206
+    stale = client.get("/download/clip.mp4", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == CONTENT
+
+def test_pread_reader(client):
+    with patch("app.backend.services.local_file_service.settings") as mock_settings:
+        mock_settings.LOCAL_SERVING_READER = "pread"
+        mock_settings.LOCAL_SERVING_CHUNK_SIZE = 1000
+        response = client.get("/download/clip.mp4", headers={"Range": "bytes=10-2509"})
+    assert response.content == CONTENT[10:2510]
+
+def test_thumbnails_still_use_copyparty(client):
+    client.proxy.return_value = {"status": "proxied"}
+    client.get("/download/clip.mp4?thumb=300x300")
+    client.proxy.assert_called_once()
+
+def test_no_read_permission_falls_back(client):
+    with patch("app.backend.services.copyparty_service.get_pmask", new=AsyncMock(return_value="w")):
+        client.proxy.return_value = {"status": "proxied"}
+        client.get("/download/clip.mp4")
+    client.proxy.assert_called_once()
@@ -6,6 +6,7 @@ from pathlib import Path
 from app.backend.database.session import SessionLocal
 from app.backend.database.models import User
 from app.core.security import hasher
+from app.core.listing import FSEntry
 
 client = TestClient(app)
 
@@ -50,24 +51,16 @@ def test_list_directory_json(auth_header):
     """TDD: Test for the new JSON directory listing endpoint."""
     with patch("app.backend.routes.api_routes.validate_and_resolve_path") as mock_resolve, \
          patch("app.backend.routes.api_routes.get_pmask", return_value="rw"), \
-         patch("app.backend.routes.api_routes.is_path_forbidden", return_value=False):
+         patch("app.backend.routes.api_routes.scan_directory") as mock_scan:
         
         # Mock directory contents
-        mock_file = MagicMock()
-        mock_file.name = "testfile.txt"
-        mock_file.is_dir.return_value = False
-        mock_file.stat.return_value.st_size = 1024
-        mock_file.stat.return_value.st_mtime = 1672531200 # 2023-01-01
-        
-        mock_dir = MagicMock()
-        mock_dir.name = "testfolder"
-        mock_dir.is_dir.return_value = True
-        mock_dir.stat.return_value.st_size = 4096
-        mock_dir.stat.return_value.st_mtime = 1672531200
+        mock_file = FSEntry("testfile.txt", is_dir=False, size=1024, mtime=1672531200) # 2023-01-01
+        mock_dir = FSEntry("testfolder", is_dir=True, size=4096, mtime=1672531200)
+        mock_scan.return_value = [mock_dir, mock_file]
         
         mock_resolved_path = MagicMock()
         mock_resolved_path.is_dir.return_value = True
-        mock_resolved_path.iterdir.return_value = [mock_file, mock_dir]
+        mock_resolved_path.relative_to.return_value = Path("")
         mock_resolve.return_value = mock_resolved_path
         
         response = client.get("/api/v1/fs/list/", headers=auth_header)
@@ -87,6 +80,106 @@ def test_list_directory_json(auth_header):
         assert "mtime" in first_item
         assert "permissions" in first_item
 
+def test_list_directory_pagination(auth_header):
+    """Test limit/cursor paging of the JSON directory listing."""
+    with patch("app.backend.routes.api_routes.validate_and_resolve_path") as mock_resolve, \
+         patch("app.backend.routes.api_routes.get_pmask", return_value="r"), \
+         patch("app.backend.routes.api_routes.scan_directory") as mock_scan:
+        
+        mock_scan.return_value = [FSEntry(f"img_{i:03}.jpg", is_dir=False, size=i) for i in range(5)]
+        mock_resolved_path = MagicMock()
+        mock_resolved_path.is_dir.return_value = True
+        mock_resolved_path.relative_to.return_value = Path("camera")
+        mock_resolve.return_value = mock_resolved_path
+        
+        response = client.get("/api/v1/fs/list/camera?limit=2&sort=size&order=desc", headers=auth_header)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 5
+        assert [item["name"] for item in data["items"]] == ["img_004.jpg", "img_003.jpg"]
+        assert data["next_cursor"]
+        
+        response = client.get(
+            f"/api/v1/fs/list/camera?limit=2&sort=size&order=desc&cursor={data['next_cursor']}",
+            headers=auth_header
+        )
+        assert [item["name"] for item in response.json()["items"]] == ["img_002.jpg", "img_001.jpg"]
+        
+        response = client.get("/api/v1/fs/list/camera?sort=color", headers=auth_header)
+        assert response.status_code == 400
+
+def test_list_directory_ndjson(auth_header, tmp_path):
+    """Test the streaming NDJSON listing mode."""
+    (tmp_path / "album").mkdir()
+    (tmp_path / "clip.mp4").write_bytes(b"1234")
+    (tmp_path / "node_modules").mkdir() # Forbidden, must be filtered
+    
+    with patch("app.backend.routes.api_routes.validate_and_resolve_path", return_value=tmp_path), \
+         patch("app.backend.routes.api_routes.settings") as mock_settings, \
+         patch("app.backend.routes.api_routes.get_pmask", return_value="rw"):
+        mock_settings.SERVE_PATH = tmp_path
+        
+        response = client.get(
+            "/api/v1/fs/list/",
+            headers={**auth_header, "Accept": "application/x-ndjson"}
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert response.headers["x-permissions"] == "rw"
+        
+        import json
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        by_name = {item["name"]: item for item in lines}
+        assert set(by_name) == {"album", "clip.mp4"}
+        assert by_name["album"]["is_dir"] is True
+        assert by_name["clip.mp4"]["size"] == 4
+
+        # Streamed from disk either way, so the validator doesn't depend on the source
+        etags = {
+            client.get(f"/api/v1/fs/list/?source={source}", headers={**auth_header, "Accept": "application/x-ndjson"}).headers["etag"]
+            for source in ("index", "live")
+        }
+        assert etags == {response.headers["etag"]}
+
+def test_list_directory_etag_revalidation(auth_header, tmp_path):
+    """Test weak ETag / If-None-Match handling on listing and gallery endpoints."""
+    import os
+    (tmp_path / "photo.jpg").write_bytes(b"x")
+    
+    with patch("app.backend.routes.api_routes.validate_and_resolve_path", return_value=tmp_path), \
+         patch("app.backend.routes.api_routes.settings") as mock_settings, \
+         patch("app.backend.routes.api_routes.get_pmask", return_value="r") as mock_pmask:
+        mock_settings.SERVE_PATH = tmp_path
+        
+        response = client.get("/api/v1/fs/list/", headers=auth_header)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        assert etag.startswith('W/"')
+        
+        response = client.get("/api/v1/fs/list/", headers={**auth_header, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        
+        # Different pmask -> different body -> different ETag
+        mock_pmask.return_value = "rw"
+        response = client.get("/api/v1/fs/list/", headers={**auth_header, "If-None-Match": etag})
+        assert response.status_code == 200
+        mock_pmask.return_value = "r"
+        
+        # Directory change -> new ETag
+        (tmp_path / "new.jpg").write_bytes(b"y")
+        st = os.stat(tmp_path)
+        os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        response = client.get("/api/v1/fs/list/", headers={**auth_header, "If-None-Match": etag})
+        assert response.status_code == 200
+        
+        response = client.get("/api/v1/gallery/", headers=auth_header)
+        assert response.status_code == 200
+        gallery_etag = response.headers["etag"]
+        response = client.get("/api/v1/gallery/", headers={**auth_header, "If-None-Match": gallery_etag})
+        assert response.status_code == 304
+
 def test_search_json(auth_header):
     """TDD: Test for the JSON search results endpoint."""
     mock_search_results = {
@@ -100,7 +193,7 @@ def test_search_json(auth_header):
          patch("app.backend.routes.api_routes.get_pmask", return_value="r"):
         
         # Test with format=json query parameter
-        response = client.get("/api/v1/fs/search?q=test&format=json", headers=auth_header)
+        response = client.get("/api/v1/fs/search?q=test&format=json&source=live", headers=auth_header)
         
         # This is expected to return the raw copyparty JSON currently, but we want it transformed
         assert response.status_code == 200
@@ -117,17 +210,15 @@ def test_search_json(auth_header):
 def test_gallery_metadata_json(auth_header):
     """TDD: Test for the gallery metadata JSON endpoint."""
     with patch("app.backend.routes.api_routes.validate_and_resolve_path") as mock_resolve, \
-         patch("app.backend.routes.api_routes.get_pmask", return_value="r"):
+         patch("app.backend.routes.api_routes.get_pmask", return_value="r"), \
+         patch("app.backend.routes.api_routes.scan_directory") as mock_scan:
         
         # Mock media file
-        mock_file = MagicMock()
-        mock_file.name = "image.jpg"
-        mock_file.is_file.return_value = True
-        mock_file.suffix = ".jpg"
+        mock_scan.return_value = [FSEntry("image.jpg", is_dir=False)]
         
         mock_resolved_dir = MagicMock()
         mock_resolved_dir.is_dir.return_value = True
-        mock_resolved_dir.iterdir.return_value = [mock_file]
+        mock_resolved_dir.relative_to.return_value = Path("folder")
         mock_resolve.return_value = mock_resolved_dir
         
         response = client.get("/api/v1/gallery/folder", headers=auth_header)
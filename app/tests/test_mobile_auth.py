@@ -59,13 +59,13 @@ def test_token_endpoint(mock_db_user):
         
         # Mock filesystem calls for the gallery endpoint
         with patch("app.backend.routes.api_routes.validate_and_resolve_path") as mock_resolve, \
-             patch("app.backend.routes.api_routes.get_pmask", return_value="r"):
+             patch("app.backend.routes.api_routes.get_pmask", return_value="r"), \
+             patch("app.backend.routes.api_routes.scan_directory", return_value=[]): # Empty directory
             
             # Setup mock directory structure
             mock_path = MagicMock()
             mock_path.is_dir.return_value = True
             mock_path.is_file.return_value = False
-            mock_path.iterdir.return_value = [] # Return empty list of files
             mock_resolve.return_value = mock_path
             
             headers = {"Authorization": f"Bearer {token}"}
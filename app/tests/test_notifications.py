@@ -28,7 +28,9 @@ def test_delete_notification_header(mock_resolve, mock_get_pmask, mock_authentic
     mock_resolve.return_value = mock_file
     mock_get_pmask.return_value = "rwd"
     
-    with TestClient(app) as client:
+    with TestClient(app) as client, \
+         patch("app.backend.routes.api_routes.trash") as mock_trash:
+        mock_trash.trash.return_value = {"id": "item1"}
         client.cookies.set("session_id", "test_id")
         response = client.delete("/api/v1/fs/test.txt")
         assert response.status_code == 204
@@ -45,7 +47,8 @@ def test_mkdir_notification_header(mock_resolve, mock_get_pmask, mock_authentica
     mock_resolve.return_value = mock_dir
     mock_get_pmask.return_value = "rw"
     
-    with TestClient(app) as client:
+    with TestClient(app) as client, \
+         patch("app.backend.routes.api_routes.scan_directory", return_value=[]):
         client.cookies.set("session_id", "test_id")
         response = client.post("/api/v1/fs/mkdir/new_folder")
         assert response.status_code == 200
@@ -0,0 +1,46 @@
+import pytest
+from pathlib import Path
+from app.core.permission_engine import PermissionEngine
+
+@pytest.fixture
+def engine(tmp_path):
+    conf = tmp_path / "copyparty.conf"
+    conf.write_text("""# Generated by manage.py
+--ah-alg sha2,424242
+-a admin:hash
+-a guest:hash
+-v /srv/files:/:rwmda.,admin:r,guest
+-v /srv/music:music:A,admin:r,*:c,e2d
+""")
+    return PermissionEngine(conf)
+
+def test_root_volume_permissions(engine):
+    assert engine.get_pmask("admin", Path("")) == "rwmda."
+    assert engine.get_pmask("guest", Path("photos/2024")) == "r"
+    assert engine.get_pmask("stranger", Path("photos")) == ""
+
+def test_most_specific_volume_wins(engine):
+    assert engine.get_pmask("admin", Path("music/albums")) == "rwmda."
+    # '*' grants read to everyone on the music volume
+    assert engine.get_pmask("stranger", Path("music")) == "r"
+    # A sibling with the same prefix is not inside the volume
+    assert engine.get_pmask("stranger", Path("musicals")) == ""
+
+def test_root_permissions_for_login(engine):
+    assert engine.get_root_permissions("admin") == "rwmda."
+    assert engine.get_root_permissions("nobody") == ""
+
+def test_unsupported_config_defers_to_backend(tmp_path):
+    conf = tmp_path / "copyparty.conf"
+    conf.write_text("[/]\n  /srv\n  accs:\n    r: @readers\n")
+    assert PermissionEngine(conf).get_pmask("admin", Path("")) is None
+
+def test_group_permissions_defer_to_backend(tmp_path):
+    conf = tmp_path / "copyparty.conf"
+    conf.write_text("-v /srv:/:r,@readers\n")
+    assert PermissionEngine(conf).get_pmask("admin", Path("")) is None
+
+def test_missing_config_defers_to_backend(tmp_path):
+    engine = PermissionEngine(tmp_path / "missing.conf")
+    assert engine.get_pmask("admin", Path("")) is None
+    assert engine.get_root_permissions("admin") == ""
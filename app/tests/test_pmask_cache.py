@@ -0,0 +1,85 @@
+import os
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from pathlib import Path
+from fastapi import Request
+from app.core.pmask_cache import PmaskCache
+from app.core.permission_engine import PermissionEngine
+from app.backend.services.copyparty_service import get_pmask
+
+@pytest.fixture
+def cache(tmp_path):
+    conf = tmp_path / "copyparty.conf"
+    conf.write_text("-v /srv:/:r,alice\n")
+    return PmaskCache(conf_path=conf, ttl_seconds=60, max_entries=3)
+
+def test_cache_hit_and_miss(cache):
+    assert cache.get("alice", Path("photos")) is None
+    cache.set("alice", Path("photos"), "rw")
+    assert cache.get("alice", Path("photos/")) == "rw"
+    assert cache.get("bob", Path("photos")) is None
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+def test_cache_ttl_expiry(cache):
+    cache.ttl_seconds = 0
+    cache.set("alice", Path(""), "r")
+    assert cache.get("alice", Path("")) is None
+
+def test_cache_lru_eviction(cache):
+    for name in ["a", "b", "c"]:
+        cache.set("alice", Path(name), "r")
+    # Touch 'a' so 'b' becomes the least recently used
+    assert cache.get("alice", Path("a")) == "r"
+    cache.set("alice", Path("d"), "r")
+
+    assert cache.get("alice", Path("b")) is None
+    assert cache.get("alice", Path("a")) == "r"
+    assert cache.get_stats()["entries"] == 3
+
+def test_cache_invalidate_user(cache):
+    cache.set("alice", Path("x"), "rw")
+    cache.set("bob", Path("x"), "r")
+    cache.invalidate("alice")
+
+    assert cache.get("alice", Path("x")) is None
+    assert cache.get("bob", Path("x")) == "r"
+
+def test_cache_cleared_when_conf_changes(cache):
+    cache.set("alice", Path("x"), "rw")
+
+    conf = cache._conf_path
+    conf.write_text("-v /srv:/:rw,alice\n")
+    stat = conf.stat()
+    os.utime(conf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    cache._conf_checked_at = 0
+
+    assert cache.get("alice", Path("x")) is None
+
+@pytest.mark.anyio
+async def test_get_pmask_queries_backend_once(cache):
+    request = MagicMock(spec=Request)
+    session = MagicMock()
+    session.username = "alice"
+    request.state.session = session
+
+    response = MagicMock()
+    response.status_code = 200
+    response.text = "rw"
+    client = MagicMock()
+    client.get = AsyncMock(return_value=response)
+
+    # A section-style config can't be evaluated locally, forcing the remote path
+    unsupported_conf = cache._conf_path.parent / "sections.conf"
+    unsupported_conf.write_text("[/]\n  /srv\n")
+
+    with patch("app.backend.services.copyparty_service.pmask_cache", cache), \
+         patch("app.backend.services.copyparty_service.permission_engine", PermissionEngine(unsupported_conf)), \
+         patch("app.backend.services.copyparty_service.get_http_client", return_value=client), \
+         patch("app.backend.services.copyparty_service.get_proxy_headers", return_value={}):
+        for _ in range(5):
+            assert await get_pmask(request, Path("photos")) == "rw"
+
+    assert client.get.call_count == 1
@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.backend.database.base import Base
+from app.backend.services.pregeneration_queue import PregenerationQueue, PRIORITY_DIRECTORY, PRIORITY_UPLOAD
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "files"
+    (root / "album" / "nested").mkdir(parents=True)
+    for name in ["a.jpg", "b.png", "notes.txt"]:
+        (root / "album" / name).write_bytes(b"x")
+    (root / "album" / "nested" / "c.jpg").write_bytes(b"x")
+    (root / "new.jpg").write_bytes(b"x")
+    return root
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+def _queue(root, session_factory, done, fail=()):
+    queue = PregenerationQueue(root, session_factory)
+
+    async def handler(source, rel):
+        if rel in fail:
+            raise OSError("broken")
+        done.append(rel)
+
+    queue.register("thumbnail", lambda path: path.suffix in (".jpg", ".png"), handler)
+    return queue
+
+@pytest.mark.anyio
+async def test_priority_order_and_dedup(root, session_factory):
+    done = []
+    queue = _queue(root, session_factory, done)
+    assert queue.enqueue([root / "new.jpg", root / "album" / "notes.txt"], PRIORITY_UPLOAD) == 1
+    assert queue.enqueue_directory(root / "album", PRIORITY_DIRECTORY) == 2
+    # Already queued with a more urgent priority
+    assert queue.enqueue([root / "album" / "a.jpg"], PRIORITY_UPLOAD) == 0
+    assert queue.get_stats()["depth"] == 3
+
+    while await queue.run_next():
+        pass
+    assert done == ["album/a.jpg", "album/b.png", "new.jpg"]
+    assert queue.get_stats()["depth"] == 0
+
+@pytest.mark.anyio
+async def test_upload_job_promoted_by_directory_request(root, session_factory):
+    done = []
+    queue = _queue(root, session_factory, done)
+    queue.enqueue([root / "new.jpg"], PRIORITY_UPLOAD)
+    queue.enqueue([root / "album" / "a.jpg"], PRIORITY_UPLOAD)
+    assert queue.enqueue_directory(root / "album", PRIORITY_DIRECTORY) == 2
+    await queue.run_next()
+    assert done == ["album/a.jpg"]
+
+def test_recursive_directory(root, session_factory):
+    queue = _queue(root, session_factory, [])
+    assert queue.enqueue_directory(root / "album", recursive=True) == 3
+
+@pytest.mark.anyio
+async def test_jobs_survive_restart(root, session_factory):
+    _queue(root, session_factory, []).enqueue([root / "new.jpg"])
+    done = []
+    restarted = _queue(root, session_factory, done)
+    assert await restarted.run_next()
+    assert done == ["new.jpg"]
+
+@pytest.mark.anyio
+async def test_failing_job_is_retried_then_dropped(root, session_factory, monkeypatch):
+    monkeypatch.setattr("app.backend.services.pregeneration_queue.settings.PREGENERATE_MAX_ATTEMPTS", 2)
+    done = []
+    queue = _queue(root, session_factory, done, fail={"new.jpg"})
+    queue.enqueue([root / "new.jpg"])
+    assert await queue.run_next()
+    assert queue.get_stats()["depth"] == 1
+    assert await queue.run_next()
+    assert not await queue.run_next()
+    assert queue.get_stats()["failed"] == 2
+
+@pytest.mark.anyio
+async def test_deleted_file_is_dropped(root, session_factory):
+    done = []
+    queue = _queue(root, session_factory, done)
+    queue.enqueue([root / "new.jpg"])
+    (root / "new.jpg").unlink()
+    assert await queue.run_next()
+    assert done == []
+    assert queue.get_stats()["depth"] == 0
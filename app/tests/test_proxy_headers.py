@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 from app.main import app
 from app.core.auth import auth_required
@@ -21,9 +21,9 @@ def mock_session():
         yield session
 
 @patch("app.backend.services.copyparty_service.decrypt_string")
-@patch("app.backend.services.copyparty_service.requests.get")
+@patch("app.backend.services.copyparty_service.get_http_client")
 @patch("app.backend.routes.download_routes.validate_and_resolve_path")
-def test_download_proxies_auth_header(mock_resolve, mock_get, mock_decrypt, mock_session):
+def test_download_proxies_auth_header(mock_resolve, mock_get_client, mock_decrypt, mock_session):
     """Verify that the Authorization header is propagated to copyparty during download."""
     # Setup mocks
     mock_path = MagicMock()
@@ -34,12 +34,18 @@ def test_download_proxies_auth_header(mock_resolve, mock_get, mock_decrypt, mock
     
     mock_decrypt.return_value = "Basic dGVzdHVzZXI6cGFzcw==" # Decrypted "testuser:pass"
     
-    # Mock requests.get response
+    # Mock the streamed backend response
+    async def body(chunk_size=None):
+        yield b"content"
+
     mock_resp = MagicMock()
     mock_resp.status_code = 200
     mock_resp.headers = {"Content-Type": "text/plain"}
-    mock_resp.iter_content.return_value = iter([b"content"])
-    mock_get.return_value = mock_resp
+    mock_resp.aiter_raw = body
+    mock_resp.aclose = AsyncMock()
+    mock_client = MagicMock()
+    mock_client.send = AsyncMock(return_value=mock_resp)
+    mock_get_client.return_value = mock_client
     
     with TestClient(app) as client:
         client.cookies.set("session_id", "test_id")
@@ -47,7 +53,7 @@ def test_download_proxies_auth_header(mock_resolve, mock_get, mock_decrypt, mock
         
         assert response.status_code == 200
         
-        # Verify requests.get was called with the correct Authorization header
-        args, kwargs = mock_get.call_args
+        # Verify the backend request was built with the correct Authorization header
+        args, kwargs = mock_client.build_request.call_args
         headers = kwargs.get("headers", {})
         assert headers.get("Authorization") == "Basic dGVzdHVzZXI6cGFzcw=="
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import hashlib
+import pytest
+from unittest.mock import patch, AsyncMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.constants import PARTIAL_UPLOAD_SUFFIX
+from app.backend.database.base import Base
+from app.backend.services.upload_service import ResumableUploadManager, UploadError
+
+DATA = os.urandom(10000)
+
+async def _stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "files"
+    (root / "docs").mkdir(parents=True)
+    return root
+
+@pytest.fixture
+def manager(root, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'uploads.db'}")
+    Base.metadata.create_all(engine)
+    return ResumableUploadManager(root, sessionmaker(bind=engine), tmp_path / "streaming_uploads.json")
+
+@pytest.mark.anyio
+async def test_upload_in_chunks(manager, root):
+    upload = manager.create("alice", root / "docs" / "big.bin", len(DATA))
+    assert upload["offset"] == 0
+    # The partial file is hidden next to the target
+    assert [p.suffix for p in (root / "docs").iterdir()] == [PARTIAL_UPLOAD_SUFFIX]
+
+    state = await manager.write_chunk(upload["id"], "alice", 0, _stream(DATA[:3000], DATA[3000:4000]))
+    assert state["offset"] == 4000
+    with pytest.raises(UploadError) as error:
+        manager.complete(upload["id"], "alice")
+    assert error.value.status_code == 409 and error.value.offset == 4000
+
+    await manager.write_chunk(upload["id"], "alice", 4000, _stream(DATA[4000:]))
+    target = manager.complete(upload["id"], "alice")
+    assert target.read_bytes() == DATA
+    assert [p.name for p in (root / "docs").iterdir()] == ["big.bin"]
+    with pytest.raises(UploadError):
+        manager.status(upload["id"], "alice")
+
+@pytest.mark.anyio
+async def test_resume_after_dropped_connection(manager, root):
+    upload = manager.create("alice", root / "docs" / "big.bin", len(DATA))
+
+    async def dropped():
+        yield DATA[:2500]
+        raise ConnectionError("client went away")
+
+    with pytest.raises(ConnectionError):
+        await manager.write_chunk(upload["id"], "alice", 0, dropped())
+    # Whatever arrived is kept
+    assert manager.status(upload["id"], "alice")["offset"] == 2500
+
+    with pytest.raises(UploadError) as error:
+        await manager.write_chunk(upload["id"], "alice", 0, _stream(DATA))
+    assert error.value.status_code == 409 and error.value.offset == 2500
+
+    await manager.write_chunk(upload["id"], "alice", 2500, _stream(DATA[2500:]))
+    assert manager.complete(upload["id"], "alice").read_bytes() == DATA
+
+@pytest.mark.anyio
+async def test_limits_and_ownership(manager, root):
+    (root / "docs" / "taken.txt").write_text("x")
+    with pytest.raises(UploadError) as error:
+        manager.create("alice", root / "docs" / "taken.txt", 10)
+    assert error.value.status_code == 409
+
+    upload = manager.create("alice", root / "docs" / "small.txt", 5)
+    with pytest.raises(UploadError) as error:
+        await manager.write_chunk(upload["id"], "alice", 0, _stream(b"too long"))
+    assert error.value.status_code == 413
+    with pytest.raises(UploadError) as error:
+        manager.status(upload["id"], "mallory")
+    assert error.value.status_code == 404
+
+def test_name_taken_before_completion(manager, root):
+    upload = manager.create("alice", root / "docs" / "late.txt", 0)
+    (root / "docs" / "late.txt").write_text("first")
+    with pytest.raises(UploadError):
+        manager.complete(upload["id"], "alice")
+    assert (root / "docs" / "late.txt").read_text() == "first"
+
+def test_abandoned_uploads_are_removed(manager, root, monkeypatch):
+    upload = manager.create("alice", root / "docs" / "old.bin", 10)
+    manager.create("alice", root / "docs" / "new.bin", 10)
+    monkeypatch.setattr("app.backend.services.upload_service.settings.UPLOAD_SESSION_EXPIRY_SECONDS", 60)
+    with manager._session_factory() as db:
+        from app.backend.database.models import UploadSession
+        db.get(UploadSession, upload["id"]).updated_at = time.time() - 120
+        db.commit()
+    assert manager.cleanup_expired() == 1
+    assert len(list((root / "docs").iterdir())) == 1
+    assert manager.get_stats()["active"] == 1
+
+@pytest.mark.anyio
+async def test_cut_off_stream_partials_are_removed(manager, root, tmp_path, monkeypatch):
+    streams_file = tmp_path / "streaming_uploads.json"
+    recorded = []
+
+    async def body():
+        recorded.extend(json.loads(streams_file.read_text()))
+        yield DATA
+
+    await manager.write_stream(root / "docs" / "done.bin", body())
+    assert len(recorded) == 1 and recorded[0].endswith(PARTIAL_UPLOAD_SUFFIX)
+    assert json.loads(streams_file.read_text()) == []
+
+    # Left by a restart mid-body; a partial file nobody recorded isn't touched
+    monkeypatch.setattr("app.backend.services.upload_service.settings.UPLOAD_SESSION_EXPIRY_SECONDS", 60)
+    old = root / "docs" / f".cut.bin.abc{PARTIAL_UPLOAD_SUFFIX}"
+    recent = root / f".live.bin.def{PARTIAL_UPLOAD_SUFFIX}"
+    stray = root / f".other.bin.ghi{PARTIAL_UPLOAD_SUFFIX}"
+    for path in (old, recent, stray):
+        path.write_bytes(b"x")
+        os.utime(path, (time.time() - 120, time.time() - 120))
+    os.utime(recent, None)
+    streams_file.write_text(json.dumps([str(old), str(recent)]))
+
+    restarted = ResumableUploadManager(root, manager._session_factory, streams_file)
+    restarted._find_orphans()
+    assert restarted.cleanup_expired() == 1
+    assert not old.exists() and recent.exists() and stray.exists()
+    assert json.loads(streams_file.read_text()) == [str(recent)]
+
+    recent.unlink()
+    assert restarted.cleanup_expired() == 0
+    assert restarted._orphans == set()
+    assert json.loads(streams_file.read_text()) == []
+
+def test_upload_routes(manager, root, authenticated):
+    with patch("app.backend.routes.upload_routes.settings") as mock_settings, \
+         patch("app.backend.routes.upload_routes.resumable_uploads", manager), \
+         patch("app.backend.routes.upload_routes.get_pmask", new=AsyncMock(return_value="rw")), \
+         patch("app.backend.routes.upload_routes.pregeneration_queue") as queue, \
+         patch("app.core.file_security.settings.SERVE_DIR", str(root)):
+        mock_settings.SERVE_PATH = root
+        mock_settings.UPLOAD_CHUNK_SIZE = 4096
+        client = TestClient(app)
+
+        created = client.post("/uploads", params={"path": "docs/clip.bin", "size": len(DATA)})
+        assert created.status_code == 201
+        upload_id = created.json()["id"]
+        assert created.headers["location"] == f"/uploads/{upload_id}"
+        assert created.json()["chunk_size"] == 4096
+
+        assert client.put(f"/uploads/{upload_id}?offset=0", content=DATA[:6000]).headers["upload-offset"] == "6000"
+        conflict = client.put(f"/uploads/{upload_id}?offset=0", content=DATA)
+        assert conflict.status_code == 409
+        assert conflict.json()["offset"] == 6000
+        assert client.head(f"/uploads/{upload_id}").headers["upload-offset"] == "6000"
+
+        client.put(f"/uploads/{upload_id}?offset=6000", content=DATA[6000:])
+        done = client.post(f"/uploads/{upload_id}/complete")
+        assert done.json() == {"path": "docs/clip.bin", "size": len(DATA)}
+        assert (root / "docs" / "clip.bin").read_bytes() == DATA
+        queue.enqueue.assert_called_once()
+
+        assert client.get(f"/uploads/{upload_id}").status_code == 404
+
+@pytest.mark.anyio
+async def test_stream_upload(manager, root, monkeypatch):
+    monkeypatch.setattr("app.backend.services.upload_service.settings.UPLOAD_WRITE_BUFFER_SIZE", 4096)
+    digest = hashlib.sha256(DATA).hexdigest()
+    target = root / "docs" / "streamed.bin"
+    chunks = [DATA[i:i + 1000] for i in range(0, len(DATA), 1000)]
+    result = await manager.write_stream(target, _stream(*chunks), size=len(DATA), sha256=digest.upper())
+    assert result == {"path": "docs/streamed.bin", "size": len(DATA), "sha256": digest}
+    assert target.read_bytes() == DATA
+    assert manager.get_stats()["streamed"] == 1
+
+@pytest.mark.anyio
+async def test_stream_upload_is_discarded_on_error(manager, root, monkeypatch):
+    cases = [
+        (dict(size=len(DATA), sha256="0" * 64), 422),
+        (dict(size=len(DATA) + 1), 400),
+        (dict(size=100), 413),
+    ]
+    for kwargs, status in cases:
+        with pytest.raises(UploadError) as error:
+            await manager.write_stream(root / "docs" / "bad.bin", _stream(DATA), **kwargs)
+        assert error.value.status_code == status
+    monkeypatch.setattr("app.backend.services.upload_service.settings.UPLOAD_MAX_SIZE", 100)
+    with pytest.raises(UploadError) as error:
+        await manager.write_stream(root / "docs" / "bad.bin", _stream(DATA))
+    assert error.value.status_code == 413
+    # Incremental free-space check for bodies of unknown length
+    monkeypatch.setattr("app.backend.services.upload_service.settings.UPLOAD_MAX_SIZE", len(DATA))
+    monkeypatch.setattr("app.backend.services.upload_service.settings.UPLOAD_WRITE_BUFFER_SIZE", 1000)
+    monkeypatch.setattr("app.backend.services.upload_service.settings.UPLOAD_CHUNK_SIZE", 1000)
+    calls = []
+
+    def check_space(directory, needed):
+        calls.append(needed)
+        if len(calls) > 2:
+            raise UploadError("Not enough free space", 507)
+
+    monkeypatch.setattr(manager, "_check_space", check_space)
+    with pytest.raises(UploadError) as error:
+        await manager.write_stream(root / "docs" / "bad.bin", _stream(*[DATA[i:i + 1000] for i in range(0, len(DATA), 1000)]))
+    assert error.value.status_code == 507
+    assert list((root / "docs").iterdir()) == []
+
+def test_stream_upload_route(manager, root, authenticated):
+    with patch("app.backend.routes.upload_routes.settings") as mock_settings, \
+         patch("app.backend.routes.upload_routes.resumable_uploads", manager), \
+         patch("app.backend.routes.upload_routes.get_pmask", new=AsyncMock(return_value="rw")), \
+         patch("app.backend.routes.upload_routes.pregeneration_queue") as queue, \
+         patch("app.core.file_security.settings.SERVE_DIR", str(root)):
+        mock_settings.SERVE_PATH = root
+        client = TestClient(app)
+
+        response = client.put("/upload/docs/raw.bin", content=DATA,
+                              headers={"X-Checksum-Sha256": hashlib.sha256(DATA).hexdigest()})
+        assert response.status_code == 201
+        assert response.json()["size"] == len(DATA)
+        assert (root / "docs" / "raw.bin").read_bytes() == DATA
+        queue.enqueue.assert_called_once()
+
+        assert client.put("/upload/docs/raw.bin", content=DATA).status_code == 409
+        assert client.put("/upload/docs/app.pyc", content=DATA).status_code == 404
@@ -65,12 +65,12 @@ def test_search_ui_success(mock_proxy, mock_authenticated_session):
         assert "file1.txt" in response.text
         assert "folder1/file1.txt" in response.text
 
+@patch("app.backend.routes.api_routes.scan_directory", return_value=[])
 @patch("app.backend.routes.api_routes.validate_and_resolve_path")
-def test_search_ui_empty_query(mock_resolve, mock_authenticated_session):
+def test_search_ui_empty_query(mock_resolve, mock_scan, mock_authenticated_session):
     """Test search UI returns directory listing when query is empty."""
     mock_path = MagicMock()
     mock_path.is_dir.return_value = True
-    mock_path.iterdir.return_value = []
     mock_resolve.return_value = mock_path
     
     with TestClient(app) as client:
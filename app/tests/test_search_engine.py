@@ -0,0 +1,136 @@
+import time
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.backend.services.search_engine import SearchEngine, SearchFilters
+
+ROWS = [
+    ("photos", True, 0, 100.0, "directory"),
+    ("photos/beach.jpg", False, 2_000_000, 200.0, "image"),
+    ("photos/2023", True, 0, 100.0, "directory"),
+    ("photos/2023/Beach_Party.mp4", False, 50_000_000, 300.0, "video"),
+    ("photos/2023/sunset.png", False, 500_000, 400.0, "image"),
+    ("docs/notes.txt", False, 10, 500.0, "text"),
+    ("docs/beach-house-lease.pdf", False, 100_000, 600.0, "other"),
+    ("a.md", False, 1, 1.0, "text"),
+]
+
+@pytest.fixture
+def engine():
+    engine = SearchEngine()
+    engine.build(iter(ROWS), version=1)
+    return engine
+
+def _paths(hits):
+    return [h["p"] for h in hits]
+
+def test_not_ready_before_build():
+    assert SearchEngine().search("beach") is None
+
+def test_ranking_prefers_name_start(engine):
+    hits = engine.search("beach")
+    assert _paths(hits) == [
+        "photos/beach.jpg",
+        "photos/2023/Beach_Party.mp4",
+        "docs/beach-house-lease.pdf",
+    ]
+    assert hits[0]["s"] == 2_000_000 and hits[0]["t"] == 200.0
+
+def test_directories_have_trailing_slash(engine):
+    assert _paths(engine.search("2023")) == ["photos/2023/"]
+
+def test_multiple_tokens_can_match_parent_path(engine):
+    assert _paths(engine.search("2023 sunset")) == ["photos/2023/sunset.png"]
+    assert engine.search("docs sunset") == []
+
+def test_short_query_uses_prefix(engine):
+    assert _paths(engine.search("a")) == ["a.md"]
+    assert _paths(engine.search("SU")) == ["photos/2023/sunset.png"]
+
+def test_fuzzy_match_tolerates_typos(engine):
+    assert _paths(engine.search("sunzet")) == []
+    assert _paths(engine.search("sunsett")) == ["photos/2023/sunset.png"]
+    assert _paths(engine.search("beachparty")) == ["photos/2023/Beach_Party.mp4"]
+
+def test_limit(engine):
+    assert len(engine.search("beach", limit=2)) == 2
+
+def test_filters(engine):
+    assert _paths(engine.search("beach", SearchFilters(media_type="video"))) == ["photos/2023/Beach_Party.mp4"]
+    assert _paths(engine.search("beach", SearchFilters(extensions=["PDF", ".jpg"]))) == [
+        "photos/beach.jpg", "docs/beach-house-lease.pdf"
+    ]
+    assert _paths(engine.search("beach", SearchFilters(min_size=1_000_000, max_size=10_000_000))) == ["photos/beach.jpg"]
+    assert _paths(engine.search("beach", SearchFilters(modified_after=250, modified_before=700))) == [
+        "photos/2023/Beach_Party.mp4", "docs/beach-house-lease.pdf"
+    ]
+
+def test_invalid_media_type():
+    with pytest.raises(ValueError):
+        SearchFilters(media_type="audio")
+
+def test_filters_apply_to_copyparty_hits():
+    filters = SearchFilters(media_type="directory")
+    assert filters.matches_hit({"p": "photos/", "s": 0, "t": 0})
+    assert not filters.matches_hit({"p": "photos/a.jpg", "s": 0, "t": 0})
+
+def test_refresh_rebuilds_when_index_changes():
+    engine = SearchEngine()
+    file_index = MagicMock()
+    file_index.ready = True
+    file_index.version = 3
+    file_index.iter_rows.return_value = iter(ROWS)
+
+    assert engine.refresh(file_index)
+    for _ in range(100):
+        if engine.ready and not engine.building:
+            break
+        time.sleep(0.01)
+    assert engine.get_stats()["index_version"] == 3
+    # Up to date: nothing to do
+    assert not engine.refresh(file_index)
+
+@pytest.mark.anyio
+async def test_copyparty_backend_is_filtered_and_limited():
+    from app.backend.routes.api_routes import _search_hits
+    remote_hits = {"hits": [
+        {"p": "a.jpg", "s": 1, "t": 1},
+        {"p": "b.mp4", "s": 1, "t": 1},
+        {"p": "c.jpg", "s": 1, "t": 1},
+    ]}
+    with patch("app.backend.routes.api_routes.search_files", AsyncMock(return_value=remote_hits)):
+        results = await _search_hits(MagicMock(), "x", from_index=False, filters=SearchFilters(extensions=["jpg"]), limit=1)
+    assert _paths(results["hits"]) == ["a.jpg"]
+
+@pytest.mark.anyio
+async def test_local_hits_are_limited_to_readable_folders(engine):
+    from app.backend.routes.api_routes import _search_hits
+    index = MagicMock(ready=True, version=1)
+
+    async def get_pmask(request, folder):
+        # This user can't read the docs volume
+        return "" if folder.as_posix().startswith("docs") else "r"
+
+    pmask = AsyncMock(side_effect=get_pmask)
+    with patch("app.backend.routes.api_routes.search_engine", engine), \
+         patch("app.backend.routes.api_routes.file_index", index), \
+         patch("app.backend.routes.api_routes.get_pmask", new=pmask):
+        results = await _search_hits(MagicMock(), "beach", from_index=True, limit=2)
+    assert _paths(results["hits"]) == ["photos/beach.jpg", "photos/2023/Beach_Party.mp4"]
+    # Each folder once; the first two hits were readable, so docs wasn't reached
+    assert sorted(call.args[1].as_posix() for call in pmask.await_args_list) == ["photos", "photos/2023"]
+
+    with patch("app.backend.routes.api_routes.search_engine", engine), \
+         patch("app.backend.routes.api_routes.file_index", index), \
+         patch("app.backend.routes.api_routes.get_pmask", new=pmask):
+        results = await _search_hits(MagicMock(), "lease", from_index=True)
+    assert results["hits"] == []
+
+@pytest.mark.anyio
+async def test_unreadable_hits_are_replaced_from_further_down(engine):
+    from app.backend.routes.api_routes import _search_hits
+    pmask = AsyncMock(side_effect=lambda request, folder: "" if folder.as_posix() == "photos/2023" else "r")
+    with patch("app.backend.routes.api_routes.search_engine", engine), \
+         patch("app.backend.routes.api_routes.file_index", MagicMock(ready=True, version=1)), \
+         patch("app.backend.routes.api_routes.get_pmask", new=pmask):
+        results = await _search_hits(MagicMock(), "beach", from_index=True, limit=2)
+    assert _paths(results["hits"]) == ["photos/beach.jpg", "docs/beach-house-lease.pdf"]
@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.session_manager import Session
+from app.backend.services.search_sessions import SearchSessionManager
+from app.backend.services.search_engine import SearchEngine
+
+HITS = [
+    {"p": "photos/beach.jpg", "s": 1, "t": 1},
+    {"p": "photos/beach_party.mp4", "s": 1, "t": 1},
+    {"p": "docs/beach-house.pdf", "s": 1, "t": 1},
+]
+
+@pytest.fixture
+def manager():
+    return SearchSessionManager(max_sessions=2)
+
+def test_new_query_supersedes_previous(manager):
+    first = manager.begin("s1")
+    second = manager.begin("s1")
+    assert not manager.is_current("s1", first)
+    assert manager.is_current("s1", second)
+    # Other sessions are independent
+    other = manager.begin("s2")
+    assert manager.is_current("s2", other)
+
+def test_sessions_are_bounded(manager):
+    for sid in ["a", "b", "c"]:
+        manager.begin(sid)
+    assert manager.get_stats()["sessions"] == 2
+    assert not manager.is_current("a", 1)
+
+@pytest.mark.anyio
+async def test_begin_cancels_in_flight_search(manager):
+    generation = manager.begin("s1")
+    task = asyncio.ensure_future(asyncio.sleep(10))
+    manager.attach("s1", generation, task)
+
+    manager.begin("s1")
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert manager.get_stats()["cancelled"] == 1
+
+@pytest.mark.anyio
+async def test_attach_after_supersede_cancels(manager):
+    stale = manager.begin("s1")
+    manager.begin("s1")
+    task = asyncio.ensure_future(asyncio.sleep(10))
+    manager.attach("s1", stale, task)
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+def test_refinement_filters_previous_results(manager):
+    manager.begin("s1")
+    manager.remember("s1", "Beach", "key", HITS, complete=True)
+
+    assert [h["p"] for h in manager.refine("s1", "beach party", "key")] == ["photos/beach_party.mp4"]
+    assert [h["p"] for h in manager.refine("s1", "beach-h", "key")] == ["docs/beach-house.pdf"]
+    # Not a refinement, or a different source/scope
+    assert manager.refine("s1", "sunset", "key") is None
+    assert manager.refine("s1", "beach p", "other") is None
+
+def test_incomplete_results_are_not_reused(manager):
+    manager.begin("s1")
+    manager.remember("s1", "beach", "key", HITS, complete=False)
+    assert manager.refine("s1", "beachy", "key") is None
+
+    manager.remember("s1", "be", "key", HITS, complete=True)
+    assert [h["p"] for h in manager.refine("s1", "bea", "key")] == [h["p"] for h in HITS]
+
+def test_search_ui_streams_results_and_reuses_them(authenticated):
+    session = Session("127.0.0.1", "test-agent")
+    session.username = "testuser"
+    hits = [{"p": f"photos/beach_{i}.jpg", "s": 1, "t": 1} for i in range(30)]
+
+    with patch("app.core.session_manager.session_manager.get_session", return_value=session), \
+         patch("app.backend.routes.api_routes.search_sessions", SearchSessionManager(10)), \
+         patch("app.backend.routes.api_routes._search_hits", return_value={"hits": hits}) as backend:
+        client = TestClient(app)
+        client.cookies.set("session_id", session.session_id)
+        first = client.get("/api/v1/fs/search/ui?q=beach&source=live")
+        refined = client.get("/api/v1/fs/search/ui?q=beach_1&source=live")
+
+    assert first.status_code == 200
+    assert first.text.count("file-card") == 30
+    assert "beach_29.jpg" in first.text
+    # beach_1 and beach_10..19 come from the cached result set
+    assert backend.call_count == 1
+    assert refined.text.count("file-card") == 11
+
+def test_local_engine_refinements_match_a_fresh_search(authenticated):
+    session = Session("127.0.0.1", "test-agent")
+    session.username = "testuser"
+    engine = SearchEngine()
+    engine.build(iter([
+        ("photos/beach.jpg", False, 1, 1.0, "image"),
+        ("photos/2023/Beach_Party.mp4", False, 1, 1.0, "video"),
+    ]), version=1)
+
+    with patch("app.core.session_manager.session_manager.get_session", return_value=session), \
+         patch("app.backend.routes.api_routes.search_sessions", SearchSessionManager(10)), \
+         patch("app.backend.routes.api_routes.search_engine", engine), \
+         patch("app.backend.routes.api_routes.file_index", MagicMock(ready=True, version=1)), \
+         patch("app.backend.routes.api_routes.get_pmask", new=AsyncMock(return_value="r")):
+        client = TestClient(app)
+        client.cookies.set("session_id", session.session_id)
+        client.get("/api/v1/fs/search/ui?q=beach&source=index")
+        refined = client.get("/api/v1/fs/search/ui?q=beachparty&source=index")
+
+    # A fuzzy match that a substring filter of the "beach" results would miss
+    fresh = engine.search("beachparty")
+    assert [h["p"] for h in fresh] == ["photos/2023/Beach_Party.mp4"]
+    assert refined.text.count("file-card") == 1
+    assert "Beach_Party.mp4" in refined.text
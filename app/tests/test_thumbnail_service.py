@@ -0,0 +1,116 @@
+import os
+import time
+import pytest
+from pathlib import Path
+from unittest.mock import patch, AsyncMock
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+from app.main import app
+from app.backend.services.thumbnail_service import ThumbnailCache, parse_thumb_size, thumbnail_key
+
+def _fake_render(source, destination, size, quality):
+    destination.write_bytes(b"x" * 100)
+
+def test_parse_thumb_size():
+    assert parse_thumb_size("300x300") == (300, 300)
+    assert parse_thumb_size("400") == (400, 400)
+    assert parse_thumb_size("200X100") == (200, 100)
+    # Clamped to THUMBNAIL_MAX_SIZE
+    assert parse_thumb_size("99999") == (1024, 1024)
+    assert parse_thumb_size("") is None
+    assert parse_thumb_size("0x10") is None
+    assert parse_thumb_size("big") is None
+
+def test_key_changes_with_mtime(tmp_path):
+    source = tmp_path / "a.jpg"
+    source.write_bytes(b"1")
+    os.utime(source, (1_700_000_000, 1_700_000_000))
+    first = thumbnail_key("a.jpg", (300, 300), source.stat())
+    assert thumbnail_key("a.jpg", (300, 300), source.stat()) == first
+    assert thumbnail_key("a.jpg", (400, 400), source.stat()) != first
+    os.utime(source, (1_700_000_100, 1_700_000_100))
+    assert thumbnail_key("a.jpg", (300, 300), source.stat()) != first
+
+@pytest.mark.anyio
+async def test_cache_renders_once_and_evicts_lru(tmp_path):
+    cache = ThumbnailCache(tmp_path / "thumbs", max_bytes=250, workers=1)
+    source = tmp_path / "a.jpg"
+    with patch("app.backend.services.thumbnail_service.render_thumbnail", side_effect=_fake_render) as render:
+        first = await cache.get(source, "aa11", (10, 10))
+        assert first == tmp_path / "thumbs" / "aa" / "aa11.webp"
+        assert await cache.get(source, "aa11", (10, 10)) == first
+        assert render.call_count == 1
+
+        await cache.get(source, "bb22", (10, 10))
+        # Touch the first entry so the second one is the least recently used
+        await cache.get(source, "aa11", (10, 10))
+        await cache.get(source, "cc33", (10, 10))
+
+    stats = cache.get_stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 200
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2
+    assert first.exists()
+    assert not (tmp_path / "thumbs" / "bb" / "bb22.webp").exists()
+
+@pytest.mark.anyio
+async def test_cache_reloads_from_disk(tmp_path):
+    directory = tmp_path / "thumbs" / "dd"
+    directory.mkdir(parents=True)
+    (directory / "dd44.webp").write_bytes(b"y" * 50)
+    cache = ThumbnailCache(tmp_path / "thumbs", max_bytes=1000, workers=1)
+    with patch("app.backend.services.thumbnail_service.render_thumbnail") as render:
+        assert await cache.get(tmp_path / "a.jpg", "dd44", (10, 10)) == directory / "dd44.webp"
+        render.assert_not_called()
+    assert cache.get_stats()["bytes"] == 50
+
+def test_concurrent_first_lookups_load_once(tmp_path):
+    cache = ThumbnailCache(tmp_path / "thumbs", max_bytes=1000, workers=1)
+    real_load = cache._load
+    loads = []
+
+    def slow_load():
+        loads.append(1)
+        time.sleep(0.05)
+        real_load()
+
+    with patch.object(cache, "_load", slow_load), ThreadPoolExecutor(max_workers=4) as pool:
+        assert list(pool.map(cache.lookup, ["ff66"] * 4)) == [None] * 4
+    assert len(loads) == 1
+
+@pytest.mark.anyio
+async def test_render_failure_returns_none(tmp_path):
+    cache = ThumbnailCache(tmp_path / "thumbs", max_bytes=1000, workers=1)
+    with patch("app.backend.services.thumbnail_service.render_thumbnail", side_effect=OSError("truncated")):
+        assert await cache.get(tmp_path / "a.jpg", "ee55", (10, 10)) is None
+    assert cache.get_stats()["errors"] == 1
+
+def test_thumbnail_route(tmp_path, authenticated):
+    Image = pytest.importorskip("PIL.Image")
+    photo = tmp_path / "photo.png"
+    Image.new("RGB", (800, 600), "red").save(photo)
+    cache = ThumbnailCache(tmp_path / "thumbs", max_bytes=10**6, workers=1)
+
+    with patch("app.backend.routes.download_routes.validate_and_resolve_path", return_value=photo), \
+         patch("app.backend.routes.download_routes.settings") as mock_settings, \
+         patch("app.backend.routes.download_routes.thumbnail_cache", cache), \
+         patch("app.backend.services.copyparty_service.get_pmask", new=AsyncMock(return_value="r")), \
+         patch("app.backend.services.copyparty_service.proxy_stream_request", new=AsyncMock()) as proxy:
+        mock_settings.SERVE_PATH = tmp_path
+        mock_settings.THUMBNAIL_MAX_AGE_SECONDS = 60
+        client = TestClient(app)
+
+        response = client.get("/download/photo.png?thumb=200x200")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        assert response.headers["cache-control"] == "private, max-age=60"
+        thumbnail = Image.open(Path(cache.cache_dir).glob("*/*.webp").__next__())
+        assert thumbnail.size == (200, 150)
+
+        cached = client.get("/download/photo.png?thumb=200x200", headers={"If-None-Match": response.headers["etag"]})
+        assert cached.status_code == 304
+        for if_none_match in (f'"other", W/{response.headers["etag"]}', "*"):
+            revalidated = client.get("/download/photo.png?thumb=200x200", headers={"If-None-Match": if_none_match})
+            assert revalidated.status_code == 304
+        proxy.assert_not_called()
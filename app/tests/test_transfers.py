@@ -0,0 +1,208 @@
+import os
+import asyncio
+import json
+import errno
+import pytest
+import httpx
+from unittest.mock import patch, AsyncMock
+from app.main import app
+from app.core.config import settings
+from app.backend.services import transfer_service
+from app.backend.services.transfer_service import TransferManager, TransferJob, TransferError
+
+BIG = os.urandom(50000)
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    root = tmp_path / "files"
+    (root / "album" / "2023").mkdir(parents=True)
+    (root / "album" / "big.mp4").write_bytes(BIG)
+    (root / "album" / "2023" / "a.jpg").write_bytes(b"a" * 100)
+    (root / "album" / "cache.pyc").write_bytes(b"x")
+    os.symlink("big.mp4", root / "album" / "link.mp4")
+    (root / "backup").mkdir()
+    monkeypatch.setattr(settings, "SERVE_DIR", str(root))
+    monkeypatch.setattr(settings, "TRANSFER_CHUNK_SIZE", 4096)
+    return root
+
+@pytest.fixture
+def manager(root, tmp_path):
+    return TransferManager(root, tmp_path / "pending_deletes.json")
+
+async def _finish(manager, job):
+    await manager._tasks[job.id]
+    return job
+
+def _tree(path):
+    return sorted(p.relative_to(path).as_posix() for p in path.rglob("*"))
+
+@pytest.mark.anyio
+async def test_copy_tree(manager, root):
+    job = await _finish(manager, manager.submit("copy", [root / "album"], root / "backup", "alice"))
+    assert job.state == "completed"
+    copy = root / "backup" / "album"
+    assert _tree(copy) == ["2023", "2023/a.jpg", "big.mp4", "link.mp4"]
+    assert (copy / "big.mp4").read_bytes() == BIG
+    assert os.readlink(copy / "link.mp4") == "big.mp4"
+    assert (job.files_done, job.files_total) == (3, 3)
+    assert job.bytes_done == len(BIG) + 100
+    assert (root / "album" / "big.mp4").exists()
+
+@pytest.mark.anyio
+async def test_move_is_a_rename(manager, root):
+    inode = (root / "album" / "big.mp4").stat().st_ino
+    job = await _finish(manager, manager.submit("move", [root / "album"], root / "backup", "alice"))
+    assert job.state == "completed"
+    assert not (root / "album").exists()
+    assert (root / "backup" / "album" / "big.mp4").stat().st_ino == inode
+    assert manager.get_stats()["renamed"] == 1 and job.bytes_done == 0
+
+@pytest.mark.anyio
+async def test_move_across_filesystems(manager, root):
+    with patch.object(TransferManager, "_rename", return_value=False), \
+         patch("app.backend.services.transfer_service._kernel_copy", return_value=None):
+        job = await _finish(manager, manager.submit("move", [root / "album" / "big.mp4"], root / "backup", "alice"))
+    assert job.state == "completed"
+    assert (root / "backup" / "big.mp4").read_bytes() == BIG
+    assert not (root / "album" / "big.mp4").exists()
+
+@pytest.mark.anyio
+async def test_move_across_filesystems_keeps_forbidden_names(manager, root):
+    (root / "album" / ".git").mkdir()
+    (root / "album" / ".git" / "HEAD").write_text("ref: refs/heads/main")
+    before = _tree(root / "album")
+    with patch.object(TransferManager, "_rename", return_value=False):
+        job = await _finish(manager, manager.submit("move", [root / "album"], root / "backup", "alice"))
+    assert job.state == "completed"
+    assert _tree(root / "backup" / "album") == before
+    assert (root / "backup" / "album" / ".git" / "HEAD").read_text() == "ref: refs/heads/main"
+    assert (root / "backup" / "album" / "cache.pyc").read_bytes() == b"x"
+    assert not (root / "album").exists()
+
+def test_kernel_copy_falls_back(monkeypatch, tmp_path):
+    def unsupported(*args):
+        raise OSError(errno.EXDEV, "cross-device")
+    monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+    monkeypatch.setattr(os, "sendfile", unsupported, raising=False)
+    (tmp_path / "a").write_bytes(b"data")
+    with open(tmp_path / "a", "rb") as src, open(tmp_path / "b", "wb") as dst:
+        assert transfer_service._kernel_copy(src.fileno(), dst.fileno(), 10) is None
+
+def test_cancel_removes_partial_copy(manager, root):
+    job = TransferJob("move", [root / "album"], root / "backup", "alice")
+    real_copy = transfer_service._kernel_copy
+
+    def copy_then_cancel(*args):
+        job.cancel_event.set()
+        return real_copy(*args)
+
+    with patch.object(TransferManager, "_rename", return_value=False), \
+         patch("app.backend.services.transfer_service._kernel_copy", side_effect=copy_then_cancel):
+        manager._execute(job)
+    assert job.state == "cancelled"
+    assert _tree(root / "backup") == []
+    assert (root / "album" / "big.mp4").read_bytes() == BIG
+
+@pytest.mark.anyio
+async def test_conflicts(manager, root):
+    (root / "backup" / "big.mp4").write_bytes(b"old")
+    with pytest.raises(TransferError) as error:
+        manager.submit("copy", [root / "album" / "big.mp4"], root / "backup", "alice")
+    assert error.value.status_code == 409
+    with pytest.raises(TransferError) as error:
+        manager.submit("copy", [root / "album"], root / "album" / "2023", "alice")
+    assert error.value.status_code == 400
+    assert (root / "backup" / "big.mp4").read_bytes() == b"old"
+
+@pytest.mark.anyio
+async def test_transfer_routes(manager, root, authenticated):
+    pmask = AsyncMock(return_value="rwm")
+    with patch("app.backend.routes.api_routes.transfers", manager), \
+         patch("app.backend.routes.api_routes.get_pmask", new=pmask):
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.post("/api/v1/fs/copy", json={"sources": ["album/2023", "album/big.mp4"], "destination": "backup"})
+            assert response.status_code == 202
+            job_id = response.json()["id"]
+            # Both sources share a folder: one lookup for it and one for the destination
+            assert pmask.await_count == 2
+
+            events = await client.get(f"/api/v1/fs/jobs/{job_id}", headers={"Accept": "text/event-stream"})
+            states = [json.loads(line[6:]) for line in events.text.splitlines() if line.startswith("data: ")]
+            assert states[-1]["state"] == "completed"
+            assert states[-1]["items"] == {"done": 2, "total": 2}
+            assert (await client.get("/api/v1/fs/jobs")).json()["jobs"][0]["id"] == job_id
+
+            conflict = await client.post("/api/v1/fs/move", json={"sources": ["album/big.mp4"], "destination": "backup"})
+            assert conflict.status_code == 409
+            assert (await client.post("/api/v1/fs/jobs/nope/cancel")).status_code == 404
+
+            pmask.return_value = "r"
+            denied = await client.post("/api/v1/fs/move", json={"sources": ["album/2023"], "destination": "backup"})
+            assert denied.status_code == 403
+
+@pytest.mark.anyio
+async def test_delete_hides_then_purges(manager, root, monkeypatch):
+    monkeypatch.setattr(settings, "DELETE_BATCH_SIZE", 2)
+    pauses = []
+    monkeypatch.setattr(transfer_service.time, "sleep", pauses.append)
+    changed = []
+    manager.subscribe(changed.append)
+
+    job = await manager.delete([root / "album"], "alice")
+    # Gone from its folder before the job runs
+    assert not (root / "album").exists()
+    assert root in changed
+    await _finish(manager, job)
+    assert job.state == "completed"
+    assert (job.files_done, job.files_total) == (4, 4)
+    assert job.bytes_done == job.bytes_total
+    assert len(pauses) == 3
+    assert list((root / ".deleting").iterdir()) == []
+
+def test_cancelled_delete_is_put_back(manager, root):
+    job = TransferJob("delete", [root / "album"], None, "alice")
+    manager._stage(job)
+
+    def unlink_then_cancel(path):
+        job.cancel_event.set()
+
+    with patch.object(transfer_service.Path, "unlink", unlink_then_cancel):
+        manager._purge(job)
+    assert job.state == "cancelled"
+    assert (root / "album" / "big.mp4").read_bytes() == BIG
+
+@pytest.mark.anyio
+async def test_interrupted_deletes_resume_on_start(manager, root):
+    job = TransferJob("delete", [root / "album"], None, "alice")
+    manager._stage(job)
+    # Shutdown leaves staged items pending instead of restoring them
+    manager._stopping = True
+    job.cancel_event.set()
+    manager._purge(job)
+    assert not (root / "album").exists()
+
+    manager.start()
+    await asyncio.gather(*manager._tasks.values())
+    assert list((root / ".deleting").iterdir()) == []
+
+@pytest.mark.anyio
+async def test_deletes_on_other_filesystems_resume_on_start(manager, root, tmp_path):
+    real_rename = os.rename
+
+    def rename(src, dst):
+        if dst.parent == root / ".deleting":
+            raise OSError(errno.EXDEV, "cross-device")
+        real_rename(src, dst)
+
+    job = TransferJob("delete", [root / "album" / "2023"], None, "alice")
+    with patch.object(transfer_service.os, "rename", rename):
+        manager._stage(job)
+    assert [p.name for p in (root / "album" / ".deleting").iterdir()] == [f"{job.id}-0-2023"]
+    assert json.loads((tmp_path / "pending_deletes.json").read_text()) == [str(root / "album" / ".deleting")]
+
+    # A restart: a new manager only knows the recorded folders
+    restarted = TransferManager(root, tmp_path / "pending_deletes.json")
+    restarted.start()
+    await asyncio.gather(*restarted._tasks.values())
+    assert list((root / "album" / ".deleting").iterdir()) == []
+    assert (root / "album" / "big.mp4").read_bytes() == BIG
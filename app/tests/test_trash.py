@@ -0,0 +1,219 @@
+import os
+import errno
+import threading
+import pytest
+import httpx
+from unittest.mock import patch, AsyncMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.main import app
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.backend.database.models import Base, TrashItem
+from app.backend.services import trash_service
+from app.backend.services.trash_service import TrashStore, TrashError
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    root = tmp_path / "files"
+    (root / "album" / "2023").mkdir(parents=True)
+    (root / "album" / "2023" / "a.jpg").write_bytes(b"a" * 100)
+    (root / "album" / "b.jpg").write_bytes(b"b" * 50)
+    (root / "notes.txt").write_text("notes")
+    monkeypatch.setattr(settings, "SERVE_DIR", str(root))
+    return root
+
+@pytest.fixture
+def store(root, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'trash.db'}")
+    Base.metadata.create_all(engine)
+    return TrashStore(root, tmp_path / "trash", sessionmaker(bind=engine))
+
+def _age(store, item_id, days):
+    with store._session_factory() as db:
+        db.get(TrashItem, item_id).deleted_at -= days * 86400
+        db.commit()
+
+def test_trash_and_restore(store, root, tmp_path):
+    changed = []
+    store.subscribe(changed.append)
+    item = store.trash(root / "album", "alice")
+    assert not (root / "album").exists()
+    assert (tmp_path / "trash" / item["id"] / "b.jpg").read_bytes() == b"b" * 50
+    assert item["original_path"] == "album" and item["is_dir"]
+    assert changed == [root]
+
+    assert [i["id"] for i in store.list_items("alice")] == [item["id"]]
+    assert store.list_items("bob") == []
+    with pytest.raises(TrashError) as error:
+        store.restore(item["id"], "bob")
+    assert error.value.status_code == 404
+
+    (root / "album").mkdir()
+    with pytest.raises(TrashError) as error:
+        store.restore(item["id"], "alice")
+    assert error.value.status_code == 409
+    (root / "album").rmdir()
+
+    assert store.restore(item["id"], "alice") == root / "album"
+    assert (root / "album" / "2023" / "a.jpg").read_bytes() == b"a" * 100
+    assert store.list_items("alice") == []
+
+def test_trash_falls_back_across_filesystems(store, root):
+    real_rename = os.rename
+
+    def rename(src, dst):
+        if store.trash_dir in dst.parents:
+            raise OSError(errno.EXDEV, "cross-device")
+        real_rename(src, dst)
+
+    with patch.object(trash_service.os, "rename", rename):
+        item = store.trash(root / "notes.txt", "alice")
+    assert (root / ".trash" / item["id"]).read_text() == "notes"
+
+def test_restore_of_missing_data(store, root, tmp_path):
+    item = store.trash(root / "notes.txt", "alice")
+    (tmp_path / "trash" / item["id"]).unlink()
+    with pytest.raises(TrashError) as error:
+        store.restore(item["id"], "alice")
+    assert error.value.status_code == 410
+    assert store.list_items("alice") == []
+
+def test_item_that_cant_be_moved_is_left_in_place(store, root):
+    def rename(src, dst):
+        raise OSError(errno.EXDEV, "cross-device")
+
+    with patch.object(trash_service.os, "rename", rename):
+        with pytest.raises(OSError) as error:
+            store.trash(root / "notes.txt", "alice")
+    assert error.value.errno == errno.EXDEV
+    assert (root / "notes.txt").read_text() == "notes"
+    assert store.list_items("alice") == []
+
+def test_failed_record_puts_item_back(store, root):
+    with patch.object(store, "_session_factory", side_effect=RuntimeError("db down")):
+        with pytest.raises(RuntimeError):
+            store.trash(root / "notes.txt", "alice")
+    assert (root / "notes.txt").read_text() == "notes"
+
+def test_purges_expired_and_requested_items(store, root, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TRASH_MIN_FREE_BYTES", 0)
+    old = store.trash(root / "album", "alice")
+    kept = store.trash(root / "notes.txt", "alice")
+    _age(store, old["id"], settings.TRASH_RETENTION_DAYS + 1)
+
+    assert store.purge_due() == 1
+    assert [i["id"] for i in store.list_items("alice")] == [kept["id"]]
+    assert list((tmp_path / "trash").iterdir()) == [tmp_path / "trash" / kept["id"]]
+
+    assert store.purge("alice") == 1
+    assert store.list_items("alice") == []
+    assert store.purge_due() == 1
+    assert list((tmp_path / "trash").iterdir()) == []
+    assert store.get_stats()["purged"] == 2
+
+def test_purges_oldest_when_short_of_space(store, root, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TRASH_MIN_FREE_BYTES", 0)
+    first = store.trash(root / "album", "alice")
+    second = store.trash(root / "notes.txt", "alice")
+    _age(store, first["id"], 1)
+
+    # Short of space until the oldest item is gone
+    first_data = tmp_path / "trash" / first["id"]
+    monkeypatch.setattr(store, "_short_of_space", lambda location: first_data.exists())
+    assert store.purge_due() == 1
+    assert [i["id"] for i in store.list_items("alice")] == [second["id"]]
+
+def test_purge_waits_for_streams(store, root, monkeypatch):
+    monkeypatch.setattr(settings, "TRASH_MIN_FREE_BYTES", 0)
+    monkeypatch.setattr(settings, "DELETE_BATCH_SIZE", 1)
+    store.trash(root / "album", "alice")
+    store.purge("alice")
+
+    sleeps = []
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if seconds == settings.TRASH_STREAM_WAIT_SECONDS:
+            metrics.active_streams = 0
+
+    metrics.active_streams = 1
+    try:
+        with patch.object(trash_service.time, "sleep", sleep):
+            assert store.purge_due() == 1
+    finally:
+        metrics.active_streams = 0
+    assert sleeps[0] == settings.TRASH_STREAM_WAIT_SECONDS
+    assert sleeps.count(settings.TRASH_STREAM_WAIT_SECONDS) == 1
+
+def test_orphans_are_swept(store, root, tmp_path):
+    kept = store.trash(root / "notes.txt", "alice")
+    (tmp_path / "trash" / "leftover").mkdir()
+    (tmp_path / "trash" / "leftover" / "x").write_bytes(b"x")
+    store._sweep_orphans()
+    store.purge_due()
+    assert list((tmp_path / "trash").iterdir()) == [tmp_path / "trash" / kept["id"]]
+
+def test_orphans_are_swept_from_every_location(store, root, tmp_path):
+    real_rename = os.rename
+
+    def rename(src, dst):
+        if dst.parent != root / "album" / ".trash":
+            raise OSError(errno.EXDEV, "cross-device")
+        real_rename(src, dst)
+
+    with patch.object(trash_service.os, "rename", rename):
+        kept = store.trash(root / "album" / "b.jpg", "alice")
+    (root / "album" / ".trash" / "leftover").write_bytes(b"x")
+    store._sweep_orphans()
+    store.purge_due()
+    assert list((root / "album" / ".trash").iterdir()) == [root / "album" / ".trash" / kept["id"]]
+
+def test_sweep_waits_for_items_being_moved(store, root):
+    real_factory = store._session_factory
+    sweeps = []
+
+    def session_factory():
+        # Called to record the item, once its data is in the trash folder
+        if not sweeps:
+            sweep = threading.Thread(target=store._sweep_orphans)
+            sweep.start()
+            sweeps.append(sweep)
+            sweep.join(0.1)
+            assert sweep.is_alive()
+        return real_factory()
+
+    with patch.object(store, "_session_factory", session_factory):
+        store.trash(root / "notes.txt", "alice")
+    sweeps[0].join()
+    assert store._backlog == []
+
+@pytest.mark.anyio
+async def test_trash_routes(store, root, authenticated):
+    pmask = AsyncMock(return_value="rwd")
+    with patch("app.backend.routes.api_routes.trash", store), \
+         patch("app.backend.routes.api_routes.get_pmask", new=pmask), \
+         patch("app.backend.routes.api_routes._username", return_value="alice"):
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.delete("/api/v1/fs/album")
+            assert response.status_code == 204
+            item_id = response.headers["X-Trash-Id"]
+            assert not (root / "album").exists()
+
+            items = (await client.get("/api/v1/trash")).json()["items"]
+            assert [i["id"] for i in items] == [item_id]
+
+            pmask.return_value = "r"
+            assert (await client.post(f"/api/v1/trash/{item_id}/restore")).status_code == 403
+            pmask.return_value = "rwd"
+            restored = await client.post(f"/api/v1/trash/{item_id}/restore")
+            assert restored.status_code == 200 and restored.json()["path"] == "album"
+            assert (root / "album" / "b.jpg").exists()
+            assert (await client.post(f"/api/v1/trash/{item_id}/restore")).status_code == 404
+
+            response = await client.delete("/api/v1/fs/notes.txt")
+            item_id = response.headers["X-Trash-Id"]
+            assert (await client.delete(f"/api/v1/trash/{item_id}")).status_code == 204
+            assert (await client.delete(f"/api/v1/trash/{item_id}")).status_code == 404
+            await client.delete("/api/v1/fs/album")
+            assert (await client.post("/api/v1/trash/purge", json={})).json() == {"purged": 1}
+            assert (await client.get("/api/v1/trash")).json()["items"] == []
@@ -4,6 +4,7 @@ from fastapi.testclient import TestClient
 from app.main import app
 from app.core.auth import auth_required
 from pathlib import Path
+from app.core.listing import FSEntry
 
 # Mock authentication
 def mock_auth_required():
@@ -21,14 +22,14 @@ def mock_session():
         mock_get.return_value = session
         yield session
 
+@patch("app.frontend.routes.frontend_routes.scan_directory", return_value=[])
 @patch("app.frontend.routes.frontend_routes.get_pmask")
 @patch("app.frontend.routes.frontend_routes.validate_and_resolve_path")
-def test_ui_upload_button_visibility(mock_resolve, mock_pmask, mock_session):
+def test_ui_upload_button_visibility(mock_resolve, mock_pmask, mock_scan, mock_session):
     """Verify that Upload button visibility depends on 'w' permission."""
     # Setup mock path
     mock_path = MagicMock()
     mock_path.is_dir.return_value = True
-    mock_path.iterdir.return_value = []
     mock_resolve.return_value = mock_path
     
     with TestClient(app) as client:
@@ -46,20 +47,16 @@ def test_ui_upload_button_visibility(mock_resolve, mock_pmask, mock_session):
         assert response.status_code == 200
         assert "UPLOAD FILES" not in response.text
 
+@patch("app.frontend.routes.frontend_routes.scan_directory")
 @patch("app.frontend.routes.frontend_routes.get_pmask")
 @patch("app.frontend.routes.frontend_routes.validate_and_resolve_path")
-def test_ui_delete_button_visibility(mock_resolve, mock_pmask, mock_session):
+def test_ui_delete_button_visibility(mock_resolve, mock_pmask, mock_scan, mock_session):
     """Verify that Delete button visibility depends on 'd' permission."""
     # Setup mock path with one file
-    mock_file = MagicMock()
-    mock_file.name = "test.txt"
-    mock_file.is_dir.return_value = False
-    mock_file.is_file.return_value = True
-    mock_file.suffix = ".txt"
+    mock_scan.return_value = [FSEntry("test.txt", is_dir=False)]
     
     mock_dir = MagicMock()
     mock_dir.is_dir.return_value = True
-    mock_dir.iterdir.return_value = [mock_file]
     mock_resolve.return_value = mock_dir
     
     with TestClient(app) as client:
@@ -77,14 +74,14 @@ def test_ui_delete_button_visibility(mock_resolve, mock_pmask, mock_session):
         assert response.status_code == 200
         assert "bi-trash-fill" not in response.text
 
+@patch("app.frontend.routes.frontend_routes.scan_directory", return_value=[])
 @patch("app.frontend.routes.frontend_routes.get_pmask")
 @patch("app.frontend.routes.frontend_routes.validate_and_resolve_path")
-def test_ui_create_folder_button_visibility(mock_resolve, mock_pmask, mock_session):
+def test_ui_create_folder_button_visibility(mock_resolve, mock_pmask, mock_scan, mock_session):
     """Verify that Create Folder button visibility depends on 'w' permission."""
     # Setup mock path
     mock_path = MagicMock()
     mock_path.is_dir.return_value = True
-    mock_path.iterdir.return_value = []
     mock_resolve.return_value = mock_path
     
     with TestClient(app) as client:
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.main import app
+
+@pytest.fixture
+def client(tmp_path, authenticated):
+    with patch("app.backend.routes.upload_routes.validate_and_resolve_path", return_value=tmp_path), \
+         patch("app.backend.routes.upload_routes.settings") as mock_settings, \
+         patch("app.backend.routes.upload_routes.pregeneration_queue"):
+        mock_settings.SERVE_PATH = tmp_path
+        mock_settings.UPLOAD_CONCURRENCY_PER_REQUEST = 3
+        yield TestClient(app)
+
+def _files(*names):
+    return [("files", (name, b"data", "application/octet-stream")) for name in names]
+
+def test_uploads_run_concurrently_with_a_limit(client):
+    active = 0
+    peak = 0
+    finished = []
+
+    async def fake_upload(request, relative_path, file):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        # The first file is slow; the others must not wait for it
+        await asyncio.sleep(0.3 if file.filename == "slow.jpg" else 0.02)
+        active -= 1
+        finished.append(file.filename)
+        return True
+
+    names = ["slow.jpg"] + [f"photo{i}.jpg" for i in range(8)]
+    with patch("app.backend.routes.upload_routes.proxy_upload_request", side_effect=fake_upload):
+        response = client.post("/upload/album?format=json", files=_files(*names))
+
+    assert response.status_code == 200
+    assert response.json()["uploaded"] == 9
+    assert peak == 3
+    assert finished[-1] == "slow.jpg"
+
+def test_per_file_results(client):
+    async def fake_upload(request, relative_path, file):
+        if file.filename == "broken.jpg":
+            raise HTTPException(status_code=502, detail="Backend upload failed: timeout")
+        return True
+
+    with patch("app.backend.routes.upload_routes.proxy_upload_request", side_effect=fake_upload):
+        response = client.post(
+            "/upload/album", files=_files("ok.jpg", "broken.jpg", "app.pyc"),
+            headers={"Accept": "application/json"}
+        )
+
+    body = response.json()
+    assert (body["uploaded"], body["skipped"], body["failed"]) == (1, 1, 1)
+    assert body["files"] == [
+        {"name": "ok.jpg", "status": "uploaded"},
+        {"name": "broken.jpg", "status": "failed", "reason": "Backend upload failed: timeout"},
+        {"name": "app.pyc", "status": "skipped", "reason": "Forbidden file name"},
+    ]
+
+def test_htmx_response_reports_failures(client):
+    async def fake_upload(request, relative_path, file):
+        raise HTTPException(status_code=502, detail="down")
+
+    with patch("app.backend.routes.upload_routes.proxy_upload_request", side_effect=fake_upload), \
+         patch("app.backend.routes.upload_routes.scan_directory", return_value=[]):
+        response = client.post("/upload/album", files=_files("a.jpg"))
+
+    assert response.status_code == 200
+    assert "0 files, 1 not uploaded" in response.headers["HX-Trigger"]
+    assert '"warning"' in response.headers["HX-Trigger"]
@@ -0,0 +1,119 @@
+import os
+import json
+import shutil
+import asyncio
+import subprocess
+from pathlib import Path
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, AsyncMock, PropertyMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.backend.services.video_preview_service import (
+    VideoPreviewCache, build_vtt, render_video_previews, META_NAME, POSTER_NAME, SPRITE_NAME
+)
+
+META = {
+    "duration": 25.0, "width": 1280, "height": 720, "frames": 25, "columns": 10, "rows": 3,
+    "interval": 1.0, "tile_width": 160, "tile_height": 90,
+}
+
+def _fake_render(ffmpeg, ffprobe, source, destination, *args):
+    for name in (POSTER_NAME, SPRITE_NAME):
+        (Path(destination) / name).write_bytes(b"jpg")
+    (Path(destination) / META_NAME).write_text(json.dumps(META))
+    return META
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = VideoPreviewCache(tmp_path / "cache", workers=1)
+    cache._executor = ThreadPoolExecutor(max_workers=1)
+    yield cache
+    cache.shutdown()
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "files" / "clip.mp4"
+    path.parent.mkdir()
+    path.write_bytes(b"not really a video")
+    return path
+
+def test_build_vtt():
+    vtt = build_vtt(META, "/sprite")
+    lines = vtt.splitlines()
+    assert lines[0] == "WEBVTT"
+    assert lines[2] == "00:00:00.000 --> 00:00:01.000"
+    assert lines[3] == "/sprite#xywh=0,0,160,90"
+    # 12th tile: second row, second column
+    assert "00:00:11.000 --> 00:00:12.000\n/sprite#xywh=160,90,160,90" in vtt
+
+@pytest.mark.anyio
+async def test_concurrent_requests_render_once(cache, video):
+    with patch("app.backend.services.video_preview_service.render_video_previews", side_effect=_fake_render) as render:
+        first, second = await asyncio.gather(cache.get(video, "clip.mp4"), cache.get(video, "clip.mp4"))
+        assert first == second
+        assert cache.load_meta(first) == META
+        assert await cache.get(video, "clip.mp4") == first
+    assert render.call_count == 1
+    assert cache.get_stats()["rendered"] == 1
+
+@pytest.mark.anyio
+async def test_modified_video_replaces_old_entry(cache, video):
+    with patch("app.backend.services.video_preview_service.render_video_previews", side_effect=_fake_render):
+        old = await cache.get(video, "clip.mp4")
+        os.utime(video, (1_700_000_000, 1_700_000_000))
+        new = await cache.get(video, "clip.mp4")
+    assert new != old
+    assert new.exists() and not old.exists()
+
+@pytest.mark.anyio
+async def test_failed_render_returns_none(cache, video):
+    error = subprocess.CalledProcessError(1, "ffmpeg")
+    with patch("app.backend.services.video_preview_service.render_video_previews", side_effect=error):
+        assert await cache.get(video, "clip.mp4") is None
+    assert cache.get_stats()["errors"] == 1
+    assert not any(cache.cache_dir.rglob(META_NAME))
+
+def test_preview_route(cache, video, authenticated):
+    with patch("app.backend.routes.api_routes.validate_and_resolve_path", return_value=video), \
+         patch("app.backend.routes.api_routes.settings") as mock_settings, \
+         patch("app.backend.routes.api_routes.video_previews", cache), \
+         patch.object(VideoPreviewCache, "available", new_callable=PropertyMock, return_value=True), \
+         patch("app.backend.routes.api_routes.get_pmask", new=AsyncMock(return_value="r")), \
+         patch("app.backend.services.video_preview_service.render_video_previews", side_effect=_fake_render):
+        mock_settings.SERVE_PATH = video.parent
+        mock_settings.VIDEO_PREVIEW_MAX_AGE_SECONDS = 60
+        client = TestClient(app)
+
+        info = client.get("/api/v1/video/preview/clip.mp4")
+        assert info.status_code == 200
+        assert info.json()["sprite"] == "/api/v1/video/preview/clip.mp4?asset=sprite"
+        assert info.json()["frames"] == 25
+
+        vtt = client.get("/api/v1/video/preview/clip.mp4?asset=vtt")
+        assert vtt.headers["content-type"].startswith("text/vtt")
+        assert "/api/v1/video/preview/clip.mp4?asset=sprite#xywh=0,0,160,90" in vtt.text
+
+        poster = client.get("/api/v1/video/preview/clip.mp4?asset=poster")
+        assert poster.headers["content-type"] == "image/jpeg"
+        assert poster.headers["cache-control"] == "private, max-age=60"
+        assert client.get(
+            "/api/v1/video/preview/clip.mp4?asset=poster", headers={"If-None-Match": poster.headers["etag"]}
+        ).status_code == 304
+
+        assert client.get("/api/v1/video/preview/clip.mp4?asset=gif").status_code == 400
+
+@pytest.mark.skipif(not (shutil.which("ffmpeg") and shutil.which("ffprobe")), reason="ffmpeg not installed")
+def test_render_with_ffmpeg(tmp_path):
+    source = tmp_path / "test.mp4"
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=duration=5:size=320x240:rate=10", str(source)],
+        check=True
+    )
+    out = tmp_path / "out"
+    out.mkdir()
+    meta = render_video_previews("ffmpeg", "ffprobe", str(source), str(out), 60, 10, 160, 640, 60)
+    assert meta["frames"] == 5
+    assert meta["tile_height"] == 120
+    assert (out / POSTER_NAME).stat().st_size > 0
+    assert (out / SPRITE_NAME).stat().st_size > 0
@@ -15,6 +15,8 @@ from app.backend.database.models import User
 from app.core.security import hasher
 from app.core.config import settings
 from app.core.logger import setup_logging
+from app.core.pmask_cache import pmask_cache
+from app.core.permission_engine import permission_engine
 
 logger = logging.getLogger(__name__)
 
@@ -73,6 +75,10 @@ def write_config_file(user_entries: list):
         
     with open(conf_file, "w") as f:
         f.write("\n".join(lines) + "\n")
+
+    # Permissions may have changed; drop any masks cached in this process
+    pmask_cache.invalidate()
+    permission_engine.invalidate()
     
     logger.info(f"Successfully synced {len(user_entries)} users to {conf_file}")
 
@@ -19,6 +19,7 @@ logger = logging.getLogger(__name__)
 
 VENV_PYTHON = "uv"
 COPYPARTY_CONF = BASE_DIR / "copyparty" / "copyparty.conf"
+UVICORN_SHUTDOWN_TIMEOUT = 15
 
 # Process handles
 copyparty_proc = None
@@ -63,6 +64,13 @@ def shutdown(signum, frame):
     logger.info("Shutdown signal received. Terminating processes...")
     if uvicorn_proc:
         uvicorn_proc.terminate()
+        try:
+            # Let the app's shutdown hooks run (background jobs and watchers stop cleanly;
+            # scan watermarks are already committed after each pass)
+            uvicorn_proc.wait(timeout=UVICORN_SHUTDOWN_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            logger.warning("Uvicorn did not exit in time, killing it.")
+            uvicorn_proc.kill()
     if copyparty_proc:
         copyparty_proc.terminate()
     sys.exit(0)